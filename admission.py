@@ -0,0 +1,156 @@
+# admission.py
+import math
+import asyncio
+import time
+import logging
+import threading
+from collections import deque
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Ticket:
+    """A request's place in the admission queue. Release it exactly once when the request is done."""
+
+    def __init__(self, controller, admitted=False):
+        self.controller = controller
+        self.admitted = admitted
+        self.entered_at = time.time()
+        self.admitted_at = self.entered_at if admitted else None
+        self.released = False
+        self.wakeup = None # Set by wait_for_turn_async: called (from any thread) when the queue moves
+
+    def release(self):
+        self.controller.leave(self)
+
+
+class AdmissionController:
+    """
+    Bounds the work the server takes on. At most `max_active` requests run the pipeline at once and
+    up to `max_queue` more wait their turn in FIFO order; anything beyond that is rejected right away
+    (the caller answers 429 with `retry_after()`), so accepted requests keep a bounded latency
+    instead of every request slowing down together.
+    """
+
+    def __init__(self, max_active=config.ADMISSION_MAX_ACTIVE, max_queue=config.ADMISSION_MAX_QUEUE):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = deque()
+        self._service_times = deque(maxlen=50) # Recent admitted-to-done durations, for Retry-After
+        self.rejected = 0
+
+    def try_enter(self):
+        """Returns an admitted Ticket, a queued Ticket, or None when the queue is full."""
+        with self._cond:
+            if self._active < self.max_active and not self._waiting:
+                self._active += 1
+                return Ticket(self, admitted=True)
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                return None
+            ticket = Ticket(self)
+            self._waiting.append(ticket)
+            return ticket
+
+    def wait_for_turn(self, ticket, interval=config.ADMISSION_POSITION_INTERVAL, timeout=config.ADMISSION_QUEUE_TIMEOUT):
+        """
+        Generator for queued tickets: yields the ticket's 1-based queue position whenever it changes,
+        and at least every `interval` seconds, until it is admitted. Gives up after `timeout` seconds,
+        leaving `ticket.admitted` False.
+        """
+        give_up_at = time.time() + timeout
+        last_position, next_update = None, 0.0
+        while True:
+            with self._cond:
+                if ticket.admitted or ticket.released:
+                    return
+                now = time.time()
+                if now >= give_up_at:
+                    self._remove_waiting(ticket)
+                    logger.warning(f"Request gave up after waiting {timeout}s in the admission queue.")
+                    return
+                position = self._waiting.index(ticket) + 1
+                if position == last_position and now < next_update:
+                    self._cond.wait(min(next_update, give_up_at) - now)
+                    continue
+            last_position, next_update = position, time.time() + interval
+            yield position
+
+    async def wait_for_turn_async(self, ticket, interval=config.ADMISSION_POSITION_INTERVAL,
+                                  timeout=config.ADMISSION_QUEUE_TIMEOUT):
+        """Async-generator version of wait_for_turn for asyncio servers: waiting holds no thread."""
+        loop = asyncio.get_running_loop()
+        moved = asyncio.Event()
+        ticket.wakeup = lambda: loop.call_soon_threadsafe(moved.set)
+        give_up_at = time.time() + timeout
+        last_position, next_update = None, 0.0
+        while True:
+            moved.clear()
+            with self._cond:
+                if ticket.admitted or ticket.released:
+                    return
+                now = time.time()
+                if now >= give_up_at:
+                    self._remove_waiting(ticket)
+                    logger.warning(f"Request gave up after waiting {timeout}s in the admission queue.")
+                    return
+                position = self._waiting.index(ticket) + 1
+            if position != last_position or now >= next_update:
+                last_position, next_update = position, now + interval
+                yield position
+                continue
+            try:
+                await asyncio.wait_for(moved.wait(), min(next_update, give_up_at) - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def leave(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.admitted:
+                self._active -= 1
+                self._service_times.append(time.time() - ticket.admitted_at)
+            else:
+                self._remove_waiting(ticket)
+            self._admit_next()
+
+    def _remove_waiting(self, ticket):
+        try:
+            self._waiting.remove(ticket)
+        except ValueError:
+            pass
+        self._notify_waiters() # Positions behind it moved up
+
+    def _admit_next(self):
+        admitted = []
+        while self._active < self.max_active and self._waiting:
+            ticket = self._waiting.popleft()
+            ticket.admitted = True
+            ticket.admitted_at = time.time()
+            self._active += 1
+            admitted.append(ticket)
+        self._notify_waiters(admitted)
+
+    def _notify_waiters(self, extra=()):
+        self._cond.notify_all()
+        for ticket in list(self._waiting) + list(extra):
+            if ticket.wakeup is not None:
+                ticket.wakeup()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait: the time for the current queue to drain, from recent service times."""
+        with self._cond:
+            if not self._service_times:
+                return config.ADMISSION_RETRY_AFTER
+            average = sum(self._service_times) / len(self._service_times)
+            estimate = average * (len(self._waiting) + 1) / self.max_active
+        return max(config.ADMISSION_RETRY_AFTER, math.ceil(estimate))
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "waiting": len(self._waiting), "rejected": self.rejected}
@@ -0,0 +1,121 @@
+# answer_cache.py
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import config
+from embeddings import embed, normalize_text
+from keyword_extractor import query_terms
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    In-memory cache of final answers keyed on the meaning of the question.
+    A lookup only considers cached questions with exactly the same terms (query_terms: every word
+    but function words, so "étudiants tunisiens" and "étudiants étrangers" never match), embeds the
+    query together with those terms and returns the most similar answer when the cosine
+    similarity reaches `threshold`.
+    Entries are evicted least-recently-used beyond `max_entries` and expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_entries=config.ANSWER_CACHE_SIZE, ttl=config.ANSWER_CACHE_TTL,
+                 threshold=config.ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # normalized query -> entry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _embed_query(user_query, terms):
+        # Not the search keywords: they are cut to MAX_KEYWORDS and can drop the word that matters
+        vector = embed(user_query) + embed(" ".join(sorted(terms)))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, user_query):
+        """Returns the cached entry {'answer', 'sources', 'query', 'similarity'} or None."""
+        terms = query_terms(user_query)
+        query_vector = self._embed_query(user_query, terms)
+        with self._lock:
+            self._drop_expired(time.time())
+            keys = [key for key, entry in self._entries.items() if entry["terms"] == terms]
+            if keys:
+                matrix = np.vstack([self._entries[key]["embedding"] for key in keys])
+                similarities = matrix @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entry = self._entries[key]
+                    logger.info(f"Answer cache hit for '{user_query}' "
+                                f"(matched '{entry['query']}', similarity {similarities[best]:.3f})")
+                    return {"answer": entry["answer"], "sources": entry["sources"],
+                            "query": entry["query"], "similarity": float(similarities[best])}
+            self.misses += 1
+        return None
+
+    def store(self, user_query, answer, sources):
+        """Caches `answer`, remembering the source URLs it was built from in their [n] citation order."""
+        terms = query_terms(user_query)
+        entry = {
+            "query": user_query,
+            "terms": terms,
+            "embedding": self._embed_query(user_query, terms),
+            "answer": answer,
+            "sources": tuple(sources),
+            "created": time.time(),
+        }
+        with self._lock:
+            key = normalize_text(user_query)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_url(self, url):
+        """Drops every answer built from `url`; called when its summary changes."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if url in entry["sources"]]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answer(s) citing {url}")
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def replay_answer(answer, chunk_words=config.ANSWER_CACHE_REPLAY_CHUNK_WORDS):
+    """Streams a cached answer in small chunks, like the token stream of a fresh answer."""
+    words = answer.split(" ")
+    for start in range(0, len(words), chunk_words):
+        chunk = " ".join(words[start:start + chunk_words])
+        yield chunk if start + chunk_words >= len(words) else chunk + " "
+
+
+# --- Singleton, invalidated by summaries.db writes ---
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """Returns the shared answer cache, registering it for summary change notifications."""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            from summary_store import get_summary_store
+            _cache_instance = AnswerCache()
+            get_summary_store().add_listener(_cache_instance.invalidate_url)
+        return _cache_instance
@@ -2,9 +2,15 @@
 # **** ADDED IMPORTS ****
 from flask import Flask, request, jsonify, Response, stream_with_context
 # **********************
+import time
 import logging
+import threading
 import config
-from chatbot_logic import process_user_query
+import metrics
+from chatbot_logic import process_user_query, QueryCancelled
+from model_registry import registry
+from admission import AdmissionController
+from sse import EventChannel, coalesce_tokens, format_event
 import traceback # For detailed error logging
 
 # Configure Flask app
@@ -16,15 +22,73 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("gunicorn.error" if __name__ != '__main__' else __name__)
 
 
-# Eagerly initialize LLM service on startup
-try:
-    from llm_service import get_llm_service
-    get_llm_service() # Ensure initialization happens
-    logger.info("LLM Service initialized successfully for Flask app.")
-except Exception as e:
-    logger.critical(f"CRITICAL ERROR: Failed to initialize LLM Service: {e}", exc_info=True)
-    # Consider exiting if model loading fails critically
-    # raise SystemExit("Failed to load model, exiting.")
+# Load models in the background so health checks are served while they warm up.
+# Without warm-up, each model is loaded on the first request that needs it.
+if config.WARMUP_ON_STARTUP:
+    registry.warm_up_async()
+    logger.info("Model warm-up started in the background.")
+
+# Bounds concurrent /chat work; overflow beyond the wait queue is answered with 429
+chat_admission = AdmissionController()
+if config.ADMISSION_MAX_ACTIVE + config.ADMISSION_MAX_QUEUE >= config.SERVER_THREADS:
+    logger.warning("ADMISSION_MAX_ACTIVE + ADMISSION_MAX_QUEUE should be below SERVER_THREADS, "
+                   "otherwise excess requests wait for a server thread instead of getting a 429.")
+metrics.ADMISSION_REQUESTS.set_function(
+    lambda: {(state,): count for state, count in chat_admission.stats().items() if state != "rejected"}
+)
+
+
+@app.route('/health', methods=['GET'])
+def health_endpoint():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+
+@app.route('/ready', methods=['GET'])
+def ready_endpoint():
+    """Readiness probe: 200 once every model is loaded, 503 (with per-model load state and timings) before."""
+    ready = registry.is_ready()
+    return jsonify({"ready": ready, "models": registry.status()}), (200 if ready else 503)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint: stage latency histograms, cache hit/miss counters, generation load and RSS."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _produce_events(user_query, channel, received_at, outcome, on_finish):
+    """Runs the pipeline of an event-stream request on its own thread, forwarding progress and tokens to `channel`."""
+    token_stream = None
+    try:
+        token_stream = process_user_query(user_query, stream=True, on_progress=channel.emit,
+                                          cancelled=lambda: channel.cancelled)
+        first_chunk = True
+        for token in token_stream:
+            if channel.cancelled:
+                logger.info(f"Client disconnected, stopping query: {user_query}")
+                outcome["status"] = "disconnected"
+                break
+            if not token:
+                continue
+            if first_chunk:
+                metrics.TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - received_at)
+                first_chunk = False
+            channel.emit("token", token)
+        channel.emit("done", {"elapsed": round(time.perf_counter() - received_at, 3)})
+    except QueryCancelled:
+        # The client left during an earlier stage; the pipeline stopped there
+        logger.info(f"Client disconnected, stopped query: {user_query}")
+        outcome["status"] = "disconnected"
+    except Exception as e:
+        logger.error(f"Error during event stream: {e}\n{traceback.format_exc()}")
+        outcome["status"] = "error"
+        channel.emit("done", {"elapsed": round(time.perf_counter() - received_at, 3), "error": str(e)})
+    finally:
+        if hasattr(token_stream, "close"):
+            token_stream.close() # Stops an unfinished generation
+        channel.close()
+        on_finish()
 
 
 @app.route('/chat', methods=['POST'])
@@ -35,9 +99,14 @@ def chat_endpoint():
     Returns either:
         - Non-streaming: JSON {'response': 'chatbot answer here'} (if stream=false requested, though not implemented in client yet)
         - Streaming: text/plain stream of tokens
+    When the server is at capacity the request waits in a bounded queue; the stream then starts with
+    lines "[QUEUE] <position>" until it is admitted. When the queue is full: 429 with Retry-After.
+    With `Accept: text/event-stream` the response is a server-sent-events stream instead (see sse.py):
+    queue position, pipeline stages and sources arrive as events ahead of the answer tokens.
     """
     if not request.is_json:
         logger.warning("Received non-JSON request")
+        metrics.CHAT_REQUESTS.inc(status="bad_request")
         return jsonify({"error": "Request must be JSON"}), 400
 
     data = request.get_json()
@@ -45,32 +114,108 @@ def chat_endpoint():
 
     if not user_query:
         logger.warning("Received request with missing 'query' field")
+        metrics.CHAT_REQUESTS.inc(status="bad_request")
         return jsonify({"error": "Missing 'query' in request body"}), 400
 
     logger.info(f"Received query via API: {user_query}")
+    ticket = chat_admission.try_enter()
+    if ticket is None:
+        retry_after = chat_admission.retry_after()
+        logger.warning(f"Admission queue full, rejecting query (Retry-After: {retry_after}s)")
+        metrics.CHAT_REQUESTS.inc(status="rejected")
+        response = jsonify({"error": "Le serveur est très sollicité. Veuillez réessayer dans quelques instants.",
+                            "retry_after": retry_after})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(retry_after)
+        return response
+
+    received_at = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    outcome = {"status": "ok"}
+
+    def finish_request():
+        # Runs once the response is closed, whether the stream completed, failed or the client left
+        ticket.release()
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        metrics.STREAM_SECONDS.observe(time.perf_counter() - received_at)
+        metrics.CHAT_REQUESTS.inc(status=outcome["status"])
+
+    if request.accept_mimetypes.best_match(['text/plain', 'text/event-stream']) == 'text/event-stream':
+        channel = EventChannel()
+        producer = {"thread": None}
+
+        def generate_event_stream():
+            if not ticket.admitted:
+                for position in chat_admission.wait_for_turn(ticket):
+                    yield format_event("queue", {"position": position})
+                if not ticket.admitted:
+                    outcome["status"] = "queue_timeout"
+                    yield format_event("done", {
+                        "elapsed": round(time.perf_counter() - received_at, 3),
+                        "error": "Désolé, le serveur est trop sollicité pour le moment. Veuillez réessayer plus tard.",
+                    })
+                    return
+            # The pipeline runs on its own thread so its progress events can be sent while it works
+            producer["thread"] = threading.Thread(
+                target=_produce_events, args=(user_query, channel, received_at, outcome, finish_request),
+                name="chat-events", daemon=True,
+            )
+            producer["thread"].start()
+            yield from channel.events()
+
+        def close_event_stream():
+            channel.cancel()
+            if producer["thread"] is None:
+                finish_request() # Otherwise the producer finishes the request once the pipeline stops
+
+        response = Response(stream_with_context(generate_event_stream()), mimetype='text/event-stream')
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no" # Keep reverse proxies from buffering the events
+        response.call_on_close(close_event_stream)
+        return response
 
     try:
-        # Always request stream=True from the logic layer for this endpoint
-        response_generator = process_user_query(user_query, stream=True)
+        # Always request stream=True from the logic layer for this endpoint.
+        # A queued request only starts the pipeline once it is admitted, inside the stream.
+        response_generator = process_user_query(user_query, stream=True) if ticket.admitted else None
 
         # Define the streaming generator function for Flask
         def generate_flask_stream():
+            first_chunk = True
             try:
-                for token in response_generator:
+                token_stream = response_generator
+                if token_stream is None:
+                    for position in chat_admission.wait_for_turn(ticket):
+                        yield f"{config.QUEUE_POSITION_PREFIX}{position}\n"
+                    if not ticket.admitted:
+                        outcome["status"] = "queue_timeout"
+                        yield "Désolé, le serveur est trop sollicité pour le moment. Veuillez réessayer plus tard."
+                        return
+                    logger.info(f"Admitted after {time.perf_counter() - received_at:.2f}s in the queue: {user_query}")
+                    token_stream = process_user_query(user_query, stream=True)
+                # Tokens are grouped into small time- and size-bounded chunks: fewer writes, same latency
+                for token in coalesce_tokens(token_stream):
                     # logger.debug(f"Streaming token: {token}") # Verbose logging if needed
+                    if first_chunk and token:
+                        metrics.TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - received_at)
+                        first_chunk = False
                     yield token
             except Exception as e:
                  logger.error(f"Error during response generation stream in Flask: {e}\n{traceback.format_exc()}")
+                 outcome["status"] = "error"
                  yield f"\n\n[STREAM ERROR: {e}]" # Send error within the stream
 
         # Return the streaming response
-        # Use text/plain; Streamlit's write_stream handles chunking/display well.
-        # Using text/event-stream adds complexity not needed here yet.
-        return Response(stream_with_context(generate_flask_stream()), mimetype='text/plain')
+        # Plain text for simple clients; Streamlit asks for text/event-stream (above).
+        response = Response(stream_with_context(generate_flask_stream()), mimetype='text/plain')
+        response.call_on_close(finish_request)
+        return response
 
     except Exception as e:
         # Catch errors *before* starting the stream if possible
         logger.error(f"An unexpected error occurred processing query '{user_query}' before streaming: {e}\n{traceback.format_exc()}", exc_info=True)
+        outcome["status"] = "error"
+        finish_request()
         # Return a non-streaming error response
         return jsonify({"error": f"An internal server error occurred before streaming could start: {e}"}), 500
 
@@ -0,0 +1,254 @@
+# asgi_app.py
+"""
+asyncio-native ASGI application serving the same endpoints as app.py (/chat, /health, /ready, /metrics).
+
+A /chat stream is a coroutine, not a server thread: search, page downloads and token streaming are
+awaited, and only the blocking CPU stages borrow a thread from the pipeline's bounded pools. One
+process can therefore keep hundreds of streams (and a long admission queue) open. Served by
+run_async.py.
+
+Differences from the Flask endpoint: response headers are sent as soon as the request is accepted,
+so errors during the pipeline are reported inside the stream (as "[STREAM ERROR: ...]") instead of
+as a 500, and a client disconnect cancels the request's pipeline and generation.
+"""
+import json
+import time
+import asyncio
+import logging
+import traceback
+import config
+import metrics
+from admission import AdmissionController
+from chatbot_logic import process_user_query_async
+from model_registry import registry
+from sse import AsyncEventChannel, coalesce_tokens_async, format_event
+
+logger = logging.getLogger(__name__)
+
+# Same concurrency limit as the threaded server, but waiting costs no thread so the queue can be long
+chat_admission = AdmissionController(max_queue=config.ASYNC_ADMISSION_MAX_QUEUE)
+metrics.ADMISSION_REQUESTS.set_function(
+    lambda: {(state,): count for state, count in chat_admission.stats().items() if state != "rejected"}
+)
+
+
+# --- ASGI helpers ---
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_response(send, status, body, content_type="application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload, headers=()):
+    await _send_response(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+
+def _accepts_event_stream(scope):
+    for name, value in scope.get("headers", ()):
+        if name == b"accept":
+            return b"text/event-stream" in value
+    return False
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+# --- Endpoints ---
+async def health_endpoint(scope, receive, send):
+    """Liveness probe: the process is up and serving requests."""
+    await _send_json(send, 200, {"status": "ok"})
+
+
+async def ready_endpoint(scope, receive, send):
+    """Readiness probe: 200 once every model is loaded, 503 (with per-model load state and timings) before."""
+    ready = registry.is_ready()
+    await _send_json(send, 200 if ready else 503, {"ready": ready, "models": registry.status()})
+
+
+async def metrics_endpoint(scope, receive, send):
+    await _send_response(send, 200, metrics.registry.render().encode("utf-8"), "text/plain; version=0.0.4")
+
+
+async def chat_endpoint(scope, receive, send):
+    """
+    Expects JSON: {'query': 'user question here'}. Streams the answer as text/plain, preceded by
+    "[QUEUE] <position>" lines while the request waits for a slot; 429 with Retry-After when the queue is full.
+    With `Accept: text/event-stream` the stream is server-sent events instead (see sse.py).
+    """
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        data = json.loads(body)
+    except ValueError:
+        logger.warning("Received non-JSON request")
+        metrics.CHAT_REQUESTS.inc(status="bad_request")
+        await _send_json(send, 400, {"error": "Request must be JSON"})
+        return
+    user_query = data.get("query") if isinstance(data, dict) else None
+    if not user_query:
+        logger.warning("Received request with missing 'query' field")
+        metrics.CHAT_REQUESTS.inc(status="bad_request")
+        await _send_json(send, 400, {"error": "Missing 'query' in request body"})
+        return
+
+    logger.info(f"Received query via async API: {user_query}")
+    ticket = chat_admission.try_enter()
+    if ticket is None:
+        retry_after = chat_admission.retry_after()
+        logger.warning(f"Admission queue full, rejecting query (Retry-After: {retry_after}s)")
+        metrics.CHAT_REQUESTS.inc(status="rejected")
+        await _send_json(send, 429, {"error": "Le serveur est très sollicité. Veuillez réessayer dans quelques instants.",
+                                     "retry_after": retry_after}, headers=[("retry-after", str(retry_after))])
+        return
+
+    received_at = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    outcome = {"status": "ok"}
+
+    async def stream_answer():
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+        if not ticket.admitted:
+            async for position in chat_admission.wait_for_turn_async(ticket):
+                await send({"type": "http.response.body", "more_body": True,
+                            "body": f"{config.QUEUE_POSITION_PREFIX}{position}\n".encode("utf-8")})
+            if not ticket.admitted:
+                outcome["status"] = "queue_timeout"
+                await send({"type": "http.response.body", "body":
+                            "Désolé, le serveur est trop sollicité pour le moment. Veuillez réessayer plus tard.".encode("utf-8")})
+                return
+        first_chunk = True
+        try:
+            async for token in coalesce_tokens_async(process_user_query_async(user_query)):
+                if not token:
+                    continue
+                if first_chunk:
+                    metrics.TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - received_at)
+                    first_chunk = False
+                await send({"type": "http.response.body", "body": token.encode("utf-8"), "more_body": True})
+        except Exception as e:
+            logger.error(f"Error during async response stream: {e}\n{traceback.format_exc()}")
+            outcome["status"] = "error"
+            await send({"type": "http.response.body", "body": f"\n\n[STREAM ERROR: {e}]".encode("utf-8"),
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def stream_events():
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        if not ticket.admitted:
+            async for position in chat_admission.wait_for_turn_async(ticket):
+                await send({"type": "http.response.body", "more_body": True,
+                            "body": format_event("queue", {"position": position}).encode("utf-8")})
+            if not ticket.admitted:
+                outcome["status"] = "queue_timeout"
+                await send({"type": "http.response.body", "body": format_event("done", {
+                    "elapsed": round(time.perf_counter() - received_at, 3),
+                    "error": "Désolé, le serveur est trop sollicité pour le moment. Veuillez réessayer plus tard.",
+                }).encode("utf-8")})
+                return
+
+        channel = AsyncEventChannel()
+
+        async def produce():
+            first_chunk = True
+            try:
+                async for token in process_user_query_async(user_query, on_progress=channel.emit):
+                    if not token:
+                        continue
+                    if first_chunk:
+                        metrics.TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - received_at)
+                        first_chunk = False
+                    channel.emit("token", token)
+                channel.emit("done", {"elapsed": round(time.perf_counter() - received_at, 3)})
+            except Exception as e:
+                logger.error(f"Error during async event stream: {e}\n{traceback.format_exc()}")
+                outcome["status"] = "error"
+                channel.emit("done", {"elapsed": round(time.perf_counter() - received_at, 3), "error": str(e)})
+            finally:
+                channel.close()
+
+        # The pipeline runs as its own task so progress events are sent while it awaits
+        producer = asyncio.ensure_future(produce())
+        try:
+            async for chunk in channel.events():
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        finally:
+            # Stops the pipeline at whatever stage it is in; its pending downloads and summaries are cancelled
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        await send({"type": "http.response.body", "body": b""})
+
+    stream_task = asyncio.ensure_future(stream_events() if _accepts_event_stream(scope) else stream_answer())
+    disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait([stream_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+        if not stream_task.done():
+            logger.info(f"Client disconnected, cancelling query: {user_query}")
+            outcome["status"] = "disconnected"
+            stream_task.cancel()
+        await asyncio.gather(stream_task, return_exceptions=True)
+    finally:
+        disconnect_task.cancel()
+        ticket.release()
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        metrics.STREAM_SECONDS.observe(time.perf_counter() - received_at)
+        metrics.CHAT_REQUESTS.inc(status=outcome["status"])
+
+
+ROUTES = {
+    ("GET", "/health"): health_endpoint,
+    ("GET", "/ready"): ready_endpoint,
+    ("GET", "/metrics"): metrics_endpoint,
+    ("POST", "/chat"): chat_endpoint,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if config.WARMUP_ON_STARTUP:
+                registry.warm_up_async()
+                logger.info("Model warm-up started in the background.")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        known_path = any(path == scope["path"] for _, path in ROUTES)
+        await _send_json(send, 405 if known_path else 404, {"error": "Method not allowed" if known_path else "Not found"})
+        return
+    await handler(scope, receive, send)
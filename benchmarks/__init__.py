@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Offline performance benchmarks for SupBot. Run modules with `python -m benchmarks.<name>`."""
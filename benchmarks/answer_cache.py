@@ -0,0 +1,78 @@
+# benchmarks/answer_cache.py
+"""
+Regression check for the answer cache's matching (answer_cache.AnswerCache).
+
+Each pair of questions is stored and looked up in a fresh cache: SAME pairs ask the same thing
+and may reuse the answer, DIFFERENT pairs must never get each other's answer. The script prints
+the similarity and decision of every pair, the SAME hit rate and the highest DIFFERENT similarity
+(the margin left below ANSWER_CACHE_SIMILARITY), and exits 1 if any DIFFERENT pair is served
+from the cache.
+
+Usage:
+    python -m benchmarks.answer_cache [--threshold 0.92]
+"""
+import sys
+import argparse
+import config
+from answer_cache import AnswerCache
+from keyword_extractor import query_terms
+
+SAME = [
+    ("Quels sont les frais d'inscription ?", "C'est combien les frais d'inscription ?"),
+    ("conditions d'admission au cycle ingénieur", "Quelles sont les conditions d'admission au cycle ingénieur ?"),
+    ("Où se trouve la bibliothèque ?", "où se trouve la bibliothèque"),
+    ("Quels sont les horaires de la bibliothèque ?", "Horaires de la bibliothèque ?"),
+    ("Comment contacter la scolarité ?", "Comment puis-je contacter la scolarité ?"),
+    ("Quels sont les clubs étudiants ?", "Quels clubs étudiants existent à SupCom ?"),
+    ("Quelle est l'adresse de SupCom ?", "Quelle est l'adresse de Sup'Com ?"),
+    ("Calendrier des examens", "Quel est le calendrier des examens ?"),
+    ("Frais d'inscription en master", "Quels sont les frais d'inscription en master ?"),
+    ("Quand commence la rentrée universitaire ?", "Quand est-ce que commence la rentrée universitaire ?"),
+]
+DIFFERENT = [
+    ("Quels sont les frais d'inscription pour les étudiants tunisiens ?",
+     "Quels sont les frais d'inscription pour les étudiants étrangers ?"),
+    ("Quelle est la date limite d'inscription en master ?", "Quelle est la date limite d'inscription en doctorat ?"),
+    ("Où a lieu la soutenance ?", "Quand a lieu la soutenance ?"),
+    ("Frais d'inscription en master", "Frais d'inscription en doctorat"),
+    ("Conditions d'admission en master", "Conditions d'admission au cycle ingénieur"),
+    ("Horaires de la bibliothèque", "Horaires de la scolarité"),
+    ("Calendrier des examens du premier semestre", "Calendrier des examens du deuxième semestre"),
+    ("Résultats des délibérations de juin", "Résultats des délibérations de juillet"),
+    ("Stage de fin d'études en France", "Stage de fin d'études en Allemagne"),
+    ("Quels sont les laboratoires de recherche ?", "Quels sont les projets de recherche ?"),
+]
+
+
+def check_pair(first, second, threshold):
+    """(similarity ignoring the terms check, whether `second` is served `first`'s cached answer)."""
+    cache = AnswerCache(threshold=threshold)
+    cache.store(first, "answer", [])
+    similarity = float(AnswerCache._embed_query(first, query_terms(first))
+                       @ AnswerCache._embed_query(second, query_terms(second)))
+    return similarity, cache.lookup(second) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the answer cache only matches questions that mean the same.")
+    parser.add_argument("--threshold", type=float, default=config.ANSWER_CACHE_SIMILARITY)
+    args = parser.parse_args()
+
+    results = {}
+    for label, pairs in (("same", SAME), ("different", DIFFERENT)):
+        results[label] = []
+        for first, second in pairs:
+            similarity, hit = check_pair(first, second, args.threshold)
+            results[label].append((similarity, hit))
+            print(f"{label:>9}  {similarity:.3f}  {'hit ' if hit else 'miss'}  {first!r} / {second!r}")
+
+    wrong = sum(hit for _, hit in results["different"])
+    print(f"Threshold {args.threshold}: {sum(hit for _, hit in results['same'])}/{len(SAME)} same-meaning pairs hit, "
+          f"{wrong}/{len(DIFFERENT)} different pairs served a wrong answer "
+          f"(highest different similarity {max(similarity for similarity, _ in results['different']):.3f}).")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
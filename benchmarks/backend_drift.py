@@ -0,0 +1,145 @@
+# benchmarks/backend_drift.py
+"""
+Compares the inference backends (config.INFERENCE_BACKEND choices) against the eager PyTorch path.
+
+For each backend it reports load time, RSS growth, latency and tokens/s, and the quality drift
+from eager on fixed inputs under greedy decoding:
+  - LLM: share of generated tokens identical to eager, first-step top-1 agreement and mean |logit diff|
+  - summarizer: character-level similarity of the summaries to the eager ones
+
+Usage:
+    python -m benchmarks.backend_drift [--backends eager int8 onnx] [--max-new-tokens 64] [--output FILE]
+"""
+import gc
+import json
+import time
+import argparse
+import difflib
+import torch
+from transformers import AutoTokenizer, GenerationConfig
+import config
+from inference_backends import BACKENDS
+
+QUESTIONS = [
+    "Quelles sont les conditions d'admission au cycle ingénieur ?",
+    "Quels laboratoires de recherche existent à SupCom ?",
+    "Comment se déroulent les stages ?",
+]
+CONTEXT = (
+    "[1] Source: https://www.supcom.tn/formations/Ing%C3%A9nieurs\n"
+    "   Summary: Le cycle ingénieur de SupCom dure trois ans et est accessible via le concours national.\n\n"
+)
+PAGES = [
+    "SupCom forme des ingénieurs en télécommunications. Le cycle dure trois ans et comprend des stages "
+    "en entreprise, un projet de fin d'études et des options en réseaux, sécurité et science des données. " * 6,
+    "Les laboratoires de recherche COSIM, GRESCOM, MEDIATRON, Innov'COM et CNAS travaillent sur les "
+    "systèmes de communication, les réseaux intelligents et le traitement du signal. " * 6,
+]
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_llm(backend, tokenizer, max_new_tokens):
+    start_rss, start = rss_mb(), time.time()
+    model = backend.load_causal_lm(config.MODEL_NAME, torch.float32)
+    result = {"load_seconds": time.time() - start, "rss_growth_mb": rss_mb() - start_rss, "outputs": [], "first_logits": []}
+    gen_config = GenerationConfig(max_new_tokens=max_new_tokens, do_sample=False,
+                                  pad_token_id=tokenizer.pad_token_id or tokenizer.eos_token_id)
+    generated_tokens, gen_seconds = 0, 0.0
+    for question in QUESTIONS:
+        prompt = config.FINAL_RESPONSE_PROMPT_TEMPLATE.format(user_query=question, context_data=CONTEXT)
+        input_ids = tokenizer.apply_chat_template([{"role": "system", "content": prompt}],
+                                                  add_generation_prompt=True, return_tensors="pt")
+        if not torch.is_tensor(input_ids):
+            input_ids = input_ids["input_ids"]
+        with torch.inference_mode():
+            result["first_logits"].append(model(input_ids=input_ids).logits[0, -1].float())
+            start = time.time()
+            output = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), generation_config=gen_config)
+            gen_seconds += time.time() - start
+        new_tokens = output[0, input_ids.shape[1]:].tolist()
+        generated_tokens += len(new_tokens)
+        result["outputs"].append(new_tokens)
+    result["tokens_per_second"] = generated_tokens / gen_seconds if gen_seconds else 0.0
+    del model
+    gc.collect()
+    return result
+
+
+def run_summarizer(backend):
+    start_rss, start = rss_mb(), time.time()
+    summarizer = backend.load_summarizer(config.SUMMARIZER_MODEL)
+    result = {"load_seconds": time.time() - start, "rss_growth_mb": rss_mb() - start_rss, "outputs": []}
+    start = time.time()
+    for page in PAGES:
+        inputs = summarizer.tokenizer(page, truncation=True, max_length=config.SUMMARY_MAX_INPUT_TOKENS, return_tensors="pt")
+        with torch.inference_mode():
+            output = summarizer.model.generate(**inputs, max_length=128, min_length=30, num_beams=4,
+                                               do_sample=False, no_repeat_ngram_size=3)
+        result["outputs"].append(summarizer.tokenizer.decode(output[0], skip_special_tokens=True))
+    result["seconds_per_page"] = (time.time() - start) / len(PAGES)
+    del summarizer
+    gc.collect()
+    return result
+
+
+def llm_drift(reference, candidate):
+    matching = total = 0
+    for ref_ids, cand_ids in zip(reference["outputs"], candidate["outputs"]):
+        total += max(len(ref_ids), len(cand_ids))
+        matching += sum(a == b for a, b in zip(ref_ids, cand_ids))
+    top1 = [int(torch.argmax(a) == torch.argmax(b)) for a, b in zip(reference["first_logits"], candidate["first_logits"])]
+    diffs = [float((a - b).abs().mean()) for a, b in zip(reference["first_logits"], candidate["first_logits"])]
+    return {
+        "token_agreement": matching / total if total else 1.0,
+        "first_token_top1_agreement": sum(top1) / len(top1),
+        "mean_abs_logit_diff": sum(diffs) / len(diffs),
+    }
+
+
+def summary_drift(reference, candidate):
+    ratios = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference["outputs"], candidate["outputs"])]
+    return {"summary_similarity": sum(ratios) / len(ratios)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference backends and their drift from eager.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output", default="backend_drift.json")
+    args = parser.parse_args()
+
+    backends = ["eager"] + [name for name in args.backends if name != "eager"]
+    tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
+    raw = {}
+    for name in backends:
+        backend = BACKENDS[name]()
+        print(f"Benchmarking backend '{name}'...")
+        try:
+            raw[name] = {"llm": run_llm(backend, tokenizer, args.max_new_tokens), "summarizer": run_summarizer(backend)}
+        except Exception as e:
+            print(f"  skipped: {e}")
+
+    report = {}
+    for name, result in raw.items():
+        report[name] = {
+            "llm": {key: result["llm"][key] for key in ("load_seconds", "rss_growth_mb", "tokens_per_second")},
+            "summarizer": {key: result["summarizer"][key] for key in ("load_seconds", "rss_growth_mb", "seconds_per_page")},
+        }
+        if name != "eager" and "eager" in raw:
+            report[name]["llm"].update(llm_drift(raw["eager"]["llm"], result["llm"]))
+            report[name]["summarizer"].update(summary_drift(raw["eager"]["summarizer"], result["summarizer"]))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/compare.py
+"""
+Compares two benchmarks.stages result files and flags regressions.
+
+Metrics ending in `_per_second` are better when higher, all others (latencies) when lower.
+A metric regresses when its p50 (or p95) moves the wrong way by more than --threshold (relative).
+The exit status is 1 when any metric regressed, so the script can gate CI.
+
+Usage:
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 0.10] [--stat p50 p95]
+"""
+import sys
+import json
+import argparse
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=0.10, stats=("p50", "p95")):
+    """Returns rows (stage, metric, stat, old, new, relative change, status)."""
+    rows = []
+    for stage, metrics in new["stages"].items():
+        old_metrics = old["stages"].get(stage, {})
+        for metric, values in metrics.items():
+            old_values = old_metrics.get(metric)
+            if not isinstance(values, dict) or not isinstance(old_values, dict):
+                continue
+            higher_is_better = metric.endswith("_per_second")
+            for stat in stats:
+                before, after = old_values.get(stat), values.get(stat)
+                if before is None or after is None:
+                    continue
+                change = (after - before) / before if before else 0.0
+                worse = -change if higher_is_better else change
+                status = "REGRESSION" if worse > threshold else "improved" if worse < -threshold else "ok"
+                rows.append((stage, metric, stat, before, after, change, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--stat", nargs="+", default=["p50", "p95"])
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    print(f"old: {old['meta'].get('commit')} ({old['meta'].get('timestamp')})  "
+          f"new: {new['meta'].get('commit')} ({new['meta'].get('timestamp')})")
+    rows = compare(old, new, args.threshold, args.stat)
+    for stage, metric, stat, before, after, change, status in rows:
+        print(f"{stage:>13}.{metric:<22} {stat:<4} {before:10.2f} -> {after:10.2f}  {change:+7.1%}  {status}")
+    regressions = [row for row in rows if row[-1] == "REGRESSION"]
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%} in {len(rows)} comparison(s).")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
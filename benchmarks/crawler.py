@@ -0,0 +1,150 @@
+# benchmarks/crawler.py
+"""
+Regression check for the offline crawler (crawler.SiteCrawler) against the fixture site.
+
+Each scenario crawls the small fixture pages served by OfflineServer into a temporary summaries.db,
+with a stand-in summarizer injected through SiteCrawler's `llm` argument, and checks what was
+summarized, kept and revalidated:
+  first crawl      every page is summarized and its validators are stored with the summary
+  recrawl          unchanged pages are answered with 304 and nothing is summarized
+  changed page     only the page whose content changed is summarized again
+  failed summary   no validators are stored, so the next crawl downloads and summarizes the pages
+  interrupted run  pages queued for summarization when the run stopped are summarized on resume
+  curated rows     summaries without a fingerprint are kept and fingerprinted; --force regenerates them
+  no sitemap       pages found only by following links are revisited when their parent is a 304
+Exits 1 if any check fails.
+
+Usage:
+    python -m benchmarks.crawler
+"""
+import os
+import sys
+import shutil
+import tempfile
+from benchmarks.offline_site import OfflineServer, build_pages
+from crawler import SiteCrawler
+from summary_store import SummaryStore
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class StubLLM:
+    """summarize_many stand-in: counts the pages it is given; can fail every page or stop the run."""
+
+    def __init__(self, fail=False, interrupt=False):
+        self.fail = fail
+        self.interrupt = interrupt
+        self.summarized = 0
+
+    def summarize_many(self, texts, search_terms, user_query):
+        if self.interrupt:
+            raise _Interrupted()
+        self.summarized += len(texts)
+        if self.fail:
+            return [{"summary": None, "error": "stub failure"} for _ in texts]
+        return [{"summary": f"Résumé de {text[:40]}", "error": None} for text in texts]
+
+
+class Scenario:
+    def __init__(self, server, workdir, name):
+        self.server = server
+        self.store = SummaryStore(os.path.join(workdir, f"{name}.db"))
+        self.urls = [server.page_url(slug) for slug in server.pages]
+
+    def crawl(self, llm, fresh=True, force=False):
+        crawler = SiteCrawler(start_url=self.urls[0], max_pages=len(self.urls) * 2, rate=0, batch_size=4,
+                              store=self.store, llm=llm, force=force)
+        return crawler.run(fresh=fresh)
+
+    def with_validators(self):
+        return sum(self.store.get_validators(url) is not None for url in self.urls)
+
+    def summaries(self):
+        return {url: (self.store.get(url) or {}).get("summary") for url in self.urls}
+
+
+def _scenarios(server, workdir):
+    pages = len(server.pages)
+
+    scenario = Scenario(server, workdir, "first")
+    llm = StubLLM()
+    scenario.crawl(llm)
+    yield "first crawl summarizes every page", llm.summarized == pages, f"{llm.summarized}/{pages}"
+    yield "first crawl stores validators", scenario.with_validators() == pages, f"{scenario.with_validators()}/{pages}"
+
+    llm, not_modified = StubLLM(), server.requests["not_modified"]
+    stats = scenario.crawl(llm)
+    revalidated = server.requests["not_modified"] - not_modified
+    yield "recrawl summarizes nothing", llm.summarized == 0, f"{llm.summarized} summarized"
+    yield "recrawl gets 304 for every page", revalidated == pages, f"{revalidated}/{pages}, stats {stats}"
+
+    slug = next(iter(server.pages))
+    server.pages[slug] = dict(server.pages[slug], html=server.pages[slug]["html"].replace(b"</article>", b"<p>Nouveau.</p></article>"))
+    llm = StubLLM()
+    scenario.crawl(llm)
+    yield "changed page is summarized again", llm.summarized == 1, f"{llm.summarized} summarized"
+
+    scenario = Scenario(server, workdir, "failed")
+    scenario.crawl(StubLLM(fail=True))
+    yield "failed summaries store no validators", scenario.with_validators() == 0, f"{scenario.with_validators()} stored"
+    llm = StubLLM()
+    scenario.crawl(llm)
+    yield "failed pages are summarized next crawl", llm.summarized == pages, f"{llm.summarized}/{pages}"
+
+    scenario = Scenario(server, workdir, "interrupted")
+    try:
+        scenario.crawl(StubLLM(interrupt=True))
+    except _Interrupted:
+        pass
+    yield "interrupted run stores no validators", scenario.with_validators() == 0, f"{scenario.with_validators()} stored"
+    llm = StubLLM()
+    scenario.crawl(llm, fresh=False)
+    done = sum(summary is not None for summary in scenario.summaries().values())
+    yield "resumed run summarizes queued pages", done == pages, f"{done}/{pages} summarized"
+
+    scenario = Scenario(server, workdir, "curated")
+    scenario.store.put_many([(url, f"Résumé rédigé pour {url}", None) for url in scenario.urls])
+    llm = StubLLM()
+    scenario.crawl(llm)
+    kept = sum(summary.startswith("Résumé rédigé") for summary in scenario.summaries().values())
+    fingerprinted = len(scenario.store.get_content_hashes(scenario.urls))
+    yield "curated rows are kept", kept == pages and llm.summarized == 0, f"{kept}/{pages} kept, {llm.summarized} summarized"
+    yield "curated rows are fingerprinted", fingerprinted == pages, f"{fingerprinted}/{pages}"
+    llm = StubLLM()
+    scenario.crawl(llm, force=True)
+    yield "--force regenerates curated rows", llm.summarized == pages, f"{llm.summarized}/{pages}"
+
+    server.sitemap = False
+    try:
+        scenario = Scenario(server, workdir, "no-sitemap")
+        first = scenario.crawl(StubLLM())["fetched"]
+        not_modified = server.requests["not_modified"]
+        second = scenario.crawl(StubLLM())["fetched"]
+        revalidated = server.requests["not_modified"] - not_modified
+    finally:
+        server.sitemap = True
+    yield "links are followed without a sitemap", first == pages, f"{first}/{pages} fetched"
+    yield "recrawl without a sitemap reaches every page", second == first and revalidated == first, \
+        f"{second}/{first} fetched, {revalidated} with 304"
+
+
+def main():
+    pages = {slug: page for slug, page in build_pages().items() if slug.endswith("-small")}
+    workdir = tempfile.mkdtemp(prefix="crawler-check-")
+    failures = 0
+    try:
+        with OfflineServer(pages=pages) as server:
+            for name, ok, detail in _scenarios(server, workdir):
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'}  {name} ({detail})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{failures} failed check(s).")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
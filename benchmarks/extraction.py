@@ -0,0 +1,127 @@
+# benchmarks/extraction.py
+"""
+Compares the HTML extraction engines (config.HTML_EXTRACTOR choices) on the fixture pages.
+
+For each installed engine and page size it reports the extraction latency and, against the
+article text of the fixture, how much of the main content is kept (main_recall) and how much
+of the output is page chrome (chrome_share). A "gallery" page, the large page followed by
+several megabytes of image markup, shows the effect of the download byte cap
+(SCRAPE_MAX_BYTES): it is extracted both in full and capped.
+
+Results use the benchmarks.stages format (one "stage" per engine), so two runs can be compared
+with `python -m benchmarks.compare OLD NEW`.
+
+Usage:
+    python -m benchmarks.extraction [--engines soup lxml selectolax] [--repeat N] [--output FILE]
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+from bs4 import BeautifulSoup
+import config
+from html_extract import EXTRACTORS
+from benchmarks.offline_site import build_pages, SIZES
+from benchmarks.stages import summarize_samples, _git_commit
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def gallery_page(html, figures=20000):
+    """The page with `figures` image entries appended after its main content (about 3 MB more markup)."""
+    gallery = "".join(
+        f'<figure><a href="/media/photo-{i}.jpg"><img src="/media/thumb-{i}.jpg" alt="Photo {i}" '
+        f'width="320" height="240" loading="lazy"></a><figcaption>Photo {i}</figcaption></figure>'
+        for i in range(figures)
+    )
+    return html.replace(b"</main>", f'</main><section class="gallery">{gallery}</section>'.encode("utf-8"))
+
+
+def _words(text):
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def fixtures():
+    """{name: (html bytes, article words, chrome words)} for one topic in every size plus the gallery page."""
+    pages = build_pages()
+    result = {}
+    for size in SIZES:
+        html = pages[f"formation-{size}"]["html"]
+        soup = BeautifulSoup(html, "html.parser")
+        article = _words(soup.find("article").get_text(" "))
+        chrome = set()
+        for tag in soup(["header", "nav", "aside", "footer"]):
+            chrome |= _words(tag.get_text(" "))
+        result[size] = (html, article, chrome - article)
+    html, article, chrome = result["large"]
+    result["gallery"] = (gallery_page(html), article, chrome)
+    return result
+
+
+def bench_engine(extractor, pages, repeat, max_chars):
+    metrics = {}
+    for name, (html, article, chrome) in pages.items():
+        variants = {name: html}
+        if len(html) > config.SCRAPE_MAX_BYTES:
+            variants[f"{name}_capped"] = html[:config.SCRAPE_MAX_BYTES]
+        for label, content in variants.items():
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                text = extractor.extract(content, max_chars)
+                samples.append((time.perf_counter() - start) * 1000)
+            words = _words(text)
+            metrics[f"{label}_ms"] = samples
+            metrics[f"{label}_chars"] = [len(text)]
+            metrics[f"{label}_main_recall"] = [len(words & article) / max(len(article), 1)]
+            metrics[f"{label}_chrome_share"] = [len(words & chrome) / max(len(words), 1)]
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML extraction engines on fixture pages.")
+    parser.add_argument("--engines", nargs="+", default=list(EXTRACTORS), choices=list(EXTRACTORS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="extraction_results.json")
+    args = parser.parse_args()
+
+    max_chars = config.SCRAPE_MAX_TOKENS * 4 # Same cap as web_scraper.clean_html
+    pages = fixtures()
+    results = {}
+    for name in args.engines:
+        try:
+            extractor = EXTRACTORS[name]()
+        except ImportError as e:
+            print(f"Skipping '{name}': {e}")
+            continue
+        print(f"Running engine '{name}'...", flush=True)
+        metrics = bench_engine(extractor, pages, args.repeat, max_chars)
+        results[name] = {metric: summarize_samples(samples) for metric, samples in metrics.items()}
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "max_chars": max_chars,
+            "max_bytes": config.SCRAPE_MAX_BYTES,
+            "page_bytes": {name: len(html) for name, (html, _, _) in pages.items()},
+        },
+        "stages": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, metrics in results.items():
+        for metric, stats in metrics.items():
+            value = f"p50={stats['p50']:10.2f}  p95={stats['p95']:10.2f}" if metric.endswith("_ms") else f"{stats['p50']:.3f}"
+            print(f"{name:>10}.{metric:<30} {value}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/keywords.py
+"""
+Compares the keyword extraction modes (config.KEYWORD_MODE choices) on a corpus of user queries.
+
+Each query comes with the keywords a good search should use. For each mode the benchmark reports
+precision, recall and F1 of the extracted keywords (the base keyword "SupCom" excluded), the
+agreement with spaCy's output, and latencies: one query with the memo cleared (cold_ms), a memo
+hit (memo_hit_ms), and a whole replayed query log through extract_keywords_many (batch_ms per
+query). The spaCy mode is skipped when the model cannot be loaded.
+
+Results use the benchmarks.stages format (one "stage" per mode), so two runs can be compared
+with `python -m benchmarks.compare OLD NEW`.
+
+Usage:
+    python -m benchmarks.keywords [--modes spacy fast] [--repeat N] [--log-size N] [--output FILE]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from datetime import datetime
+import keyword_extractor
+from keyword_extractor import extract_keywords, extract_keywords_many, clear_cache, BASE_KEYWORD
+from benchmarks.stages import summarize_samples, _git_commit
+
+MODES = ("spacy", "fast")
+
+# (query, expected keywords): lemmas of the nouns a search for the question needs
+CORPUS = [
+    ("Quelles sont les conditions d'admission au cycle ingénieur ?", {"condition", "admission", "cycle", "ingénieur"}),
+    ("Quels laboratoires de recherche existent à SupCom ?", {"laboratoire", "recherche"}),
+    ("Comment trouver un stage de fin d'études ?", {"stage", "fin", "étude"}),
+    ("Quels sont les partenariats internationaux de l'école ?", {"partenariat", "école"}),
+    ("Où se trouve le campus et comment le contacter ?", {"campus"}),
+    ("Quel est le numéro de téléphone de la scolarité ?", {"numéro", "téléphone", "scolarité"}),
+    ("Quels sont les frais d'inscription ?", {"frais", "inscription"}),
+    ("Calendrier des examens du premier semestre", {"calendrier", "examen", "semestre"}),
+    ("Y a-t-il des clubs étudiants à Sup'Com ?", {"club", "étudiant"}),
+    ("Comment s'inscrire au concours national d'entrée ?", {"concours", "entrée"}),
+    ("Quelles options sont proposées en deuxième année ?", {"option", "année"}),
+    ("Qui est le directeur de l'école ?", {"directeur", "école"}),
+    ("Liste des enseignants du département réseaux", {"liste", "enseignant", "département", "réseau"}),
+    ("Peut-on faire un double diplôme à l'étranger ?", {"diplôme", "étranger"}),
+    ("Dates de soutenance des projets de fin d'études", {"date", "soutenance", "projet", "fin", "étude"}),
+    ("Où consulter l'emploi du temps ?", {"emploi", "temps"}),
+    ("Le mastère de recherche en télécommunications", {"mastère", "recherche", "télécommunication"}),
+    ("Comment obtenir une attestation de réussite ?", {"attestation", "réussite"}),
+    ("Quels sont les horaires de la bibliothèque ?", {"horaire", "bibliothèque"}),
+    ("Bourses d'études pour les étudiants étrangers", {"bourse", "étude", "étudiant"}),
+    ("Je cherche les offres d'emploi des entreprises partenaires", {"offre", "emploi", "entreprise", "partenaire"}),
+    ("Quelles thèses ont été soutenues cette année ?", {"thèse", "année"}),
+    ("Comment accéder à la plateforme e-learning ?", {"plateforme", "e-learning"}),
+    ("Résultats des délibérations de juin", {"résultat", "délibération", "juin"}),
+    ("Règlement intérieur et absences aux cours", {"règlement", "absence", "cours"}),
+    ("Y a-t-il un foyer universitaire près de l'école ?", {"foyer", "école"}),
+    ("Quel est le programme du cycle préparatoire ?", {"programme", "cycle"}),
+    ("Les travaux de recherche en intelligence artificielle", {"travail", "recherche", "intelligence"}),
+    ("Contact du bureau des relations internationales", {"contact", "bureau", "relation"}),
+    ("Quand commence la rentrée universitaire ?", {"rentrée"}),
+]
+
+
+def _extracted(keywords):
+    return [word for word in keywords.split() if word.lower() != BASE_KEYWORD.lower()]
+
+
+def quality(mode):
+    """Mean precision, recall and F1 of the mode's keywords against CORPUS, and its keywords per query."""
+    clear_cache()
+    metrics = {"precision": [], "recall": [], "f1": []}
+    outputs = []
+    for query, expected in CORPUS:
+        words = _extracted(extract_keywords(query, mode=mode))
+        outputs.append(words)
+        # Only three keywords fit next to the base keyword
+        expected_top = min(len(expected), keyword_extractor.MAX_KEYWORDS - 1)
+        hits = len(set(words) & expected)
+        precision = hits / len(words) if words else 0.0
+        recall = min(hits / expected_top, 1.0)
+        metrics["precision"].append(precision)
+        metrics["recall"].append(recall)
+        metrics["f1"].append(2 * precision * recall / (precision + recall) if hits else 0.0)
+    return metrics, outputs
+
+
+def latency(mode, repeat, log_size, seed):
+    queries = [query for query, _ in CORPUS]
+    cold, hits, batch = [], [], []
+    for _ in range(repeat):
+        clear_cache()
+        for query in queries:
+            start = time.perf_counter()
+            extract_keywords(query, mode=mode)
+            cold.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            extract_keywords(query, mode=mode)
+            hits.append((time.perf_counter() - start) * 1000)
+    # A query log: the corpus queries repeated, with case and punctuation variants
+    rng = random.Random(seed)
+    log = []
+    for _ in range(log_size):
+        query = rng.choice(queries)
+        log.append(rng.choice([query, query.lower(), query.rstrip(" ?")]))
+    for _ in range(repeat):
+        clear_cache()
+        start = time.perf_counter()
+        extract_keywords_many(log, mode=mode)
+        batch.append((time.perf_counter() - start) * 1000 / len(log))
+    return {"cold_ms": cold, "memo_hit_ms": hits, "batch_ms": batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the keyword extraction modes on a query corpus.")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--log-size", type=int, default=1000, help="Queries in the replayed query log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="keywords_results.json")
+    args = parser.parse_args()
+
+    results, outputs = {}, {}
+    for mode in args.modes:
+        if mode == "spacy" and keyword_extractor._get_nlp() is None:
+            print("Skipping 'spacy': the spaCy model could not be loaded.")
+            continue
+        print(f"Running mode '{mode}'...", flush=True)
+        metrics, outputs[mode] = quality(mode)
+        metrics.update(latency(mode, args.repeat, args.log_size, args.seed))
+        results[mode] = metrics
+    if "spacy" in outputs and "fast" in outputs:
+        # Share of spaCy's keywords the fast mode also finds
+        results["fast"]["spacy_agreement"] = [
+            len(set(fast) & set(spacy)) / len(spacy) if spacy else 1.0
+            for fast, spacy in zip(outputs["fast"], outputs["spacy"])
+        ]
+    results = {mode: {metric: summarize_samples(samples) for metric, samples in metrics.items()}
+               for mode, metrics in results.items()}
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "queries": len(CORPUS),
+            "log_size": args.log_size,
+        },
+        "stages": results,
+        "keywords": {mode: {query: " ".join(words) for (query, _), words in zip(CORPUS, mode_outputs)}
+                     for mode, mode_outputs in outputs.items()},
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    for mode, metrics in results.items():
+        for metric, stats in metrics.items():
+            value = f"p50={stats['p50']:8.3f}  p95={stats['p95']:8.3f}" if metric.endswith("_ms") else f"mean={stats['mean']:.3f}"
+            print(f"{mode:>6}.{metric:<16} {value}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/local_index.py
+"""
+Calibration check for answering from local summaries (local_index.LocalIndex, LOCAL_INDEX_CONFIDENCE).
+
+Runs a list of questions against a temporary copy of summaries.db: ON_TOPIC questions are answered
+by a known summary, OFF_TOPIC questions by none of them and must fall back to web search. Prints
+the top score, matching page and query-term coverage of every question (search terms from
+extract_keywords in config.KEYWORD_MODE, as in production), how many ON_TOPIC questions
+are answered locally (from the right page), the lowest ON_TOPIC and highest OFF_TOPIC scores, and
+exits 1 if any OFF_TOPIC question reaches the threshold.
+
+Usage:
+    python -m benchmarks.local_index [--db summaries.db] [--threshold 0.27]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import config
+from keyword_extractor import extract_keywords
+from local_index import LocalIndex
+from summary_store import SummaryStore
+
+ON_TOPIC = [
+    ("Comment obtenir un logement au foyer universitaire ?", "/pages/logement"),
+    ("Quels sont les laboratoires de recherche ?", "/laboratoires/"),
+    ("Quels clubs sportifs existent ?", "/pages/clubs-sportifs"),
+    ("Comment proposer un stage à SupCom ?", "/pages/stages"),
+    ("Quelles sont les conditions du doctorat en TIC ?", "/formations/Doctorat"),
+    ("Quel est le règlement des études du cycle ingénieur ?", "/pages/Reglement_ingenieur"),
+    ("Qu'est-ce que le laboratoire COSIM ?", "/laboratoires/COSIM"),
+    ("Quels sont les partenaires industriels ?", "/partenaires/Partenaires%20industriels"),
+    ("Parlez-moi du forum annuel", "/pages/forum"),
+    ("Quels sont les clubs culturels ?", "/pages/clubs-culturels"),
+    ("Quelle est la démarche qualité de l'école ?", "/pages/demarche-qualite"),
+    ("Quels programmes de mobilité internationale ?", "/pages/mobilite"),
+    ("Qui sont les enseignants chercheurs ?", "/staff_academique"),
+    ("Présentation du département informatique et réseaux", "/departments/Informatique"),
+]
+OFF_TOPIC = [
+    "Quelle est l'adresse email de la scolarité ?",
+    "Quels sont les horaires de la bibliothèque ?",
+    "Quel est le menu du restaurant universitaire aujourd'hui ?",
+    "Quand sont publiés les résultats du concours ?",
+    "Combien coûtent les frais d'inscription ?",
+    "Comment obtenir une bourse d'études ?",
+    "Quelle est la météo à Tunis ?",
+    "Comment réinitialiser mon mot de passe de messagerie ?",
+    "Où acheter une carte de transport ?",
+    "Quel est le numéro de téléphone du service médical ?",
+    "Quand est la date limite de paiement ?",
+    "Comment demander une attestation de présence ?",
+]
+
+
+def top_hit(index, question):
+    # The search terms production passes to the index: extract_keywords in config.KEYWORD_MODE
+    hits = index.search(question, extract_keywords(question), k=1)
+    return hits[0] if hits else {"url": "", "score": 0.0, "coverage": 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the local index's confidence threshold against on- and off-topic questions.")
+    parser.add_argument("--db", default=config.SUMMARIES_DB_PATH, help="Database to copy (it is never modified)")
+    parser.add_argument("--threshold", type=float, default=config.LOCAL_INDEX_CONFIDENCE)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="local-index-check-")
+    try:
+        db_path = os.path.join(workdir, "summaries.db")
+        shutil.copyfile(args.db, db_path)
+        index = LocalIndex(SummaryStore(db_path))
+        on_scores, answered, wrong_page = [], 0, 0
+        for question, expected in ON_TOPIC:
+            hit = top_hit(index, question)
+            local = hit["score"] >= args.threshold
+            answered += local
+            wrong_page += local and expected not in hit["url"]
+            on_scores.append(hit["score"])
+            print(f"on-topic   {hit['score']:.3f}  cov {hit['coverage']:.2f}  {'local' if local else 'web  '}  "
+                  f"{hit['url']}  {question!r}")
+        off_scores = []
+        for question in OFF_TOPIC:
+            hit = top_hit(index, question)
+            off_scores.append(hit["score"])
+            print(f"off-topic  {hit['score']:.3f}  cov {hit['coverage']:.2f}  "
+                  f"{'LOCAL' if hit['score'] >= args.threshold else 'web  '}  {hit['url']}  {question!r}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    wrong = sum(score >= args.threshold for score in off_scores)
+    print(f"Threshold {args.threshold}: {answered}/{len(ON_TOPIC)} on-topic questions answered locally "
+          f"({wrong_page} from the wrong page), {wrong}/{len(OFF_TOPIC)} off-topic questions answered locally "
+          f"(lowest on-topic {min(on_scores):.3f}, highest off-topic {max(off_scores):.3f}).")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
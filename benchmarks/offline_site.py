@@ -0,0 +1,167 @@
+# benchmarks/offline_site.py
+"""
+Local stand-ins for the network: a fake Google Custom Search endpoint and a fixture copy of the site.
+
+Both are served by one threaded HTTP server on 127.0.0.1:
+  - /customsearch/v1?q=...&num=N   returns CSE-shaped JSON whose items link to fixture pages
+  - /site/<slug>.html               fixture pages (ETag/Last-Modified, 304 on conditional GET)
+  - /sitemap.xml                    lists every fixture page (404 with sitemap=False)
+Pages are generated deterministically from a seed, in three sizes, with the usual page chrome
+(nav, header, footer, scripts, styles) around the main content.
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+TOPICS = {
+    "admission": "Admission au cycle ingénieur",
+    "formation": "Formation d'ingénieurs en télécommunications",
+    "recherche": "Laboratoires de recherche",
+    "stages": "Stages et projets de fin d'études",
+    "international": "Relations internationales et doubles diplômes",
+    "vie-etudiante": "Vie étudiante et clubs",
+    "mastere": "Mastères de recherche et professionnels",
+    "doctorat": "École doctorale",
+    "entreprises": "Partenariats avec les entreprises",
+    "contact": "Contact et accès au campus",
+}
+SIZES = {"small": 4, "medium": 40, "large": 400}  # main-content paragraphs per page
+
+_WORDS = (
+    "supcom école ingénieur télécommunications réseaux étudiants formation recherche laboratoire "
+    "stage projet diplôme master doctorat entreprise partenariat international admission concours "
+    "cycle semestre module enseignement sécurité données signal systèmes intelligence artificielle "
+    "innovation campus club cours examen crédit mobilité échange université tunisie ariana "
+    "le la les des du de et en pour avec dans sur par une un est sont au aux"
+).split()
+_LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def _paragraph(rng, topic_words):
+    words = [rng.choice(topic_words if rng.random() < 0.3 else _WORDS) for _ in range(rng.randint(40, 90))]
+    return " ".join(words).capitalize() + "."
+
+
+def build_pages(seed=0):
+    """Returns {slug: {'title', 'keywords', 'html'}} with one page per (topic, size)."""
+    rng = random.Random(seed)
+    nav = "".join(f'<li><a href="/site/{slug}-small.html">{title}</a></li>' for slug, title in TOPICS.items())
+    pages = {}
+    for topic, title in TOPICS.items():
+        topic_words = title.lower().replace("'", " ").split()
+        for size, paragraphs in SIZES.items():
+            slug = f"{topic}-{size}"
+            body = "".join(f"<p>{_paragraph(rng, topic_words)}</p>" for _ in range(paragraphs))
+            html = (
+                f"<!DOCTYPE html><html lang=\"fr\"><head><meta charset=\"utf-8\"><title>{title}</title>"
+                f"<style>body {{ font-family: sans-serif; }} .menu li {{ display: inline; }}</style>"
+                f"<script>window.dataLayer = window.dataLayer || []; function gtag() {{ dataLayer.push(arguments); }}</script>"
+                f"</head><body><header><h1>SupCom</h1><p>École Supérieure des Communications de Tunis</p></header>"
+                f"<nav><ul class=\"menu\">{nav}</ul></nav>"
+                f"<main><article><h2>{title}</h2>{body}</article></main>"
+                f"<aside><h3>Actualités</h3><ul>{nav}</ul></aside>"
+                f"<footer><p>© SupCom - Cité Technologique des Communications, Ariana</p>{nav}</footer>"
+                f"<script>gtag('js', new Date());</script></body></html>"
+            )
+            pages[slug] = {"title": title, "keywords": set(topic_words), "html": html.encode("utf-8")}
+    return pages
+
+
+class OfflineServer:
+    """Serves the fake CSE API and the fixture site; `latency` seconds are added to every response."""
+
+    def __init__(self, pages=None, latency=0.0, sitemap=True):
+        self.pages = pages or build_pages()
+        self.latency = latency
+        self.sitemap = sitemap
+        self.requests = {"search": 0, "page": 0, "not_modified": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="offline-server", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self):
+        return f"{self.base_url}/customsearch/v1"
+
+    def page_url(self, slug):
+        return f"{self.base_url}/site/{slug}.html"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def search(self, query, num):
+        """Ranks fixture pages by keyword overlap with `query`, like a (very) small search engine."""
+        terms = set(query.lower().replace("'", " ").split())
+        ranked = sorted(self.pages, key=lambda slug: (-len(terms & self.pages[slug]["keywords"]), slug))
+        return [
+            {"title": self.pages[slug]["title"], "link": self.page_url(slug),
+             "snippet": self.pages[slug]["title"], "displayLink": urlparse(self.base_url).netloc}
+            for slug in ranked[:num]
+        ]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                parsed = urlparse(self.path)
+                if parsed.path == "/customsearch/v1":
+                    server.requests["search"] += 1
+                    params = parse_qs(parsed.query)
+                    items = server.search(params.get("q", [""])[0], int(params.get("num", ["10"])[0]))
+                    self._send(200, json.dumps({"items": items}).encode("utf-8"), "application/json")
+                elif parsed.path == "/sitemap.xml" and server.sitemap:
+                    locs = "".join(f"<url><loc>{server.page_url(slug)}</loc></url>" for slug in server.pages)
+                    body = f'<?xml version="1.0"?><urlset>{locs}</urlset>'.encode("utf-8")
+                    self._send(200, body, "application/xml")
+                elif parsed.path.startswith("/site/") and parsed.path.endswith(".html"):
+                    page = server.pages.get(parsed.path[len("/site/"):-len(".html")])
+                    if page is None:
+                        self._send(404, b"Not Found")
+                        return
+                    etag = '"' + hashlib.md5(page["html"]).hexdigest() + '"'
+                    validators = {"ETag": etag, "Last-Modified": _LAST_MODIFIED}
+                    if self.headers.get("If-None-Match") == etag:
+                        server.requests["not_modified"] += 1
+                        self._send(304, headers=validators)
+                        return
+                    server.requests["page"] += 1
+                    self._send(200, page["html"], headers=validators)
+                else:
+                    self._send(404, b"Not Found")
+
+        return Handler
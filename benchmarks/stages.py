@@ -0,0 +1,275 @@
+# benchmarks/stages.py
+"""
+Per-stage micro-benchmarks of the query pipeline, runnable fully offline.
+
+Google CSE and the target site are replaced by a local server (benchmarks.offline_site), and
+summaries.db / the search cache live in a temporary directory, so runs never touch the network or
+the real databases. With --tiny the LLM and summarizer are miniature random models (benchmarks.tiny_models)
+loaded through the normal code path, which makes a full run take seconds instead of minutes.
+
+Stages:
+  keywords      extract_keywords (config.KEYWORD_MODE): memo cleared, then memo hits
+  search        search_google against the fake CSE (cold and cached)
+  clean         clean_html on fixture pages of each size, and retrieve_content end to end
+  summaries_db  SummaryStore lookups and writes
+  summarize     summarize_content per page size and one summarize_many batch
+  generate      generate_final_response (stream): time to first token and tokens per second
+
+Results are written as JSON; compare two runs with `python -m benchmarks.compare OLD NEW`.
+
+Usage:
+    python -m benchmarks.stages [--tiny] [--stages clean search ...] [--repeat N] [--output FILE]
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+import config
+from benchmarks.offline_site import OfflineServer, SIZES, TOPICS
+
+logger = logging.getLogger(__name__)
+
+QUERIES = [
+    "Quelles sont les conditions d'admission au cycle ingénieur ?",
+    "Quels laboratoires de recherche existent à SupCom ?",
+    "Comment trouver un stage de fin d'études ?",
+    "Quels sont les partenariats internationaux de l'école ?",
+    "Où se trouve le campus et comment le contacter ?",
+]
+
+
+def summarize_samples(samples):
+    """mean/p50/p95/min/max over a list of numbers."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+
+
+def _time_ms(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+class StageContext:
+    """Shared state for the stage functions: the offline server, scratch paths and run options."""
+
+    def __init__(self, server, workdir, repeat, seed):
+        self.server = server
+        self.workdir = workdir
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self._clean_texts = None
+
+    def clean_texts(self):
+        """Cleaned text of one fixture page per size."""
+        if self._clean_texts is None:
+            from web_scraper import clean_html
+            self._clean_texts = {
+                size: clean_html(self.server.pages[f"formation-{size}"]["html"]) for size in SIZES
+            }
+        return self._clean_texts
+
+
+# --- Stages: each returns {metric: [samples]} ---
+def bench_keywords(ctx):
+    from keyword_extractor import extract_keywords, clear_cache
+    samples, hits = [], []
+    for _ in range(ctx.repeat):
+        clear_cache()
+        for query in QUERIES:
+            samples.append(_time_ms(extract_keywords, query))
+            hits.append(_time_ms(extract_keywords, query))
+    return {"latency_ms": samples, "memo_hit_ms": hits}
+
+
+def bench_search(ctx):
+    from search_service import search_google
+    cold, cached = [], []
+    for i in range(ctx.repeat):
+        for query in QUERIES:
+            cold.append(_time_ms(search_google, f"{query} run{i}")) # New terms: cache miss, API call
+            cached.append(_time_ms(search_google, f"{query} run{i}"))
+    return {"cold_ms": cold, "cached_ms": cached}
+
+
+def bench_clean(ctx):
+    from web_scraper import clean_html, retrieve_content
+    metrics = {}
+    for size in SIZES:
+        html = ctx.server.pages[f"formation-{size}"]["html"]
+        metrics[f"clean_{size}_ms"] = [_time_ms(clean_html, html) for _ in range(ctx.repeat)]
+    url = ctx.server.page_url("formation-medium")
+    metrics["retrieve_content_ms"] = [_time_ms(retrieve_content, url) for _ in range(ctx.repeat)]
+    return metrics
+
+
+def bench_summaries_db(ctx, rows=2000):
+    from summary_store import SummaryStore
+    store = SummaryStore(os.path.join(ctx.workdir, "bench_summaries.db"))
+    urls = [f"https://www.supcom.tn/page/{i}" for i in range(rows)]
+    summary = " ".join(TOPICS.values()) * 5
+    store.put_many([(url, summary, None) for url in urls])
+    metrics = {"get_hit_ms": [], "get_miss_ms": [], "get_many_5_ms": [], "put_ms": []}
+    for i in range(ctx.repeat * 20):
+        metrics["get_hit_ms"].append(_time_ms(store.get, ctx.rng.choice(urls)))
+        metrics["get_miss_ms"].append(_time_ms(store.get, f"https://www.supcom.tn/missing/{i}"))
+        metrics["get_many_5_ms"].append(_time_ms(store.get_many, ctx.rng.sample(urls, 5)))
+        metrics["put_ms"].append(_time_ms(store.put, ctx.rng.choice(urls), summary))
+    store.close()
+    return metrics
+
+
+def bench_summarize(ctx):
+    from llm_service import LLMService
+    from model_registry import get_model
+    load_ms = _time_ms(get_model, "summarizer")
+    service = LLMService.__new__(LLMService) # Summarization only needs the registry, not the chat model
+    texts = ctx.clean_texts()
+    metrics = {"model_load_ms": [load_ms]}
+    for size, text in texts.items():
+        metrics[f"summarize_{size}_ms"] = [
+            _time_ms(service.summarize_content, text, "supcom formation", QUERIES[0]) for _ in range(ctx.repeat)
+        ]
+    metrics["summarize_many_ms"] = [
+        _time_ms(service.summarize_many, list(texts.values()), "supcom formation", QUERIES[0])
+        for _ in range(ctx.repeat)
+    ]
+    return metrics
+
+
+def bench_generate(ctx):
+    from model_registry import get_model
+    load_start = time.perf_counter()
+    llm = get_model("llm")
+    metrics = {"model_load_ms": [(time.perf_counter() - load_start) * 1000], "ttft_ms": [], "total_ms": [],
+               "tokens_per_second": []}
+    text = ctx.clean_texts()["medium"]
+    context_results = [
+        {"link": ctx.server.page_url(f"{topic}-medium"), "title": title, "Summary": text[i * 300:i * 300 + 600]}
+        for i, (topic, title) in enumerate(list(TOPICS.items())[:5])
+    ]
+    for i in range(ctx.repeat):
+        start = time.perf_counter()
+        first_token_at, chunks = None, []
+        for chunk in llm.generate_final_response(QUERIES[i % len(QUERIES)], context_results, stream=True):
+            if first_token_at is None and chunk:
+                first_token_at = time.perf_counter()
+            chunks.append(chunk)
+        end = time.perf_counter()
+        if chunks and chunks[-1].startswith("\n\nSources:"):
+            chunks.pop() # The sources footer is not generated text
+        tokens = len(llm.tokenizer("".join(chunks), add_special_tokens=False)["input_ids"])
+        first_token_at = first_token_at or end
+        metrics["ttft_ms"].append((first_token_at - start) * 1000)
+        metrics["total_ms"].append((end - start) * 1000)
+        if end > first_token_at:
+            metrics["tokens_per_second"].append(tokens / (end - first_token_at))
+    return metrics
+
+
+STAGES = {
+    "keywords": bench_keywords,
+    "search": bench_search,
+    "clean": bench_clean,
+    "summaries_db": bench_summaries_db,
+    "summarize": bench_summarize,
+    "generate": bench_generate,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline per-stage benchmarks.")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tiny", action="store_true", help="Use miniature random models (fast, timing only)")
+    parser.add_argument("--max-new-tokens", type=int, default=128, help="Generation length for the generate stage")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated network latency (seconds) of the offline server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level)
+
+    workdir = tempfile.mkdtemp(prefix="supbot-bench-")
+    server = OfflineServer(latency=args.latency).start()
+
+    # Point every network call and database at the offline stand-ins before the pipeline modules load
+    config.GOOGLE_SEARCH_URL = server.search_url
+    config.SITE_FILTER = None
+    config.SEARCH_CACHE_PATH = os.path.join(workdir, "search_cache.db")
+    config.SUMMARIES_DB_PATH = os.path.join(workdir, "summaries.db")
+    config.DEFAULT_MAX_NEW_TOKENS = args.max_new_tokens
+    if args.tiny:
+        from benchmarks.tiny_models import build_tiny_models
+        config.MODEL_NAME, config.SUMMARIZER_MODEL = build_tiny_models(os.path.join(workdir, "models"))
+
+    ctx = StageContext(server, workdir, args.repeat, args.seed)
+    results = {}
+    for name in args.stages:
+        print(f"Running stage '{name}'...", flush=True)
+        try:
+            metrics = STAGES[name](ctx)
+            results[name] = {metric: summarize_samples(samples) for metric, samples in metrics.items()}
+        except Exception as e:
+            logger.error(f"Stage '{name}' failed: {e}", exc_info=True)
+            results[name] = {"error": str(e)}
+    if "http_fetcher" in sys.modules:
+        sys.modules["http_fetcher"].close_fetcher()
+    server.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "tiny": args.tiny,
+            "models": {"llm": config.MODEL_NAME, "summarizer": config.SUMMARIZER_MODEL},
+            "backend": config.INFERENCE_BACKEND,
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "requests_served": server.requests,
+        },
+        "stages": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, metrics in results.items():
+        for metric, stats in metrics.items():
+            if isinstance(stats, dict) and stats.get("n"):
+                print(f"{name:>13}.{metric:<22} p50={stats['p50']:10.2f}  p95={stats['p95']:10.2f}  n={stats['n']}")
+            else:
+                print(f"{name:>13}.{metric:<22} {stats}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
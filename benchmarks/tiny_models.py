@@ -0,0 +1,66 @@
+# benchmarks/tiny_models.py
+"""
+Randomly initialised miniature versions of the chat LLM (Llama) and the summarizer (BART).
+
+They are built from configs with a character-level tokenizer, so no download is needed, and saved
+as ordinary model directories that config.MODEL_NAME / config.SUMMARIZER_MODEL can point at:
+the normal loading path (tokenizer, backend, generation config) runs unchanged, just fast.
+Their outputs are noise; they are for timing the pipeline around the models, not for quality.
+"""
+import os
+import string
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import (PreTrainedTokenizerFast, LlamaConfig, LlamaForCausalLM, BartConfig,
+                          BartForConditionalGeneration)
+
+_CHAT_TEMPLATE = (
+    "{% for message in messages %}<|{{ message['role'] }}|>\n{{ message['content'] }}</s>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|assistant|>\n{% endif %}"
+)
+
+
+def _char_tokenizer():
+    vocab = {"<unk>": 0, "<s>": 1, "</s>": 2, "<pad>": 3}
+    for char in sorted(set(string.printable + "éèêëàâäùûüçôöîïÉÈÀÇœ'’«»°")):
+        vocab.setdefault(char, len(vocab))
+    backend = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    return PreTrainedTokenizerFast(tokenizer_object=backend, bos_token="<s>", eos_token="</s>",
+                                   unk_token="<unk>", pad_token="<pad>")
+
+
+def build_tiny_llm(path):
+    tokenizer = _char_tokenizer()
+    tokenizer.chat_template = _CHAT_TEMPLATE
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=16384,
+        bos_token_id=1, eos_token_id=2, pad_token_id=3,
+    ))
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+
+def build_tiny_summarizer(path):
+    tokenizer = _char_tokenizer()
+    model = BartForConditionalGeneration(BartConfig(
+        vocab_size=len(tokenizer), d_model=32, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64,
+        max_position_embeddings=1026, bos_token_id=1, eos_token_id=2, pad_token_id=3,
+        decoder_start_token_id=2, forced_bos_token_id=1,
+    ))
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+
+def build_tiny_models(directory):
+    """Builds (or reuses) both tiny models under `directory`. Returns (llm_path, summarizer_path)."""
+    llm_path = os.path.join(directory, "tiny-llm")
+    summarizer_path = os.path.join(directory, "tiny-summarizer")
+    if not os.path.isdir(llm_path):
+        build_tiny_llm(llm_path)
+    if not os.path.isdir(summarizer_path):
+        build_tiny_summarizer(summarizer_path)
+    return llm_path, summarizer_path
@@ -2,28 +2,417 @@
 import logging
 import json
 import time # Already imported
+import asyncio
 import config
 from llm_service import get_llm_service
-from search_service import search_google
-from web_scraper import retrieve_content
-from keyword_extractor import extract_keywords_spacy
+from search_service import search_google, search_google_async
+from web_scraper import retrieve_page, retrieve_page_async
+from keyword_extractor import extract_keywords
+from summary_store import get_summary_store
+from answer_cache import get_answer_cache, replay_answer
+from local_index import get_local_index
+from page_dedup import canonicalize_url, content_fingerprint, simhash, is_near_duplicate
+from metrics import STAGE_SECONDS, CACHE_REQUESTS
 import sqlite3
-
-# Open the DB connection once before the loop
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 logger = logging.getLogger(__name__)
 
+# Shared pools so every query reuses the same worker threads
+_scrape_executor = ThreadPoolExecutor(max_workers=config.SCRAPE_WORKERS, thread_name_prefix="scrape")
+_summary_executor = ThreadPoolExecutor(max_workers=config.SUMMARY_WORKERS, thread_name_prefix="summarize")
+# Blocking CPU work (spaCy, HTML cleaning, index lookups) of the asyncio serving path
+_cpu_executor = ThreadPoolExecutor(max_workers=config.ASYNC_CPU_WORKERS, thread_name_prefix="pipeline-cpu")
+
+
+class QueryCancelled(Exception):
+    """Raised by process_user_query when its `cancelled()` check reports that the client is gone."""
+
+
+def _check_cancelled(cancelled, stage):
+    if cancelled is not None and cancelled():
+        logger.info(f"Query cancelled before stage '{stage}'.")
+        raise QueryCancelled(stage)
+
+
+def _timed_stage(stage, fn, *args):
+    """Runs fn(*args) on a pool thread, recording its duration under `stage`."""
+    with STAGE_SECONDS.time(stage=stage):
+        return fn(*args)
+
+
+def _emit(on_progress, event, data):
+    """Reports a progress event (see sse.py) to the caller; a failing callback never breaks the pipeline."""
+    if on_progress is None:
+        return
+    try:
+        on_progress(event, data)
+    except Exception as e:
+        logger.error(f"Progress callback failed for '{event}' event: {e}", exc_info=True)
+
+
+def _source_list(results):
+    """Numbered {n, link, title} entries for a 'sources' event, numbered like the answer's [n] citations."""
+    return [
+        {"n": n, "link": result["link"], "title": result.get("title") or result["link"]}
+        for n, result in enumerate(results, start=1) if result.get("link")
+    ]
+
+
+def _refresh_summary(url, search_terms, user_query, llm):
+    """
+    Revalidates a page whose cached summary went stale. An unchanged page (HTTP 304, or the same
+    content fingerprint) only has its date renewed; a changed page is re-summarized.
+    Returns (summary, content_hash, simhash, validators), or None to keep the old summary.
+    """
+    page = retrieve_page(url, revalidate=True)
+    if page is None:
+        return None
+    store = get_summary_store()
+    if page["not_modified"]:
+        store.touch(url)
+        return None
+    content_hash = content_fingerprint(page["text"])
+    if store.get_content_hashes([url]).get(url) == content_hash:
+        store.touch(url, validators=page["validators"])
+        return None
+    summary = llm.summarize_content(page["text"], search_terms, user_query)
+    if not summary:
+        return None
+    return summary, content_hash, simhash(page["text"]), page["validators"]
+
+
+def _canonical_items(items):
+    """
+    (idx, item) pairs for the results that have a link, with canonical links. A result whose URL is
+    a variant of an earlier one (?lang=, trailing slash, http/https...) is merged into it.
+    """
+    seen, canonical = {}, []
+    for idx, item in enumerate(items):
+        if not item.get("link"):
+            continue
+        link = canonicalize_url(item["link"])
+        if link in seen:
+            logger.info(f"Merged result URL {item['link']} into result {seen[link] + 1} ({link}).")
+            continue
+        seen[link] = idx
+        canonical.append((idx, dict(item, link=link)))
+    return canonical
+
+
+def _fingerprint(text, validators=None):
+    return {"text": text, "content_hash": content_fingerprint(text), "simhash": simhash(text), "validators": validators}
+
+
+def _fetch_page(url):
+    """Downloads and cleans a result page; returns {'text', 'content_hash', 'simhash'} or None."""
+    page = retrieve_page(url)
+    return _fingerprint(page["text"], page["validators"]) if page and page["text"] else None
+
+
+def _is_duplicate_page(idx, url, page, seen, summaries):
+    """
+    True when a fetched page does not need summarizing: its content matches a page already fetched
+    for this query (the two results are merged) or a page in summaries.db (that summary is reused
+    and stored for `url` too). `seen` collects the (idx, content_hash, simhash) of the query's pages.
+    """
+    for other_idx, content_hash, page_simhash in seen:
+        if content_hash == page["content_hash"] or is_near_duplicate(page_simhash, page["simhash"]):
+            logger.info(f"Result {idx+1} ({url}) has the same content as result {other_idx+1}, merging them.")
+            return True
+    seen.append((idx, page["content_hash"], page["simhash"]))
+
+    store = get_summary_store()
+    try:
+        match = store.find_by_content(page["content_hash"], page["simhash"], exclude_url=url)
+        if match is None:
+            return False
+        store.put(url, match["summary"], content_hash=page["content_hash"], simhash=page["simhash"],
+                  validators=page["validators"])
+    except sqlite3.Error as e:
+        logger.error(f"Failed to look up duplicate content for {url}: {e}", exc_info=True)
+        return False
+    summaries[idx] = match["summary"]
+    CACHE_REQUESTS.inc(cache="summaries", result="duplicate")
+    logger.info(f"Result {idx+1} ({url}) is a{'n' if match['match'] == 'exact' else ''} {match['match']} copy "
+                f"of {match['url']}, reusing its summary.")
+    return True
+
+
+def _use_cached_summaries(items, search_terms, user_query, llm, summaries):
+    """
+    Fills `summaries` (idx -> summary) from summaries.db, scheduling a refresh for stale entries.
+    Returns the (idx, url) pairs that still have to be fetched and summarized.
+    """
+    store = get_summary_store()
+    try:
+        cached = store.get_many([item["link"] for _, item in items])
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read cached summaries: {e}", exc_info=True)
+        cached = {}
+
+    to_fetch = []
+    for idx, item in items:
+        url = item["link"]
+        if url in cached:
+            summaries[idx] = cached[url]["summary"]
+            CACHE_REQUESTS.inc(cache="summaries", result="stale" if cached[url]["stale"] else "hit")
+            if cached[url]["stale"]:
+                # Serve the stale summary now, refresh it for the next query
+                logger.info(f"Found stale cached summary for URL: {url} (date: {cached[url]['date']})")
+                store.schedule_refresh(url, lambda url=url: _refresh_summary(url, search_terms, user_query, llm))
+            else:
+                logger.info(f"Found cached summary for URL: {url}")
+        else:
+            CACHE_REQUESTS.inc(cache="summaries", result="miss")
+            logger.info(f"Fetching result {idx+1}/{len(items)}: {item.get('title', 'N/A')} ({url})")
+            to_fetch.append((idx, url))
+    return to_fetch
+
+
+def _collect_summaries(batch_idxs, batch_results, links, summaries, stage_start, pages):
+    """Records one summarize_many batch in `summaries` and persists the successful ones with their page fingerprints."""
+    store = get_summary_store()
+    for idx, result in zip(batch_idxs, batch_results):
+        if result["summary"]:
+            summaries[idx] = result["summary"]
+            try:
+                store.put(links[idx], result["summary"], content_hash=pages[idx]["content_hash"],
+                          simhash=pages[idx]["simhash"], validators=pages[idx]["validators"])
+            except sqlite3.Error as e:
+                logger.error(f"Failed to store summary for {links[idx]}: {e}", exc_info=True)
+            logger.info(f"Successfully summarized result {idx+1} after {time.time() - stage_start:.2f} seconds.")
+        else:
+            logger.warning(f"Failed to summarize content for URL: {links[idx]} ({result['error']}).")
+
+
+def _ordered_results(items, summaries):
+    """
+    Results in the original search order so the [n] citations stay stable. Results sharing one
+    summary (copies of the same page) are merged into the first.
+    """
+    results, seen_summaries = [], set()
+    for idx, item in items:
+        if idx not in summaries:
+            continue
+        if summaries[idx] in seen_summaries:
+            logger.info(f"Merged result {idx+1} ({item['link']}) into an earlier result with the same summary.")
+            continue
+        seen_summaries.add(summaries[idx])
+        results.append({"order": idx + 1, "link": item["link"], "title": item.get("title", "N/A"), "Summary": summaries[idx]})
+    return results
+
+
+def _scrape_and_summarize(items, search_terms, user_query, llm, deadline=config.QUERY_DEADLINE, on_progress=None,
+                          cancelled=None):
+    """
+    Fetches all result pages in parallel and hands each page to summarization as soon as it arrives.
+    Stops waiting once `deadline` seconds have elapsed and keeps whatever summaries are ready.
+    Results are returned in the original search order so the [n] citations stay stable.
+    `on_progress` receives a "summarize" stage event ({done, total}) whenever summaries complete.
+    `cancelled()` is polled every CANCEL_POLL_INTERVAL seconds; when it returns True the unfinished
+    work is dropped and QueryCancelled is raised.
+    """
+    stage_start = time.time()
+    expires_at = stage_start + deadline
+    summaries = {}  # idx -> summary
+
+    items = _canonical_items(items)
+    links = {idx: item["link"] for idx, item in items}
+    pages = {}  # idx -> fetched page text and fingerprints
+    seen_pages = []
+    fetch_futures = {}
+    for idx, url in _use_cached_summaries(items, search_terms, user_query, llm, summaries):
+        fetch_futures[_scrape_executor.submit(_timed_stage, "scrape", _fetch_page, url)] = idx
+    _emit(on_progress, "stage", {"stage": "summarize", "done": len(summaries), "total": len(items)})
+
+    summary_futures = {}  # future -> [idx, ...] summarized together in one batch
+    ready_pages = []  # (idx, content) fetched but not yet handed to the summarizer
+    pending = set(fetch_futures)
+    while pending:
+        remaining = expires_at - time.time()
+        if remaining <= 0 or (cancelled is not None and cancelled()):
+            break
+        if cancelled is not None:
+            remaining = min(remaining, config.CANCEL_POLL_INTERVAL)
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx = fetch_futures.get(future)
+            if idx is not None:
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logger.error(f"Error retrieving {links[idx]}: {e}", exc_info=True)
+                    continue
+                if page is not None and not _is_duplicate_page(idx, links[idx], page, seen_pages, summaries):
+                    pages[idx] = page
+                    ready_pages.append((idx, page["text"]))
+                continue
+
+            batch_idxs = summary_futures.pop(future)
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                logger.error(f"Error summarizing batch {[links[i] for i in batch_idxs]}: {e}", exc_info=True)
+                batch_results = [{"summary": None, "error": str(e)} for _ in batch_idxs]
+            _collect_summaries(batch_idxs, batch_results, links, summaries, stage_start, pages)
+            _emit(on_progress, "stage", {"stage": "summarize", "done": len(summaries), "total": len(items)})
+
+        # Pages that arrived while the summarizer was busy are batched into the next generate call
+        if ready_pages and len(summary_futures) < config.SUMMARY_WORKERS:
+            batch_idxs = [idx for idx, _ in ready_pages]
+            summary_future = _summary_executor.submit(
+                _timed_stage, "summarize", llm.summarize_many, [content for _, content in ready_pages], search_terms, user_query
+            )
+            summary_futures[summary_future] = batch_idxs
+            pending.add(summary_future)
+            ready_pages = []
+
+    # Anything still queued or running is abandoned; not-yet-started jobs are dropped
+    unfinished = [f for f in pending if not f.done()]
+    for future in unfinished:
+        future.cancel()
+    _check_cancelled(cancelled, "pack_context")
+    if unfinished:
+        logger.warning(f"Query deadline of {deadline}s reached with {len(unfinished)} page(s) unfinished; "
+                       f"answering with {len(summaries)} summaries.")
+
+    return _ordered_results(items, summaries)
+
+
+async def _scrape_and_summarize_async(items, search_terms, user_query, llm, deadline=config.QUERY_DEADLINE,
+                                      on_progress=None):
+    """
+    asyncio version of _scrape_and_summarize: page downloads are awaited on the fetcher's event loop,
+    only HTML cleaning and summarization use the bounded thread pools.
+    """
+    loop = asyncio.get_running_loop()
+    stage_start = time.time()
+    expires_at = stage_start + deadline
+    summaries = {}  # idx -> summary
+
+    items = _canonical_items(items)
+    links = {idx: item["link"] for idx, item in items}
+    pages = {}  # idx -> fetched page text and fingerprints
+    seen_pages = []
+    to_fetch = await loop.run_in_executor(
+        _cpu_executor, _use_cached_summaries, items, search_terms, user_query, llm, summaries
+    )
+    _emit(on_progress, "stage", {"stage": "summarize", "done": len(summaries), "total": len(items)})
+
+    async def fetch(url):
+        with STAGE_SECONDS.time(stage="scrape"):
+            page = await retrieve_page_async(url, executor=_cpu_executor)
+            if not page or not page["text"]:
+                return None
+            return await loop.run_in_executor(_cpu_executor, _fingerprint, page["text"], page["validators"])
+
+    fetch_tasks = {asyncio.ensure_future(fetch(url)): idx for idx, url in to_fetch}
+    summary_tasks = {}  # task -> [idx, ...] summarized together in one batch
+    ready_pages = []  # (idx, content) fetched but not yet handed to the summarizer
+    pending = set(fetch_tasks)
+    try:
+        while pending:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = fetch_tasks.get(task)
+                if idx is not None:
+                    try:
+                        page = task.result()
+                    except Exception as e:
+                        logger.error(f"Error retrieving {links[idx]}: {e}", exc_info=True)
+                        continue
+                    if page is not None and not _is_duplicate_page(idx, links[idx], page, seen_pages, summaries):
+                        pages[idx] = page
+                        ready_pages.append((idx, page["text"]))
+                    continue
+
+                batch_idxs = summary_tasks.pop(task)
+                try:
+                    batch_results = task.result()
+                except Exception as e:
+                    logger.error(f"Error summarizing batch {[links[i] for i in batch_idxs]}: {e}", exc_info=True)
+                    batch_results = [{"summary": None, "error": str(e)} for _ in batch_idxs]
+                _collect_summaries(batch_idxs, batch_results, links, summaries, stage_start, pages)
+                _emit(on_progress, "stage", {"stage": "summarize", "done": len(summaries), "total": len(items)})
+
+            if ready_pages and len(summary_tasks) < config.SUMMARY_WORKERS:
+                summary_task = asyncio.ensure_future(loop.run_in_executor(
+                    _summary_executor, _timed_stage, "summarize", llm.summarize_many,
+                    [content for _, content in ready_pages], search_terms, user_query
+                ))
+                summary_tasks[summary_task] = [idx for idx, _ in ready_pages]
+                pending.add(summary_task)
+                ready_pages = []
+    except asyncio.CancelledError:
+        # The request was cancelled (client gone): stop its downloads and queued summaries too
+        for task in pending:
+            task.cancel()
+        raise
+
+    if pending:
+        for task in pending:
+            task.cancel()
+        logger.warning(f"Query deadline of {deadline}s reached with {len(pending)} page(s) unfinished; "
+                       f"answering with {len(summaries)} summaries.")
+
+    return _ordered_results(items, summaries)
+
+
+def _answer_from_local_index(user_query, search_terms):
+    """
+    Returns processed results built from local summaries when the local index is confident enough
+    to answer without web search, otherwise None.
+    """
+    try:
+        hits = get_local_index().search(user_query, search_terms, k=config.SEARCH_DEPTH)
+    except Exception as e:
+        logger.error(f"Local index search failed: {e}", exc_info=True)
+        return None
+    if not hits or hits[0]["score"] < config.LOCAL_INDEX_CONFIDENCE:
+        best = f"{hits[0]['score']:.2f}" if hits else "n/a"
+        logger.info(f"Local index not confident enough (best score {best}), falling back to web search.")
+        return None
+    hits = [hit for hit in hits if hit is hits[0] or hit["score"] >= config.LOCAL_INDEX_MIN_SCORE]
+    logger.info(f"Answering from {len(hits)} local summaries (best score {hits[0]['score']:.2f}).")
+    return [{
+        "order": idx + 1, "link": hit["url"], "title": hit["url"], "Summary": hit["summary"]
+    } for idx, hit in enumerate(hits)]
+
+
+def _is_generation_error(answer):
+    return not answer or "Error generating response" in answer
+
+
+def _caching_stream(token_stream, answer_cache, user_query, sources):
+    """Passes tokens through and caches the full answer once the stream completes."""
+    full_response_text = []
+    for token in token_stream:
+        full_response_text.append(token)
+        yield token
+    answer = "".join(full_response_text)
+    if not _is_generation_error(answer):
+        answer_cache.store(user_query, answer, sources)
+
+
 # **** MODIFIED TO SUPPORT STREAMING ****
-def process_user_query(user_query, stream=False):
+def process_user_query(user_query, stream=False, on_progress=None, cancelled=None):
     """
     Processes the user query through the RAG pipeline.
     Returns a string (full response) or a generator (token stream).
+    `on_progress(event, data)`, when given, receives the "stage" and "sources" events described in sse.py.
+    `cancelled()`, when given, is checked between stages (and while pages are scraped and summarized);
+    once it returns True the pipeline stops with QueryCancelled.
     """
     start_time = time.time()
     logger.info(f"--- Starting processing for query: '{user_query}' (Stream={stream}) ---")
 
     # 1. Extract Keywords
-    search_terms = extract_keywords_spacy(user_query)
+    with STAGE_SECONDS.time(stage="keywords"):
+        search_terms = extract_keywords(user_query)
     if not search_terms:
         logger.error("Failed to generate search terms.")
         # Need to handle this for streaming too - maybe yield an error message?
@@ -34,62 +423,53 @@ def process_user_query(user_query, stream=False):
             return "Désolé, je n'ai pas pu déterminer les termes de recherche pour votre requête."
 
     logger.info(f"Using search terms: {search_terms}")
+    _emit(on_progress, "stage", {"stage": "keywords", "terms": search_terms})
 
-    # 2. Search Google
-    search_items = search_google(search_terms)
-    if not search_items:
-        logger.warning("No search results returned from Google Search.")
-        if stream:
-            def error_gen(): yield "Désolé, aucun résultat de recherche pertinent trouvé."
-            return error_gen()
-        else:
-            return "Désolé, je n'ai trouvé aucun résultat de recherche pertinent pour votre requête."
+    # 1b. Reuse the answer of a previously asked, equivalent question
+    answer_cache = get_answer_cache() if config.ANSWER_CACHE_ENABLED else None
+    if answer_cache:
+        cached = answer_cache.lookup(user_query)
+        CACHE_REQUESTS.inc(cache="answers", result="hit" if cached else "miss")
+        if cached:
+            logger.info(f"--- Served cached answer in {time.time() - start_time:.2f} seconds (Stream={stream}) ---")
+            _emit(on_progress, "stage", {"stage": "answer_cache"})
+            _emit(on_progress, "sources", {"sources": _source_list({"link": link} for link in cached["sources"]),
+                                           "final": True})
+            return replay_answer(cached["answer"]) if stream else cached["answer"]
 
-    # 3. Scrape & Summarize Results (Summarization itself remains non-streaming)
-    processed_results = []
+    _check_cancelled(cancelled, "local_index")
     llm = get_llm_service()
-    summarization_limit = config.SEARCH_DEPTH
-
-    for idx, item in enumerate(search_items[:summarization_limit]):
-        item_start_time = time.time()
-        url = item.get("link")
-        title = item.get("title", "N/A")
-        logger.info(f"Processing result {idx+1}/{len(search_items)}: {title} ({url})")
-
-        if not url:
-            continue
-        conn = sqlite3.connect("summaries.db")
-        cursor = conn.cursor()
-    # Check if the URL exists in the database
-        cursor.execute("SELECT summary FROM summaries WHERE url = ?", (url,))
-        row = cursor.fetchone()
-
-        if row:
-            summary = row[0]
-            logger.info(f"Found cached summary for URL: {url}")
-        else:
-            web_content = retrieve_content(url)
-            if web_content is None:
-                continue
-
-        # Summarization uses the non-streaming method internally
-            summary = llm.summarize_content(web_content, search_terms, user_query)
 
-        # Save to DB if summary was generated
-            
-    
-        item_end_time = time.time()
+    # 2. Answer from the local summaries when they clearly cover the question
+    processed_results = None
+    if config.LOCAL_INDEX_ENABLED:
+        with STAGE_SECONDS.time(stage="local_index"):
+            processed_results = _answer_from_local_index(user_query, search_terms)
+        if processed_results:
+            _emit(on_progress, "stage", {"stage": "local_index", "results": len(processed_results)})
 
-        if summary:
-            processed_results.append({
-                "order": idx + 1, "link": url, "title": title, "Summary": summary
-            })
-            logger.info(f"Successfully summarized result {idx+1} in {item_end_time - item_start_time:.2f} seconds.")
-        else:
-            logger.warning(f"Failed to summarize content for URL: {url}.")
+    if not processed_results:
+        # 3. Search Google
+        _check_cancelled(cancelled, "search")
+        _emit(on_progress, "stage", {"stage": "search"})
+        with STAGE_SECONDS.time(stage="search"):
+            search_items = search_google(search_terms)
+        if not search_items:
+            logger.warning("No search results returned from Google Search.")
+            if stream:
+                def error_gen(): yield "Désolé, aucun résultat de recherche pertinent trouvé."
+                return error_gen()
+            else:
+                return "Désolé, je n'ai trouvé aucun résultat de recherche pertinent pour votre requête."
 
-# Close the connection when done
-    conn.close()
+        # 4. Scrape & Summarize Results (Summarization itself remains non-streaming)
+        _check_cancelled(cancelled, "scrape_and_summarize")
+        _emit(on_progress, "sources", {"sources": _source_list(search_items[:config.SEARCH_DEPTH]), "final": False})
+        with STAGE_SECONDS.time(stage="scrape_and_summarize"):
+            processed_results = _scrape_and_summarize(
+                search_items[:config.SEARCH_DEPTH], search_terms, user_query, llm, on_progress=on_progress,
+                cancelled=cancelled
+            )
 
     if not processed_results:
         logger.error("Failed to process any search results (scrape/summarize).")
@@ -101,11 +481,103 @@ def process_user_query(user_query, stream=False):
 
     logger.info(f"Processed {len(processed_results)} search results.")
 
-    # 4. Generate Final Response (Potentially Streaming)
+    # 5. Fit the summaries to the prompt's token budget; the packed order is the [n] citation order
+    _check_cancelled(cancelled, "pack_context")
+    with STAGE_SECONDS.time(stage="pack_context"):
+        processed_results = llm.pack_context(user_query, processed_results)
+    _emit(on_progress, "sources", {"sources": _source_list(processed_results), "final": True})
+    _check_cancelled(cancelled, "generate")
+    _emit(on_progress, "stage", {"stage": "generate"})
+
+    # 6. Generate Final Response (Potentially Streaming)
     # Pass the stream parameter here
-    response_or_generator = llm.generate_final_response(user_query, processed_results, stream=stream)
+    response_or_generator = llm.generate_final_response(user_query, processed_results, stream=stream, pack=False)
+    if answer_cache:
+        sources = [result["link"] for result in processed_results]
+        if stream:
+            response_or_generator = _caching_stream(response_or_generator, answer_cache, user_query, sources)
+        elif not _is_generation_error(response_or_generator):
+            answer_cache.store(user_query, response_or_generator, sources)
 
     end_time = time.time()
     logger.info(f"--- Finished processing query in {end_time - start_time:.2f} seconds (Stream={stream}) ---")
 
-    return response_or_generator # Return either the string or the generator
\ No newline at end of file
+    return response_or_generator # Return either the string or the generator
+
+async def process_user_query_async(user_query, on_progress=None):
+    """
+    asyncio version of process_user_query(stream=True), yielding the answer as text chunks.
+    `on_progress` is called on the event loop.
+    Blocking stages (spaCy, index lookups, model loading, summarization) run in bounded thread pools;
+    search, page downloads and token streaming are awaited, so a waiting request holds no thread.
+    """
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    logger.info(f"--- Starting async processing for query: '{user_query}' ---")
+
+    with STAGE_SECONDS.time(stage="keywords"):
+        search_terms = await loop.run_in_executor(_cpu_executor, extract_keywords, user_query)
+    if not search_terms:
+        logger.error("Failed to generate search terms.")
+        yield "Désolé, je n'ai pas pu déterminer les termes de recherche."
+        return
+    logger.info(f"Using search terms: {search_terms}")
+    _emit(on_progress, "stage", {"stage": "keywords", "terms": search_terms})
+
+    answer_cache = get_answer_cache() if config.ANSWER_CACHE_ENABLED else None
+    if answer_cache:
+        cached = await loop.run_in_executor(_cpu_executor, answer_cache.lookup, user_query)
+        CACHE_REQUESTS.inc(cache="answers", result="hit" if cached else "miss")
+        if cached:
+            logger.info(f"--- Served cached answer in {time.time() - start_time:.2f} seconds (async) ---")
+            _emit(on_progress, "stage", {"stage": "answer_cache"})
+            _emit(on_progress, "sources", {"sources": _source_list({"link": link} for link in cached["sources"]),
+                                           "final": True})
+            for chunk in replay_answer(cached["answer"]):
+                yield chunk
+            return
+
+    llm = await loop.run_in_executor(_cpu_executor, get_llm_service)
+
+    processed_results = None
+    if config.LOCAL_INDEX_ENABLED:
+        with STAGE_SECONDS.time(stage="local_index"):
+            processed_results = await loop.run_in_executor(
+                _cpu_executor, _answer_from_local_index, user_query, search_terms
+            )
+        if processed_results:
+            _emit(on_progress, "stage", {"stage": "local_index", "results": len(processed_results)})
+
+    if not processed_results:
+        _emit(on_progress, "stage", {"stage": "search"})
+        with STAGE_SECONDS.time(stage="search"):
+            search_items = await search_google_async(search_terms)
+        if not search_items:
+            logger.warning("No search results returned from Google Search.")
+            yield "Désolé, aucun résultat de recherche pertinent trouvé."
+            return
+        _emit(on_progress, "sources", {"sources": _source_list(search_items[:config.SEARCH_DEPTH]), "final": False})
+        with STAGE_SECONDS.time(stage="scrape_and_summarize"):
+            processed_results = await _scrape_and_summarize_async(
+                search_items[:config.SEARCH_DEPTH], search_terms, user_query, llm, on_progress=on_progress
+            )
+
+    if not processed_results:
+        logger.error("Failed to process any search results (scrape/summarize).")
+        yield "Désolé, impossible de traiter les résultats de recherche."
+        return
+    logger.info(f"Processed {len(processed_results)} search results.")
+
+    with STAGE_SECONDS.time(stage="pack_context"):
+        processed_results = await loop.run_in_executor(_cpu_executor, llm.pack_context, user_query, processed_results)
+    _emit(on_progress, "sources", {"sources": _source_list(processed_results), "final": True})
+    _emit(on_progress, "stage", {"stage": "generate"})
+
+    full_response_text = []
+    async for token in llm.generate_final_response_async(user_query, processed_results, pack=False):
+        full_response_text.append(token)
+        yield token
+    answer = "".join(full_response_text)
+    if answer_cache and not _is_generation_error(answer):
+        answer_cache.store(user_query, answer, [result["link"] for result in processed_results])
+    logger.info(f"--- Finished async processing query in {time.time() - start_time:.2f} seconds ---")
@@ -1,9 +1,7 @@
 # config.py
 import os
-import torch
 from dotenv import load_dotenv
 import logging
-from transformers import pipeline
 # Load environment variables from .env file
 load_dotenv()
 
@@ -22,24 +20,65 @@ if not all([HF_TOKEN, GOOGLE_API_KEY, GOOGLE_CSE_ID]):
     logger.warning("One or more API keys/tokens are missing in environment variables.")
     # You might want to raise an error here in a production setting
     # raise ValueError("Missing required environment variables for API keys/tokens.")
-summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", tokenizer="sshleifer/distilbart-cnn-12-6")
+
+# --- Runtime Data ---
+# Databases the app creates itself (caches); summaries.db is curated and stays at SUMMARIES_DB_PATH
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
 # --- Model Configuration ---
+# Models are loaded lazily by model_registry; importing config never touches torch or transformers.
 MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-DTYPE = torch.float16 if DEVICE == "cuda" else torch.float32
-logger.info(f"Using device: {DEVICE} with dtype: {DTYPE}")
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+WARMUP_ON_STARTUP = True # Load models in the background as soon as the Flask app starts
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager") # "eager", "int8" (dynamic quantization, CPU) or "onnx"
+BACKEND_CACHE_DIR = "model_cache" # Exported model artifacts (e.g. ONNX) are cached here
+# Multi-process serving: every worker maps one read-only copy of the weights (eager backend, CPU)
+SHARED_WEIGHTS = os.getenv("SHARED_WEIGHTS", "false").lower() == "true"
+SHARED_WEIGHTS_DIR = os.path.join(BACKEND_CACHE_DIR, "shared")
+
+def __getattr__(name):
+    """Resolves torch-dependent settings (DEVICE, DTYPE) and the summarizer on first access."""
+    if name == "DEVICE":
+        import torch
+        value = "cuda" if torch.cuda.is_available() else "cpu"
+    elif name == "DTYPE":
+        import torch
+        device = globals().get("DEVICE") or __getattr__("DEVICE")
+        value = torch.float16 if device == "cuda" else torch.float32
+        logger.info(f"Using device: {device} with dtype: {value}")
+    elif name == "summarizer":
+        # Backwards-compatible alias; prefer model_registry.get_model("summarizer")
+        from model_registry import get_model
+        return get_model("summarizer")
+    else:
+        raise AttributeError(f"module 'config' has no attribute '{name}'")
+    globals()[name] = value
+    return value
 
 # --- Generation Settings ---
 # Default config for general responses
 DEFAULT_MAX_NEW_TOKENS = 1024
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_TOP_P = 0.9
+GENERATION_MAX_BATCH_SIZE = 8 # Max final responses decoded together by the generation scheduler
+GENERATION_MAX_WAIT = 0.05 # Seconds an idle scheduler waits to gather more requests before decoding
+PROMPT_PREFIX_CACHE = True # Reuse the KV cache of the constant start of the final-response prompt
+LLM_CONTEXT_WINDOW = 2048 # Fallback when the model config has no max_position_embeddings (TinyLlama: 2048)
+CONTEXT_TOKEN_SHARE = 0.4 # Max share of the window used by the summaries in the final-response prompt
+CONTEXT_DUPLICATE_SIMILARITY = 0.9 # Summaries this similar to a better-ranked one are left out of the prompt
+CONTEXT_MIN_TOKENS = 64 # A summary is truncated to fit the budget only if at least this many tokens remain
 
 # Config for summarization (can be shorter)
 SUMMARY_MAX_NEW_TOKENS = 512
 SUMMARY_TEMPERATURE = 0.6
 SUMMARY_TOP_P = 0.9
 SUMMARY_CHARACTER_LIMIT = 1500 # Approx character limit for summaries
+SUMMARY_MAX_INPUT_TOKENS = 1024 # distilbart-cnn-12-6 max input length
+SUMMARY_BATCH_SIZE = 4 # Max pages per batched summarizer generate call
+PASSAGE_FILTER_ENABLED = True # Summarize only the page passages most relevant to the query (passage_filter.py)
+PASSAGE_TARGET_CHARS = 500 # Approx passage size the page is split into
+PASSAGE_BM25_K1 = 1.2 # BM25 term-frequency saturation for passage scoring
+PASSAGE_BM25_B = 0.75 # BM25 length normalization for passage scoring
 
 # Config for keyword generation (if using LLM method)
 # KEYWORD_MAX_NEW_TOKENS = 50
@@ -48,16 +87,102 @@ SUMMARY_CHARACTER_LIMIT = 1500 # Approx character limit for summaries
 # --- Search Configuration ---
 SEARCH_DEPTH = 5 # Number of search results to fetch
 SITE_FILTER = None # Optional: e.g., "supcom.tn" to restrict search
+GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+SEARCH_TIMEOUT = 10 # Seconds
+SEARCH_POOL_SIZE = 8 # Pooled keep-alive connections to the Search API
+SEARCH_CACHE_PATH = os.path.join(DATA_DIR, "search_cache.db")
+SEARCH_CACHE_TTL = 24 * 3600 # Seconds before cached search results are refetched
+SEARCH_CACHE_EMPTY_TTL = 10 * 60 # Seconds before a search that returned nothing is retried
+SEARCH_BREAKER_FAILURES = 3 # Consecutive API failures that open the circuit breaker
+SEARCH_BREAKER_RESET = 60 # Seconds the breaker stays open before probing the API again
 
 # --- Web Scraping Configuration ---
 SCRAPE_MAX_TOKENS = 10000 # Max tokens to process from a webpage (approx)
 SCRAPE_TIMEOUT = 15 # Seconds
+SCRAPE_MAX_BYTES = 2 * 1024 * 1024 # Page downloads stop after this many bytes (the rest is never read)
+SCRAPE_MIN_MAIN_CHARS = 200 # <main>/<article> text shorter than this falls back to the whole <body>
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "auto") # "auto", "selectolax", "lxml" or "soup" (html_extract.py)
 SCRAPE_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
+FETCH_MAX_CONNECTIONS = 32 # Total pooled connections of the async fetcher
+FETCH_MAX_PER_HOST = 6 # Concurrent connections per host (nearly all results hit the same site)
+FETCH_KEEPALIVE_TIMEOUT = 30 # Seconds an idle keep-alive connection stays in the pool
+FETCH_DNS_CACHE_TTL = 300 # Seconds DNS answers are reused
+
+# --- Pipeline Concurrency ---
+SCRAPE_WORKERS = 5 # Number of result pages fetched in parallel
+SUMMARY_WORKERS = 1 # Summarization jobs run in parallel (model is CPU-bound)
+QUERY_DEADLINE = 45 # Seconds allowed for scrape + summarize before answering with what is ready
+CANCEL_POLL_INTERVAL = 0.25 # Seconds between client-disconnect checks while pages are scraped and summarized
+
+# --- Inference Workers (inference_workers.py) ---
+# Summarization and final-response generation in separate processes, each pool pinned to its own cores
+INFERENCE_WORKERS = os.getenv("INFERENCE_WORKERS", "false").lower() == "true"
+INFERENCE_GENERATE_PROCESSES = 1 # Processes decoding final responses (each batches up to GENERATION_MAX_BATCH_SIZE)
+INFERENCE_SUMMARIZE_PROCESSES = 1 # Processes summarizing pages (one summarize_many batch at a time each)
+INFERENCE_GENERATE_CORES = os.getenv("INFERENCE_GENERATE_CORES") # CPU list such as "0-3"; default: a share of the available cores
+INFERENCE_SUMMARIZE_CORES = os.getenv("INFERENCE_SUMMARIZE_CORES") # Default: the available cores not given to generation
+INFERENCE_GENERATE_CORE_SHARE = 0.5 # Share of the available cores given to generation when no CPU list is set
+INFERENCE_RESTART_DELAY = 5 # Seconds before a crashed worker process is restarted
+
+# --- Admission Control (/chat) ---
+# Queued clients hold a server thread while they are told their position, so
+# ADMISSION_MAX_ACTIVE + ADMISSION_MAX_QUEUE must stay below SERVER_THREADS: the spare
+# threads answer /health, /metrics and the immediate 429s.
+SERVER_THREADS = 8 # waitress worker threads (run_production.py)
+ADMISSION_MAX_ACTIVE = 3 # Requests running the pipeline at once
+ADMISSION_MAX_QUEUE = 4 # Requests waiting for a slot; beyond this /chat answers 429
+ADMISSION_QUEUE_TIMEOUT = 300 # Seconds a queued request waits before giving up
+ADMISSION_POSITION_INTERVAL = 2 # Seconds between queue position updates sent to a waiting client
+ADMISSION_RETRY_AFTER = 10 # Minimum Retry-After (seconds) on a 429
+QUEUE_POSITION_PREFIX = "[QUEUE] " # Stream lines "[QUEUE] <position>" precede the answer while a request waits
+ASYNC_ADMISSION_MAX_QUEUE = 256 # Queue bound of the asyncio server (run_async.py), where waiting holds no thread
+STREAM_COALESCE_CHARS = 64 # Streamed tokens are sent in chunks of up to this many characters...
+STREAM_COALESCE_INTERVAL = 0.1 # ...or once the oldest unsent token is this many seconds old
+ASYNC_CPU_WORKERS = 4 # Threads for the blocking CPU stages of the asyncio serving path
+
+# --- Summary Cache (summaries.db) ---
+SUMMARIES_DB_PATH = "summaries.db"
+SUMMARY_TTL_DAYS = 30 # Cached summaries older than this are served but refreshed in the background
+SUMMARY_REFRESH_WORKERS = 1 # Background threads used to refresh stale summaries
+# Duplicate pages (page_dedup.py): URL variants share one row, copies of a page reuse its summary
+URL_IGNORED_PARAMS = ("lang", "print", "utm_*", "fbclid", "gclid") # Query parameters dropped from URLs (fnmatch patterns)
+URL_PREFER_HTTPS = os.getenv("URL_PREFER_HTTPS", "false").lower() == "true" # Rewrite http:// to https:// (only for sites serving both)
+SIMHASH_MAX_DISTANCE = 3 # Pages whose 64-bit SimHashes differ in at most this many bits are near-duplicates
+
+# --- Local Retrieval (summaries.db) ---
+LOCAL_INDEX_ENABLED = True
+LOCAL_INDEX_BM25_WEIGHT = 0.6 # Share of the hybrid score given to FTS5 BM25 (rest is embedding cosine)
+LOCAL_INDEX_BM25_SATURATION = 5.0 # BM25 score that maps to 0.5 after normalization
+# Top hybrid score needed to answer from local summaries without web search. Calibrated with
+# benchmarks/local_index.py on extract_keywords' terms: on-topic >= 0.299, off-topic <= 0.253 (spacy mode)
+LOCAL_INDEX_CONFIDENCE = 0.27
+LOCAL_INDEX_MIN_SCORE = 0.25 # Other local summaries must score at least this to be included
+
+# --- Offline Crawler (crawler.py) ---
+CRAWL_START_URL = "https://www.supcom.tn/"
+CRAWL_MAX_PAGES = 500 # Pages visited per run
+CRAWL_MAX_DEPTH = 5 # Link hops from the start page / sitemap entries
+CRAWL_RATE = 2.0 # Max requests per second sent to the site
+CRAWL_CONCURRENCY = 4 # Pages fetched at once
+CRAWL_SUMMARY_BATCH = 8 # Changed pages summarized and written per batch
+CRAWL_SEARCH_TERMS = "SupCom" # Search terms passed to the summarizer for crawled pages
+CRAWL_USER_QUERY = "Informations générales sur SupCom" # Query passed to the summarizer for crawled pages
+
+# --- Answer Cache ---
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIZE = 256 # Max cached answers (least recently used are evicted)
+ANSWER_CACHE_TTL = 6 * 3600 # Seconds before a cached answer expires
+ANSWER_CACHE_SIMILARITY = 0.92 # Min cosine similarity for a query with the same terms to reuse a cached answer (benchmarks/answer_cache.py)
+ANSWER_CACHE_REPLAY_CHUNK_WORDS = 3 # Words per chunk when streaming a cached answer
+EMBEDDING_DIM = 512 # Size of the hashed query/summary embeddings
 
-# --- Spacy Configuration ---
+# --- Keyword Extraction (keyword_extractor.py) ---
 SPACY_MODEL = "fr_core_news_sm"
+KEYWORD_MODE = os.getenv("KEYWORD_MODE", "spacy") # "spacy" (POS tags and lemmas) or "fast" (rule-based, no spaCy model)
+KEYWORD_CACHE_SIZE = 4096 # Memoized queries (least recently used are evicted)
+KEYWORD_BATCH_SIZE = 64 # Queries per nlp.pipe batch in extract_keywords_many
 
 # --- Deployment Settings ---
 FLASK_HOST="0.0.0.0"
@@ -78,13 +203,15 @@ SUMMARIZATION_PROMPT_TEMPLATE = (
 FINAL_RESPONSE_PROMPT_TEMPLATE = (
     "Vous êtes un assistant expert sur SupCom (École Supérieure des Communications de Tunis), nommé SupBot. "
     "En vous basant UNIQUEMENT sur les informations contextuelles fournies ci-dessous (résumés de recherche web), "
-    "répondez de manière complète et utile à la question de l'utilisateur : **'{user_query}'**. "
+    "répondez de manière complète et utile à la question de l'utilisateur indiquée ci-dessous. "
     "Synthétisez les détails clés des différents résumés fournis, en privilégiant les informations les plus pertinentes pour la question. "
     "Structurez votre réponse de manière claire et facile à lire (utilisez des paragraphes, éventuellement des listes si approprié). "
     "Citez vos sources à la fin de chaque information pertinente en utilisant le format [numéro] correspondant à l'ordre des résultats fournis dans le contexte. "
     "Si les informations contextuelles fournies ne permettent pas de répondre à la question, répondez par : "
     "'Désolé, les informations trouvées lors de la recherche ne permettent pas de répondre précisément à votre question.' et n'inventez rien. "
     "Terminez TOUJOURS votre réponse en listant toutes les sources utilisées, numérotées comme suit : \nSources:\n[1] lien1\n[2] lien2\netc.\n\n"
+    # Everything above is constant; keep the per-request fields last so its KV cache can be reused
+    "QUESTION DE L'UTILISATEUR : **'{user_query}'**\n\n"
     "CONTEXTE (Résumés de recherche web) :\n"
     "{context_data}"
 )
@@ -0,0 +1,75 @@
+# context_packer.py
+"""
+Token-budgeted packing of the summaries that go into the final-response prompt.
+
+Summaries are ranked by relevance to the question (cosine of the hashed embeddings), near-duplicates
+of a better-ranked summary are dropped, and the rest are added best first until the token budget is
+spent; the summary that crosses the budget is truncated if enough room is left. Every decision is
+logged and counted in supbot_context_summaries_total.
+"""
+import logging
+import numpy as np
+import config
+from embeddings import embed, embed_many
+from metrics import CONTEXT_SUMMARIES, CONTEXT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+def format_entry(n, result):
+    """One numbered context entry of the final-response prompt."""
+    return (f"[{n}] Source: {result.get('link', 'N/A')}\n"
+            f"   Title: {result.get('title', 'N/A')}\n"
+            f"   Summary: {result.get('Summary', 'N/A')}\n\n")
+
+
+def pack_context(results, query, tokenizer, budget,
+                 duplicate_similarity=config.CONTEXT_DUPLICATE_SIMILARITY, min_tokens=config.CONTEXT_MIN_TOKENS):
+    """
+    Returns the results to put in the prompt, most relevant first, whose formatted entries fit
+    `budget` tokens of `tokenizer`. Results are copied; a truncated one gets a shortened 'Summary'.
+    """
+    if not results:
+        return []
+    summaries = [f"{result.get('title', '')} {result.get('Summary', '')}" for result in results]
+    vectors = embed_many(summaries)
+    relevance = vectors @ embed(query)
+    # Most relevant first; equal scores keep the search order
+    ranking = np.lexsort((np.arange(len(results)), -relevance))
+
+    packed, packed_vectors, used = [], [], 0
+    for index in ranking:
+        result = results[index]
+        link = result.get("link", "N/A")
+        if packed_vectors and float(np.max(np.stack(packed_vectors) @ vectors[index])) >= duplicate_similarity:
+            logger.info(f"Context packer: dropped near-duplicate summary of {link}.")
+            CONTEXT_SUMMARIES.inc(decision="duplicate")
+            continue
+        entry_tokens = len(tokenizer(format_entry(len(packed) + 1, result), add_special_tokens=False)["input_ids"])
+        remaining = budget - used
+        if entry_tokens <= remaining:
+            packed.append(dict(result))
+            decision = "kept"
+        elif remaining >= min_tokens:
+            # Cut the summary so the entry fills what is left of the budget
+            summary_ids = tokenizer(result.get("Summary", ""), add_special_tokens=False)["input_ids"]
+            keep = len(summary_ids) - (entry_tokens - remaining)
+            if keep < min_tokens:
+                logger.info(f"Context packer: no room for {link} ({entry_tokens} tokens, {remaining} left).")
+                CONTEXT_SUMMARIES.inc(decision="over_budget")
+                continue
+            packed.append(dict(result, Summary=tokenizer.decode(summary_ids[:keep], skip_special_tokens=True)))
+            entry_tokens = remaining
+            decision = "truncated"
+        else:
+            logger.info(f"Context packer: no room for {link} ({entry_tokens} tokens, {remaining} left).")
+            CONTEXT_SUMMARIES.inc(decision="over_budget")
+            continue
+        used += entry_tokens
+        packed_vectors.append(vectors[index])
+        CONTEXT_SUMMARIES.inc(decision=decision)
+        logger.info(f"Context packer: {decision} {link} ({entry_tokens} tokens, relevance {relevance[index]:.2f}).")
+
+    CONTEXT_TOKENS.observe(used)
+    logger.info(f"Packed {len(packed)}/{len(results)} summaries into {used}/{budget} context tokens.")
+    return packed
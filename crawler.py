@@ -0,0 +1,340 @@
+# crawler.py
+"""
+Offline crawler that keeps summaries.db warm.
+
+Walks the configured site (sitemap.xml plus link discovery), fingerprints each page's text and
+re-summarizes only the pages whose fingerprint changed, in batches, writing the results in bulk.
+Stored summaries without a fingerprint (curated or imported rows) are kept and fingerprinted
+instead of being regenerated, unless --force is given.
+URLs are canonicalized before they enter the frontier, and a page whose content matches an
+already summarized page (exact hash or near SimHash) reuses that summary.
+The frontier is persisted in summaries.db, so an interrupted run resumes where it stopped.
+
+Usage:
+    python crawler.py [--start-url URL] [--domain DOMAIN] [--max-pages N] [--rate R] [--fresh] [--force]
+"""
+import re
+import json
+import time
+import logging
+import argparse
+from urllib.parse import urljoin, urldefrag, urlparse
+from bs4 import BeautifulSoup
+import config
+from http_fetcher import get_fetcher
+from page_dedup import canonicalize_url, content_fingerprint, simhash
+from summary_store import get_summary_store
+from web_scraper import clean_html
+
+logger = logging.getLogger(__name__)
+
+_SKIPPED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".zip", ".rar", ".doc", ".docx",
+                       ".xls", ".xlsx", ".ppt", ".pptx", ".mp4", ".mp3", ".css", ".js", ".ico")
+_LOC_RE = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.IGNORECASE | re.DOTALL)
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next_at:
+            time.sleep(self._next_at - now)
+            now = self._next_at
+        self._next_at = now + self.interval
+
+
+class CrawlState:
+    """
+    Crawl frontier persisted next to the summaries so a run can be resumed, plus the outlinks of every
+    fetched page, so a page answered with 304 Not Modified still leads the next pass to its links.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        with store.lock:
+            store.connection.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_frontier (
+                    url TEXT PRIMARY KEY,
+                    depth INTEGER,
+                    status TEXT DEFAULT 'pending',
+                    updated REAL
+                )
+            """)
+            store.connection.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_links (
+                    url TEXT PRIMARY KEY,
+                    links TEXT
+                )
+            """)
+            store.connection.commit()
+
+    def reset(self):
+        with self.store.lock:
+            self.store.connection.execute("DELETE FROM crawl_frontier")
+            self.store.connection.commit()
+
+    def requeue_interrupted(self):
+        """Pages waiting for summarization when a previous run stopped are fetched again."""
+        with self.store.lock:
+            self.store.connection.execute("UPDATE crawl_frontier SET status = 'pending' WHERE status = 'queued'")
+            self.store.connection.commit()
+
+    def add(self, urls, depth):
+        """Adds newly discovered URLs; already known URLs keep their status."""
+        with self.store.lock:
+            with self.store.connection:
+                self.store.connection.executemany(
+                    "INSERT OR IGNORE INTO crawl_frontier (url, depth, status, updated) VALUES (?, ?, 'pending', ?)",
+                    [(url, depth, time.time()) for url in urls]
+                )
+
+    def next_pending(self, limit):
+        with self.store.lock:
+            return self.store.connection.execute(
+                "SELECT url, depth FROM crawl_frontier WHERE status = 'pending' ORDER BY depth, rowid LIMIT ?", (limit,)
+            ).fetchall()
+
+    def mark(self, urls, status):
+        with self.store.lock:
+            with self.store.connection:
+                self.store.connection.executemany(
+                    "UPDATE crawl_frontier SET status = ?, updated = ? WHERE url = ?",
+                    [(status, time.time(), url) for url in urls]
+                )
+
+    def save_links(self, url, links):
+        with self.store.lock:
+            with self.store.connection:
+                self.store.connection.execute(
+                    "INSERT OR REPLACE INTO crawl_links (url, links) VALUES (?, ?)", (url, json.dumps(links))
+                )
+
+    def links_of(self, url):
+        """The outlinks recorded the last time `url` was downloaded, or None."""
+        with self.store.lock:
+            row = self.store.connection.execute("SELECT links FROM crawl_links WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def counts(self):
+        with self.store.lock:
+            return dict(self.store.connection.execute(
+                "SELECT status, COUNT(*) FROM crawl_frontier GROUP BY status"
+            ).fetchall())
+
+
+class SiteCrawler:
+    def __init__(self, start_url=config.CRAWL_START_URL, domain=None, max_pages=config.CRAWL_MAX_PAGES,
+                 max_depth=config.CRAWL_MAX_DEPTH, rate=config.CRAWL_RATE, concurrency=config.CRAWL_CONCURRENCY,
+                 batch_size=config.CRAWL_SUMMARY_BATCH, store=None, llm=None, force=False):
+        self.start_url = canonicalize_url(start_url)
+        self.domain = (domain or config.SITE_FILTER or urlparse(start_url).hostname).lower()
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.force = force
+        self.store = store or get_summary_store()
+        self.state = CrawlState(self.store)
+        self.limiter = RateLimiter(rate)
+        self.fetcher = get_fetcher()
+        self._llm = llm
+        self._pending_summaries = []  # (url, text, content_hash, simhash, validators)
+        self.stats = {"fetched": 0, "unchanged": 0, "duplicates": 0, "summarized": 0, "failed": 0}
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from llm_service import get_llm_service
+            self._llm = get_llm_service()
+        return self._llm
+
+    # --- URL filtering ---
+    def in_scope(self, url):
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        if parsed.scheme not in ("http", "https"):
+            return False
+        if host != self.domain and not host.endswith("." + self.domain):
+            return False
+        return not parsed.path.lower().endswith(_SKIPPED_EXTENSIONS)
+
+    def extract_links(self, html, base_url):
+        soup = BeautifulSoup(html, "html.parser")
+        links = []
+        for anchor in soup.find_all("a", href=True):
+            link = urldefrag(urljoin(base_url, anchor["href"].strip()))[0]
+            if self.in_scope(link):
+                links.append(canonicalize_url(link))
+        return list(dict.fromkeys(links))
+
+    def sitemap_urls(self):
+        """URLs listed in /sitemap.xml, following one level of sitemap index."""
+        parsed = urlparse(self.start_url)
+        sitemaps = [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"]
+        urls = []
+        for depth in range(2):
+            nested = []
+            for sitemap_url in sitemaps:
+                self.limiter.wait()
+                try:
+                    future = self.fetcher.submit(sitemap_url, body_types=("xml",), max_bytes=None)
+                    result = future.result(timeout=config.SCRAPE_TIMEOUT + 5)
+                except Exception as e:
+                    logger.info(f"No usable sitemap at {sitemap_url}: {e}")
+                    continue
+                body = (result["content"] or b"").decode("utf-8", errors="replace")
+                for loc in _LOC_RE.findall(body):
+                    (nested if loc.lower().endswith(".xml") and depth == 0 else urls).append(loc)
+            sitemaps = nested
+        return list(dict.fromkeys(canonicalize_url(url) for url in urls if self.in_scope(url)))
+
+    # --- Crawl loop ---
+    def run(self, fresh=False):
+        """Resumes the saved frontier if it has pending pages, otherwise starts a new pass over the site."""
+        self.state.requeue_interrupted()
+        if fresh or not self.state.next_pending(1):
+            self.state.reset()
+        self.state.add([self.start_url], 0)
+        self.state.add(self.sitemap_urls(), 1)
+
+        visited = 0
+        while visited < self.max_pages:
+            batch = self.state.next_pending(min(self.concurrency, self.max_pages - visited))
+            if not batch:
+                break
+            futures = {}
+            for url, depth in batch:
+                self.limiter.wait()
+                validators = self._validators_for(url, depth)
+                futures[url] = (depth, self.fetcher.submit(url, validators.get("etag"), validators.get("last_modified")))
+            for url, (depth, future) in futures.items():
+                self._handle_page(url, depth, future)
+            visited += len(batch)
+            logger.info(f"Crawled {visited} page(s); frontier: {self.state.counts()}")
+
+        self._flush_summaries()
+        logger.info(f"Crawl finished: {self.stats}")
+        return self.stats
+
+    def _validators_for(self, url, depth):
+        # Only revalidate pages we already hold a summary for; a 304 is useless otherwise
+        if self.force or self.store.get(url) is None:
+            return {}
+        # A 304 carries no links: pages whose links are followed need them recorded from an earlier download
+        if depth < self.max_depth and self.state.links_of(url) is None:
+            return {}
+        return self.store.get_validators(url) or {}
+
+    def _handle_page(self, url, depth, future):
+        try:
+            result = future.result(timeout=config.SCRAPE_TIMEOUT + 5)
+        except Exception as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            self.stats["failed"] += 1
+            self.state.mark([url], "failed")
+            return
+
+        self.stats["fetched"] += 1
+        if result["not_modified"]:
+            if depth < self.max_depth:
+                self.state.add(self.state.links_of(url) or [], depth + 1)
+            self.store.touch(url)
+            self.stats["unchanged"] += 1
+            self.state.mark([url], "done")
+            return
+        if not result["content"]:
+            self.state.mark([url], "skipped")
+            return
+
+        # Validators are only stored together with a summary of this content, never on their own
+        validators = ({"etag": result["etag"], "last_modified": result["last_modified"]}
+                      if result["etag"] or result["last_modified"] else None)
+        links = self.extract_links(result["content"], url)
+        self.state.save_links(url, links)
+        if depth < self.max_depth:
+            self.state.add(links, depth + 1)
+
+        text = clean_html(result["content"], url)
+        if not text:
+            self.state.mark([url], "skipped")
+            return
+        content_hash = content_fingerprint(text)
+        page_simhash = simhash(text)
+        if not self.force and self._keep_stored_summary(url, content_hash):
+            self.store.touch(url, content_hash=content_hash, simhash=page_simhash, validators=validators)
+            self.stats["unchanged"] += 1
+            self.state.mark([url], "done")
+            return
+        duplicate = self.store.find_by_content(content_hash, page_simhash, exclude_url=url)
+        if duplicate is not None:
+            logger.info(f"{url} is a {duplicate['match']} copy of {duplicate['url']}, reusing its summary.")
+            self.store.put(url, duplicate["summary"], content_hash=content_hash, simhash=page_simhash,
+                           validators=validators)
+            self.stats["duplicates"] += 1
+            self.state.mark([url], "done")
+            return
+        self._pending_summaries.append((url, text, content_hash, page_simhash, validators))
+        self.state.mark([url], "queued")
+        if len(self._pending_summaries) >= self.batch_size:
+            self._flush_summaries()
+
+    def _keep_stored_summary(self, url, content_hash):
+        """
+        True when the stored summary of `url` still describes the page: its fingerprint matches, or
+        the row has no fingerprint at all (a curated or imported summary), which is then adopted
+        as-is rather than overwritten by a generated one.
+        """
+        if self.store.get(url) is None:
+            return False
+        known_hash = self.store.get_content_hashes([url]).get(url)
+        if known_hash is None:
+            logger.info(f"Keeping the stored summary of {url}, which has no fingerprint yet (use --force to regenerate it).")
+            return True
+        return known_hash == content_hash
+
+    def _flush_summaries(self):
+        """Summarizes the queued changed pages in one batch and writes them in one transaction."""
+        if not self._pending_summaries:
+            return
+        batch, self._pending_summaries = self._pending_summaries, []
+        results = self.llm.summarize_many(
+            [text for _, text, *_ in batch], config.CRAWL_SEARCH_TERMS, config.CRAWL_USER_QUERY
+        )
+        records, failed = [], []
+        for (url, _, content_hash, page_simhash, validators), result in zip(batch, results):
+            if result["summary"]:
+                records.append((url, result["summary"], content_hash, page_simhash, validators))
+            else:
+                logger.warning(f"Failed to summarize crawled page {url}: {result['error']}")
+                failed.append(url)
+        self.store.put_many(records)
+        self.state.mark([url for url, *_ in records], "done")
+        self.state.mark(failed, "failed")
+        self.stats["summarized"] += len(records)
+        self.stats["failed"] += len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl the site and refresh summaries.db.")
+    parser.add_argument("--start-url", default=config.CRAWL_START_URL)
+    parser.add_argument("--domain", default=None, help="Domain to stay within (default: SITE_FILTER or the start URL's host)")
+    parser.add_argument("--max-pages", type=int, default=config.CRAWL_MAX_PAGES)
+    parser.add_argument("--max-depth", type=int, default=config.CRAWL_MAX_DEPTH)
+    parser.add_argument("--rate", type=float, default=config.CRAWL_RATE, help="Max requests per second")
+    parser.add_argument("--fresh", action="store_true", help="Forget an unfinished frontier and start over")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-summarize every page, including unchanged pages and curated summaries")
+    args = parser.parse_args()
+
+    crawler = SiteCrawler(start_url=args.start_url, domain=args.domain, max_pages=args.max_pages,
+                          max_depth=args.max_depth, rate=args.rate, force=args.force)
+    crawler.run(fresh=args.fresh)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,19 @@
-import sqlite3
+import config
+from page_dedup import canonicalize_url
+from summary_store import get_summary_store
 
-def delete_summary_for_url(db_path="summaries.db", url_to_delete="https://www.supcom.tn/pages/stages"):
+def delete_summary_for_url(db_path=config.SUMMARIES_DB_PATH, url_to_delete="https://www.supcom.tn/pages/stages"):
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-
+        url_to_delete = canonicalize_url(url_to_delete)  # The key the chatbot stores it under
         # Delete the row with the specific URL
-        c.execute("DELETE FROM summaries WHERE url = ?", (url_to_delete,))
-
-        conn.commit()
-
-        # Check if any rows were deleted
-        if c.rowcount > 0:
+        if get_summary_store(db_path).delete(url_to_delete):
             print(f"✅ Row with URL {url_to_delete} deleted successfully.")
         else:
             print(f"❌ URL {url_to_delete} not found in the database.")
 
-        conn.close()
-
     except Exception as e:
         print(f"❌ Error deleting row: {e}")
 
 # Example usage
-delete_summary_for_url(url_to_delete="https://www.supcom.tn/pages/theses-soutenues")
+if __name__ == "__main__":
+    delete_summary_for_url(url_to_delete="https://www.supcom.tn/pages/theses-soutenues")
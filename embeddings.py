@@ -0,0 +1,46 @@
+# embeddings.py
+import re
+import hashlib
+import unicodedata
+import numpy as np
+import config
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text):
+    """Lowercases, strips accents and collapses whitespace so trivial variants map to the same text."""
+    text = unicodedata.normalize("NFKD", text or "").lower()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def _features(text):
+    """Word unigrams plus character trigrams of each word (robust to plurals and typos)."""
+    for word in _TOKEN_RE.findall(normalize_text(text)):
+        yield "w:" + word
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            yield "c:" + padded[i:i + 3]
+
+
+def embed(text, dim=config.EMBEDDING_DIM):
+    """
+    Returns an L2-normalized hashed bag-of-features vector for `text`.
+    Cheap, deterministic across processes and needs no model download, so it can be
+    computed per request and stored alongside cached answers and summaries.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        # Signed hashing keeps collisions from only ever adding up
+        vector[digest % dim] += 1.0 if (digest >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_many(texts, dim=config.EMBEDDING_DIM):
+    """Returns a (len(texts), dim) matrix of embeddings."""
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.vstack([embed(text, dim) for text in texts])
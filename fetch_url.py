@@ -1,25 +1,20 @@
-import sqlite3
+import config
+from summary_store import get_summary_store
 
-def fetch_links_with_summary_and_date(db_path="summaries.db"):
+def fetch_links_with_summary_and_date(db_path=config.SUMMARIES_DB_PATH):
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-
         # Fetch URL, summary, and date
-        c.execute("SELECT url, summary, date FROM summaries")
-        results = c.fetchall()
-        conn.close()
-
-        return results
+        records = get_summary_store(db_path).all()
+        return [(r["url"], r["summary"], r["date"]) for r in records]
 
     except Exception as e:
         print(f"Error fetching data: {e}")
         return []
 
-# Example usage
-records = fetch_links_with_summary_and_date()
-for i, (url, summary, date) in enumerate(records, 1):
-    print(f"\n--- Entry #{i} ---")
-    print(f"URL: {url}")
-    print(f"Date: {date}")
-    print(f"Summary:\n{summary}")
+# Example usage (streams the rows; `python summaries_admin.py export` writes them as JSONL)
+if __name__ == "__main__":
+    for i, record in enumerate(get_summary_store().iter_rows(), 1):
+        print(f"\n--- Entry #{i} ---")
+        print(f"URL: {record['url']}")
+        print(f"Date: {record['date']}")
+        print(f"Summary:\n{record['summary']}")
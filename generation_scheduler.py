@@ -0,0 +1,309 @@
+# generation_scheduler.py
+import time
+import queue
+import logging
+import threading
+import torch
+from transformers import DynamicCache
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# --- KV cache helpers (work with both the 4.x and 5.x DynamicCache layouts) ---
+def cache_layers(cache):
+    """Returns the cache as a list of (keys, values) tensors shaped [batch, heads, seq, head_dim]."""
+    if isinstance(cache, (tuple, list)):
+        return [(keys, values) for keys, values in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def build_cache(layers):
+    """Wraps per-layer (keys, values) tensors in a DynamicCache the model can extend."""
+    cache = DynamicCache()
+    for layer_idx, (keys, values) in enumerate(layers):
+        cache.update(keys, values, layer_idx)
+    return cache
+
+
+def _left_pad(tensor, length):
+    """Left-pads dim 2 (sequence) of a [batch, heads, seq, head_dim] tensor with zeros up to `length`."""
+    missing = length - tensor.shape[2]
+    if missing <= 0:
+        return tensor
+    pad = tensor.new_zeros(tensor.shape[0], tensor.shape[1], missing, tensor.shape[3])
+    return torch.cat([pad, tensor], dim=2)
+
+
+class GenerationRequest:
+    """One sequence in the shared decoding loop. Tokens go to `streamer` (if any) and `output_ids`."""
+
+    def __init__(self, input_ids, generation_config, streamer=None):
+        self.input_ids = input_ids.reshape(-1)
+        self.generation_config = generation_config
+        self.streamer = streamer
+        self.max_new_tokens = generation_config.max_new_tokens or config.DEFAULT_MAX_NEW_TOKENS
+        self.do_sample = bool(generation_config.do_sample)
+        self.temperature = generation_config.temperature or 1.0
+        self.top_k = generation_config.top_k or 0 # 0 or None disables top-k, as in generate()
+        self.top_p = generation_config.top_p or 1.0
+        eos = generation_config.eos_token_id
+        self.eos_token_ids = set(eos if isinstance(eos, (list, tuple)) else [eos] if eos is not None else [])
+        self.output_ids = []
+        self.error = None
+        self.cancelled = False
+        self.submitted_at = time.time()
+        self.done = threading.Event()
+
+    def cancel(self):
+        """Stops decoding this sequence at the next step (e.g. the client went away)."""
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class GenerationScheduler:
+    """
+    Continuous-batching decoder shared by all final-response requests.
+    New requests are prefilled on their own and then merged into the running batch at the next
+    decoding step; finished sequences leave the batch immediately. Sequences of different lengths
+    share one left-padded KV cache with explicit position ids, so each one decodes exactly as it
+    would alone. When idle, the first request waits up to `max_wait` seconds for company.
+    """
+
+    def __init__(self, model, max_batch_size=config.GENERATION_MAX_BATCH_SIZE,
+                 max_wait=config.GENERATION_MAX_WAIT, prefill_fn=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # prefill_fn(input_ids[1, T]) -> (logits[1, V], layers); overridable (e.g. prefix KV reuse)
+        self.prefill_fn = prefill_fn or self._prefill
+        self._queue = queue.Queue()
+        self._active = []  # GenerationRequest, row-aligned with the batch tensors
+        self._layers = None  # [(keys, values)] for the whole batch
+        self._attention_mask = None  # [batch, kv_len]
+        self._positions = None  # [batch] next position id of each row
+        self._next_logits = None  # [batch, vocab] logits for each row's next token
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+    def submit(self, input_ids, generation_config, streamer=None):
+        """Queues a prompt for decoding and returns its GenerationRequest."""
+        request = GenerationRequest(input_ids.detach().cpu(), generation_config, streamer)
+        if streamer is not None:
+            streamer.put(request.input_ids) # Lets skip_prompt streamers drop the prompt, as generate() does
+        self._queue.put(request)
+        return request
+
+    def stats(self):
+        return {"active": len(self._active), "waiting": self._queue.qsize()}
+
+    # --- Scheduler loop ---
+    def _run(self):
+        while True:
+            try:
+                self._admit_waiting()
+                if self._active:
+                    self._step()
+            except Exception as e:
+                logger.error(f"Error in generation scheduler step: {e}", exc_info=True)
+                self._fail_all(e)
+
+    def _admit_waiting(self):
+        new_requests = []
+        if not self._active:
+            new_requests.append(self._queue.get()) # Idle: block until work arrives
+            deadline = time.time() + self.max_wait
+            while len(new_requests) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    new_requests.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        else:
+            while len(self._active) + len(new_requests) < self.max_batch_size:
+                try:
+                    new_requests.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        for request in new_requests:
+            if request.cancelled:
+                self._finish(request)
+                continue
+            try:
+                self._add_to_batch(request)
+            except Exception as e:
+                logger.error(f"Prefill failed: {e}", exc_info=True)
+                request.error = e
+                self._finish(request)
+        if new_requests:
+            logger.info(f"Generation batch: {len(self._active)} active, {self._queue.qsize()} waiting.")
+
+    @torch.inference_mode()
+    def _prefill(self, input_ids):
+        outputs = self.model(input_ids=input_ids, use_cache=True)
+        return outputs.logits[:, -1, :], cache_layers(outputs.past_key_values)
+
+    def _add_to_batch(self, request):
+        input_ids = request.input_ids.unsqueeze(0).to(self.model.device)
+        logits, layers = self.prefill_fn(input_ids)
+        prompt_len = input_ids.shape[1]
+        mask = torch.ones(1, prompt_len, dtype=torch.long, device=input_ids.device)
+        position = torch.tensor([prompt_len], dtype=torch.long, device=input_ids.device)
+
+        if not self._active:
+            self._layers, self._attention_mask, self._positions, self._next_logits = layers, mask, position, logits
+        else:
+            kv_len = max(self._attention_mask.shape[1], prompt_len)
+            self._layers = [
+                (torch.cat([_left_pad(k, kv_len), _left_pad(nk, kv_len)]), torch.cat([_left_pad(v, kv_len), _left_pad(nv, kv_len)]))
+                for (k, v), (nk, nv) in zip(self._layers, layers)
+            ]
+            self._attention_mask = torch.cat([
+                torch.nn.functional.pad(self._attention_mask, (kv_len - self._attention_mask.shape[1], 0)),
+                torch.nn.functional.pad(mask, (kv_len - prompt_len, 0)),
+            ])
+            self._positions = torch.cat([self._positions, position])
+            self._next_logits = torch.cat([self._next_logits, logits])
+        self._active.append(request)
+
+    def _sample(self, logits, request):
+        if not request.do_sample:
+            return int(torch.argmax(logits))
+        # Same warpers and order as generate(): temperature, then top-k, then top-p
+        logits = logits.float() / max(request.temperature, 1e-5)
+        if 0 < request.top_k < logits.shape[-1]:
+            kth_largest = torch.topk(logits, request.top_k).values[-1]
+            logits = logits.masked_fill(logits < kth_largest, float("-inf"))
+        probs = torch.softmax(logits, dim=-1)
+        if request.top_p < 1.0:
+            sorted_probs, sorted_idx = torch.sort(probs, descending=True)
+            cumulative = torch.cumsum(sorted_probs, dim=-1)
+            sorted_probs[cumulative - sorted_probs > request.top_p] = 0.0 # Keep the smallest nucleus above top_p
+            probs = torch.zeros_like(probs).scatter(0, sorted_idx, sorted_probs)
+        return int(torch.multinomial(probs, 1))
+
+    @torch.inference_mode()
+    def _step(self):
+        """Emits one token for every active sequence, drops finished ones, then runs one batched forward."""
+        next_tokens, keep = [], []
+        for row, request in enumerate(self._active):
+            token = self._sample(self._next_logits[row], request)
+            request.output_ids.append(token)
+            if request.streamer is not None:
+                request.streamer.put(torch.tensor([token]))
+            finished = (token in request.eos_token_ids or len(request.output_ids) >= request.max_new_tokens
+                        or request.cancelled)
+            if finished:
+                self._finish(request)
+            else:
+                next_tokens.append(token)
+                keep.append(row)
+
+        if len(keep) < len(self._active):
+            self._select_rows(keep)
+        if not self._active:
+            return
+
+        device = self._attention_mask.device
+        input_ids = torch.tensor(next_tokens, dtype=torch.long, device=device).unsqueeze(1)
+        self._attention_mask = torch.cat(
+            [self._attention_mask, torch.ones(len(keep), 1, dtype=torch.long, device=device)], dim=1
+        )
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=self._attention_mask,
+            position_ids=self._positions.unsqueeze(1),
+            past_key_values=build_cache(self._layers),
+            use_cache=True,
+        )
+        self._layers = cache_layers(outputs.past_key_values)
+        self._next_logits = outputs.logits[:, -1, :]
+        self._positions = self._positions + 1
+
+    def _select_rows(self, rows):
+        """Keeps only `rows` of the batch and trims left padding no remaining row needs."""
+        self._active = [self._active[row] for row in rows]
+        if not rows:
+            self._layers = self._attention_mask = self._positions = self._next_logits = None
+            return
+        index = torch.tensor(rows, dtype=torch.long, device=self._attention_mask.device)
+        mask = self._attention_mask.index_select(0, index)
+        first_used = int(mask.any(dim=0).int().argmax())
+        self._attention_mask = mask[:, first_used:]
+        self._layers = [
+            (k.index_select(0, index)[:, :, first_used:], v.index_select(0, index)[:, :, first_used:])
+            for k, v in self._layers
+        ]
+        self._positions = self._positions.index_select(0, index)
+        self._next_logits = self._next_logits.index_select(0, index)
+
+    def _finish(self, request):
+        if request.streamer is not None:
+            request.streamer.end()
+        request.done.set()
+
+    def _fail_all(self, error):
+        for request in self._active:
+            request.error = error
+            self._finish(request)
+        self._select_rows([])
+
+
+class SequentialGenerator:
+    """
+    Fallback for backends that cannot be driven step by step (e.g. ONNX Runtime):
+    same submit() interface as GenerationScheduler, but each request runs model.generate() in turn.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._queue = queue.Queue()
+        self._busy = 0
+        self._thread = threading.Thread(target=self._run, name="generation-sequential", daemon=True)
+        self._thread.start()
+
+    def submit(self, input_ids, generation_config, streamer=None):
+        request = GenerationRequest(input_ids.detach().cpu(), generation_config, streamer)
+        self._queue.put(request)
+        return request
+
+    def stats(self):
+        return {"active": self._busy, "waiting": self._queue.qsize()}
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request.cancelled:
+                self._finish(request)
+                continue
+            self._busy = 1
+            try:
+                input_ids = request.input_ids.unsqueeze(0).to(self.model.device)
+                with torch.inference_mode():
+                    outputs = self.model.generate(
+                        input_ids=input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        generation_config=request.generation_config,
+                        streamer=request.streamer,
+                    )
+                request.output_ids = outputs[0][input_ids.shape[1]:].tolist()
+            except Exception as e:
+                logger.error(f"Error during sequential generation: {e}", exc_info=True)
+                request.error = e
+                if request.streamer is not None:
+                    request.streamer.end()
+            finally:
+                self._busy = 0
+                request.done.set()
+
+    def _finish(self, request):
+        if request.streamer is not None:
+            request.streamer.end()
+        request.done.set()
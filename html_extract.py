@@ -0,0 +1,129 @@
+# html_extract.py
+"""
+Pluggable HTML-to-text extraction engines for the scraper (config.HTML_EXTRACTOR).
+
+  soup        BeautifulSoup with the pure-Python html.parser: the original path, always available
+  lxml        libxml2 parser (`pip install lxml`)
+  selectolax  Lexbor parser (`pip install selectolax`), the fastest
+  auto        selectolax, else lxml, else soup
+
+Every engine drops the same non-content elements (SKIP_TAGS) and joins the remaining text
+nodes with single spaces. The fast engines read the page's main content (<main>, <article>
+or role="main") when it has enough text, fall back to <body> otherwise, and stop walking the
+tree once `max_chars` characters are collected instead of extracting everything and truncating.
+"""
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+
+SKIP_TAGS = ("script", "style", "nav", "footer", "header", "aside", "noscript", "template")
+MAIN_CONTENT_SELECTOR = "main, article, [role=main]"
+
+
+def _join_until(strings, max_chars):
+    """Joins stripped, non-empty strings with spaces, stopping once `max_chars` characters are collected."""
+    parts, size = [], 0
+    for string in strings:
+        string = " ".join(string.split())
+        if not string:
+            continue
+        parts.append(string)
+        size += len(string) + 1
+        if size >= max_chars:
+            break
+    return " ".join(parts)[:max_chars]
+
+
+class SoupExtractor:
+    """BeautifulSoup + html.parser: parses and walks the whole page, then truncates."""
+    name = "soup"
+
+    def extract(self, content, max_chars):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, "html.parser")
+        for element in soup(list(SKIP_TAGS)):
+            element.decompose()
+        return soup.get_text(separator=" ", strip=True)[:max_chars]
+
+
+class LxmlExtractor:
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html # Fails early when lxml is not installed
+        from lxml import etree
+        self._html = lxml.html
+        self._etree = etree
+
+    def extract(self, content, max_chars):
+        try:
+            root = self._html.document_fromstring(content)
+        except (self._etree.ParserError, ValueError):
+            return ""
+        self._etree.strip_elements(root, *SKIP_TAGS, self._etree.Comment, with_tail=False)
+        main = root.xpath("//main | //article | //*[@role='main']")
+        if main:
+            text = _join_until(main[0].itertext(), max_chars)
+            if len(text) >= config.SCRAPE_MIN_MAIN_CHARS:
+                return text
+        body = root.find("body")
+        return _join_until((body if body is not None else root).itertext(), max_chars)
+
+
+class SelectolaxExtractor:
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser # Fails early when selectolax is not installed
+        self._parser = LexborHTMLParser
+
+    @staticmethod
+    def _texts(node):
+        for child in node.traverse(include_text=True):
+            if child.tag == "-text":
+                yield child.text_content or ""
+
+    def extract(self, content, max_chars):
+        if isinstance(content, bytes):
+            try:
+                content = content.decode("utf-8")
+            except UnicodeDecodeError:
+                from bs4 import UnicodeDammit # Declared charset (meta tag), then detection
+                content = UnicodeDammit(content, is_html=True).unicode_markup or ""
+        tree = self._parser(content)
+        tree.strip_tags(list(SKIP_TAGS))
+        main = tree.css_first(MAIN_CONTENT_SELECTOR)
+        if main is not None:
+            text = _join_until(self._texts(main), max_chars)
+            if len(text) >= config.SCRAPE_MIN_MAIN_CHARS:
+                return text
+        root = tree.body or tree.root
+        return _join_until(self._texts(root), max_chars) if root is not None else ""
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (SoupExtractor, LxmlExtractor, SelectolaxExtractor)}
+_AUTO_ORDER = ("selectolax", "lxml", "soup")
+_instances = {}
+
+
+def get_extractor(name=None):
+    """
+    Returns the extraction engine selected by `name` or config.HTML_EXTRACTOR. An engine whose
+    parser is not installed falls back to the next one of auto's order (soup always works).
+    """
+    name = name or config.HTML_EXTRACTOR
+    if name not in _instances:
+        if name != "auto" and name not in EXTRACTORS:
+            logger.warning(f"Unknown HTML extractor '{name}', using auto.")
+        candidates = [name] if name in EXTRACTORS else []
+        candidates += [candidate for candidate in _AUTO_ORDER if candidate not in candidates]
+        for candidate in candidates:
+            try:
+                _instances[name] = EXTRACTORS[candidate]()
+                break
+            except ImportError:
+                if candidate == name:
+                    logger.warning(f"HTML extractor '{name}' is not installed, falling back.")
+        logger.info(f"Using HTML extractor: {_instances[name].name}")
+    return _instances[name]
@@ -0,0 +1,155 @@
+# http_fetcher.py
+import atexit
+import asyncio
+import logging
+import threading
+import aiohttp
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFetcher:
+    """
+    Page fetcher built on one long-lived aiohttp session.
+    The session's connector keeps a keep-alive connection pool per host and caps concurrent
+    connections per host, so repeated requests to the same site skip DNS, TCP and TLS setup.
+    The event loop runs on a background thread; synchronous code uses `submit` or `fetch_many`.
+    """
+
+    def __init__(self, timeout=config.SCRAPE_TIMEOUT, headers=config.SCRAPE_HEADERS,
+                 max_connections=config.FETCH_MAX_CONNECTIONS, max_per_host=config.FETCH_MAX_PER_HOST):
+        self.timeout = timeout
+        self.headers = headers
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self._session = None
+        self._closed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-fetcher", daemon=True)
+        self._thread.start()
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                ttl_dns_cache=config.FETCH_DNS_CACHE_TTL,
+                keepalive_timeout=config.FETCH_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def fetch(self, url, etag=None, last_modified=None, body_types=("html",), max_bytes=config.SCRAPE_MAX_BYTES):
+        """
+        Fetches `url`, sending conditional headers when validators are given.
+        Returns {'url', 'status', 'content', 'content_type', 'etag', 'last_modified', 'not_modified', 'truncated'}.
+        The body is only read when the content type contains one of `body_types`, and only its first
+        `max_bytes` bytes (None: no limit); the download stops there. Raises aiohttp/asyncio errors.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        session = await self._get_session()
+        async with session.get(url, headers=headers) as response:
+            result = {
+                "url": url,
+                "status": response.status,
+                "content": None,
+                "content_type": response.headers.get("Content-Type", "").lower(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "not_modified": response.status == 304,
+                "truncated": False,
+            }
+            if result["not_modified"]:
+                return result
+            response.raise_for_status()
+            if any(body_type in result["content_type"] for body_type in body_types):
+                if max_bytes is None:
+                    result["content"] = await response.read()
+                else:
+                    result["content"], result["truncated"] = await self._read_capped(response, max_bytes)
+                    if result["truncated"]:
+                        logger.info(f"Stopped downloading {url} after {max_bytes} bytes.")
+            return result
+
+    @staticmethod
+    async def _read_capped(response, max_bytes):
+        """Reads the body in chunks up to `max_bytes`; returns (content, truncated)."""
+        chunks, size = [], 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                # Leaving the response unread closes the connection instead of draining the rest
+                return b"".join(chunks)[:max_bytes], True
+        return b"".join(chunks), False
+
+    def submit(self, url, etag=None, last_modified=None, body_types=("html",), max_bytes=config.SCRAPE_MAX_BYTES):
+        """Schedules a fetch from any thread; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(
+            self.fetch(url, etag, last_modified, body_types, max_bytes), self._loop
+        )
+
+    def fetch_many(self, requests_, timeout=None):
+        """
+        Fetches a batch concurrently from synchronous code.
+        `requests_` is a list of (url, etag, last_modified). Returns {url: result or exception}.
+        A fetch still running after `timeout` is cancelled and reported as the TimeoutError.
+        """
+        futures = {url: self.submit(url, etag, last_modified) for url, etag, last_modified in requests_}
+        results = {}
+        for url, future in futures.items():
+            try:
+                results[url] = future.result(timeout=timeout)
+            except Exception as e:
+                if not future.done():
+                    future.cancel()
+                results[url] = e
+        return results
+
+    def close(self):
+        """Closes the session on the fetcher's loop, then stops the loop. Calling it again does nothing."""
+        if self._closed:
+            return
+        self._closed = True
+
+        async def _close():
+            if self._session is not None:
+                await self._session.close()
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), self._loop).result(timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Could not close the fetcher session cleanly: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=self.timeout)
+
+
+# --- Singleton shared by the scraper and the crawler ---
+_fetcher_instance = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher():
+    """Returns the shared fetcher, starting its event loop on first use."""
+    global _fetcher_instance
+    with _fetcher_lock:
+        if _fetcher_instance is None:
+            _fetcher_instance = AsyncFetcher()
+        return _fetcher_instance
+
+@atexit.register
+def close_fetcher():
+    """Closes the shared fetcher if it was started; the next get_fetcher() starts a new one. Runs at exit."""
+    global _fetcher_instance
+    with _fetcher_lock:
+        fetcher, _fetcher_instance = _fetcher_instance, None
+    if fetcher is not None:
+        fetcher.close()
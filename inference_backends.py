@@ -0,0 +1,109 @@
+# inference_backends.py
+import os
+import logging
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModelForSeq2SeqLM, pipeline
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class EagerBackend:
+    """The original path: transformers models running in PyTorch eager mode."""
+    name = "eager"
+    # The generation scheduler drives the model step by step with a shared KV cache
+    supports_kv_decoding = True
+
+    def load_causal_lm(self, model_name, dtype):
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=dtype,
+            device_map="auto" # Let accelerate handle device placement
+        )
+        return self._share(model, model_name)
+
+    def load_seq2seq(self, model_name):
+        return self._share(AutoModelForSeq2SeqLM.from_pretrained(model_name), model_name)
+
+    @staticmethod
+    def _share(model, model_name):
+        """With SHARED_WEIGHTS, swaps the weights for the host-wide memory-mapped copy."""
+        if not config.SHARED_WEIGHTS:
+            return model
+        from shared_weights import share_weights
+        return share_weights(model, model_name)
+
+    def load_summarizer(self, model_name):
+        """Returns a summarization pipeline (exposes .model and .tokenizer) backed by this backend."""
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        return pipeline("summarization", model=self.load_seq2seq(model_name), tokenizer=tokenizer)
+
+
+class Int8Backend(EagerBackend):
+    """Dynamic int8 quantization of every nn.Linear (weights int8, activations quantized on the fly). CPU only."""
+    name = "int8"
+
+    @staticmethod
+    def _quantize(model):
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return quantized.eval()
+
+    def load_causal_lm(self, model_name, dtype):
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        return self._quantize(model)
+
+    def load_seq2seq(self, model_name):
+        return self._quantize(AutoModelForSeq2SeqLM.from_pretrained(model_name))
+
+
+class OnnxBackend(EagerBackend):
+    """
+    ONNX Runtime models exported with optimum. Exports are written to BACKEND_CACHE_DIR on first
+    load and reused afterwards. ORT models are decoded with generate(), one request at a time.
+    """
+    name = "onnx"
+    supports_kv_decoding = False
+
+    def _export_dir(self, model_name):
+        return os.path.join(config.BACKEND_CACHE_DIR, "onnx", model_name.replace("/", "--"))
+
+    def _load(self, ort_class, model_name):
+        export_dir = self._export_dir(model_name)
+        if os.path.isdir(export_dir):
+            logger.info(f"Loading cached ONNX export from {export_dir}")
+            return ort_class.from_pretrained(export_dir)
+        logger.info(f"Exporting {model_name} to ONNX (first run only)...")
+        model = ort_class.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        return model
+
+    def load_causal_lm(self, model_name, dtype):
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError as e:
+            raise RuntimeError("INFERENCE_BACKEND='onnx' requires `pip install optimum[onnxruntime]`.") from e
+        return self._load(ORTModelForCausalLM, model_name)
+
+    def load_seq2seq(self, model_name):
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise RuntimeError("INFERENCE_BACKEND='onnx' requires `pip install optimum[onnxruntime]`.") from e
+        return self._load(ORTModelForSeq2SeqLM, model_name)
+
+
+BACKENDS = {backend.name: backend for backend in (EagerBackend, Int8Backend, OnnxBackend)}
+
+
+def get_backend(name=None):
+    """Returns the backend selected by `name` or config.INFERENCE_BACKEND (eager on unknown names or GPU int8)."""
+    name = name or config.INFERENCE_BACKEND
+    if name not in BACKENDS:
+        logger.warning(f"Unknown inference backend '{name}', using eager.")
+        name = "eager"
+    if name == "int8" and config.DEVICE != "cpu":
+        logger.warning("int8 dynamic quantization is CPU-only, using eager on this device.")
+        name = "eager"
+    if name != "eager" and config.SHARED_WEIGHTS:
+        logger.warning(f"SHARED_WEIGHTS only applies to the eager backend; '{name}' workers keep private weights.")
+    return BACKENDS[name]()
@@ -0,0 +1,445 @@
+# inference_workers.py
+"""
+Summarization and final-response generation in dedicated worker processes (INFERENCE_WORKERS).
+
+Each pool ("summarize", "generate") runs its own processes, pinned to their own CPU cores with a
+matching torch thread count, so a burst of summarization cannot slow down the token streams
+decoded next door, and the server's request threads no longer compete with the models for the
+GIL or the cores. The server process keeps only the chat tokenizer.
+
+Jobs wait in one local queue per pool; a worker takes a job when it has capacity (one
+summarize_many batch at a time, or up to GENERATION_MAX_BATCH_SIZE generations for its
+continuous-batching decoder). Generated tokens are relayed back to the request as they are
+produced. Workers are started as `python inference_workers.py <pool>` (never by re-importing the
+server's main module), talk to the server over an inherited socket pair, exit when the server
+goes away, and are restarted if they crash.
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing.connection import Connection
+import torch
+import config
+from metrics import INFERENCE_JOBS
+
+logger = logging.getLogger(__name__)
+
+POOLS = ("generate", "summarize")
+_job_ids = itertools.count(1)
+
+
+# --- CPU sets ---
+def parse_cores(spec):
+    """CPU list such as "0-3,6" -> [0, 1, 2, 3, 6]; None or "" -> []."""
+    cores = set()
+    for part in (spec or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return sorted(cores)
+
+
+def _format_cores(cores):
+    return ",".join(str(core) for core in cores)
+
+
+def _available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pool_cores():
+    """{pool: cores} from INFERENCE_GENERATE_CORES / INFERENCE_SUMMARIZE_CORES, splitting the available cores by default."""
+    available = _available_cores()
+    generate, summarize = parse_cores(config.INFERENCE_GENERATE_CORES), parse_cores(config.INFERENCE_SUMMARIZE_CORES)
+    if not generate and not summarize:
+        split = min(max(1, round(len(available) * config.INFERENCE_GENERATE_CORE_SHARE)), len(available) - 1)
+        generate, summarize = available[:split], available[split:]
+    elif not summarize:
+        summarize = [core for core in available if core not in generate]
+    elif not generate:
+        generate = [core for core in available if core not in summarize]
+    if not generate or not summarize or set(generate) & set(summarize):
+        logger.warning("The generate and summarize pools share CPU cores; summarization can slow down token streams.")
+    return {"generate": generate or available, "summarize": summarize or available}
+
+
+def _split(cores, parts):
+    """`cores` in `parts` contiguous chunks (processes share cores when there are fewer cores than parts)."""
+    return [cores[i * len(cores) // parts:(i + 1) * len(cores) // parts] or cores for i in range(parts)]
+
+
+# --- Server side ---
+class _Job:
+    """A job for a pool; the worker answers with ("done", result) or ("error", message)."""
+
+    def __init__(self, payload):
+        self.id = next(_job_ids)
+        self.payload = payload
+        self.worker = None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def cancel(self):
+        self.cancelled = True
+        worker = self.worker
+        if worker is not None:
+            worker.cancel(self)
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.done.set()
+
+
+class _GenerationJob(_Job):
+    """A generate job with the GenerationRequest interface: tokens reach `streamer` and `output_ids` as they arrive."""
+
+    def __init__(self, input_ids, generation_config, streamer=None):
+        super().__init__((input_ids.tolist(), generation_config.to_dict()))
+        self.input_ids = input_ids
+        self.generation_config = generation_config
+        self.streamer = streamer
+        self.output_ids = []
+        self.submitted_at = time.time()
+
+    def add_tokens(self, token_ids):
+        self.output_ids.extend(token_ids)
+        if self.streamer is not None:
+            self.streamer.put(torch.tensor(token_ids))
+
+    def finish(self, result=None, error=None):
+        self.error = error # Set before end(): the consumer checks it once the stream stops
+        if self.streamer is not None:
+            self.streamer.end()
+        super().finish(result, error)
+
+
+class _Worker:
+    """Server side of one worker process: sends it jobs while it has capacity and relays its answers."""
+
+    def __init__(self, pool, cores):
+        self.pool = pool
+        self.cores = cores
+        self.process = None
+        self.jobs = {} # id -> _Job sent to the process and not finished
+        self._conn = None
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(pool.capacity)
+        self._alive = threading.Event()
+        self._stopped = False
+        self._feeder = None
+
+    @property
+    def alive(self):
+        return self._alive.is_set()
+
+    def launch(self):
+        """Starts the process; its models load in the background (see wait_ready)."""
+        parent_conn, child_conn = multiprocessing.Pipe()
+        env = dict(os.environ, INFERENCE_WORKERS="false", OMP_NUM_THREADS=str(len(self.cores)),
+                   MKL_NUM_THREADS=str(len(self.cores)))
+        command = [sys.executable, os.path.abspath(__file__), self.pool.name,
+                   "--fd", str(child_conn.fileno()), "--cores", _format_cores(self.cores)]
+        self.process = subprocess.Popen(command, env=env, pass_fds=(child_conn.fileno(),))
+        child_conn.close()
+        self._conn = parent_conn
+        self._stopped = False
+
+    def wait_ready(self):
+        """Waits until the process has loaded its models; raises RuntimeError if it failed."""
+        try:
+            kind, _, info = self._conn.recv()
+        except (EOFError, OSError):
+            kind, info = "failed", f"exited with code {self.process.wait()}"
+        if kind != "ready":
+            self.stop()
+            raise RuntimeError(f"{self.pool.name} worker failed to start: {info}")
+        logger.info(f"{self.pool.name} worker {info['pid']} ready on cores {_format_cores(self.cores)} "
+                    f"({info['threads']} threads, models loaded in {info['load_seconds']:.1f} s).")
+        self._alive.set()
+        threading.Thread(target=self._read, args=(self._conn,), name=f"{self.pool.name}-reader", daemon=True).start()
+        if self._feeder is None:
+            self._feeder = threading.Thread(target=self._feed, name=f"{self.pool.name}-feeder", daemon=True)
+            self._feeder.start()
+
+    def stop(self):
+        self._stopped = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def cancel(self, job):
+        with self._lock:
+            if job.id not in self.jobs:
+                return
+        self._send(("cancel", job.id, None))
+
+    def _send(self, message):
+        try:
+            with self._lock:
+                self._conn.send(message)
+            return True
+        except (OSError, ValueError): # Process gone; _read fails its jobs and restarts it
+            return False
+
+    def _feed(self):
+        while True:
+            self._slots.acquire()
+            self._alive.wait()
+            job = self.pool.queue.get()
+            if job.cancelled:
+                job.finish()
+                self._slots.release()
+                continue
+            job.worker = self
+            with self._lock:
+                self.jobs[job.id] = job
+            if not self._send(("run", job.id, job.payload)):
+                with self._lock:
+                    self.jobs.pop(job.id, None)
+                job.worker = None
+                self.pool.queue.put(job) # Another worker, or this one once restarted, takes it
+                self._slots.release()
+                self._alive.wait() # _read clears it; wait for the restart
+                time.sleep(0.1)
+
+    def _read(self, conn):
+        try:
+            while True:
+                kind, job_id, data = conn.recv()
+                with self._lock:
+                    job = self.jobs.get(job_id) if kind == "tokens" else self.jobs.pop(job_id, None)
+                if job is None:
+                    continue
+                if kind == "tokens":
+                    job.add_tokens(data)
+                    continue
+                self._slots.release()
+                if kind == "done":
+                    job.finish(data)
+                else:
+                    job.finish(error=RuntimeError(data))
+        except (EOFError, OSError):
+            pass
+        self._alive.clear()
+        with self._lock:
+            jobs, self.jobs = list(self.jobs.values()), {}
+        code = self.process.wait()
+        if self._stopped:
+            return
+        logger.error(f"{self.pool.name} worker {self.process.pid} exited with code {code}; "
+                     f"failing its {len(jobs)} job(s) and restarting it.")
+        for job in jobs:
+            self._slots.release()
+            job.finish(error=RuntimeError(f"{self.pool.name} worker exited with code {code}"))
+        self._restart()
+
+    def _restart(self):
+        while True:
+            time.sleep(config.INFERENCE_RESTART_DELAY)
+            try:
+                self.launch()
+                self.wait_ready()
+                return
+            except Exception as e:
+                logger.error(f"Failed to restart a {self.pool.name} worker: {e}")
+                if not any(worker.alive for worker in self.pool.workers):
+                    self.pool.fail_queued(e)
+
+
+class _Pool:
+    def __init__(self, name, processes, cores, capacity):
+        self.name = name
+        self.capacity = capacity # Jobs one worker runs at once
+        self.queue = queue.Queue()
+        self.workers = [_Worker(self, chunk) for chunk in _split(cores, max(1, processes))]
+
+    def submit(self, job):
+        self.queue.put(job)
+        return job
+
+    def fail_queued(self, error):
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            job.finish(error=error)
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "running": sum(len(worker.jobs) for worker in self.workers)}
+
+
+class RemoteGenerator:
+    """Same submit()/stats() interface as GenerationScheduler; the decoding runs in the generate pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def submit(self, input_ids, generation_config, streamer=None):
+        job = _GenerationJob(input_ids.detach().cpu().reshape(-1), generation_config, streamer)
+        if streamer is not None:
+            streamer.put(job.input_ids) # Lets skip_prompt streamers drop the prompt, as generate() does
+        return self.pool.submit(job)
+
+    def stats(self):
+        stats = self.pool.stats()
+        return {"active": stats["running"], "waiting": stats["queued"]}
+
+
+class InferenceExecutor:
+    """The summarize and generate pools. Registered in the model registry as "inference_workers"."""
+
+    def __init__(self):
+        cores = pool_cores()
+        self.pools = {
+            "generate": _Pool("generate", config.INFERENCE_GENERATE_PROCESSES, cores["generate"],
+                              config.GENERATION_MAX_BATCH_SIZE),
+            "summarize": _Pool("summarize", config.INFERENCE_SUMMARIZE_PROCESSES, cores["summarize"], 1),
+        }
+        INFERENCE_JOBS.set_function(lambda: {
+            (name, state): count for name, pool in self.pools.items() for state, count in pool.stats().items()
+        })
+
+    def start(self):
+        """Starts every worker (their models load in parallel) and waits until all are ready."""
+        workers = [worker for pool in self.pools.values() for worker in pool.workers]
+        for worker in workers:
+            worker.launch()
+        try:
+            for worker in workers:
+                worker.wait_ready()
+        except Exception:
+            for worker in workers:
+                worker.stop()
+            raise
+        return self
+
+    def summarize_many(self, pages, search_terms, user_query):
+        """LLMService.summarize_many, run by a summarize worker."""
+        job = self.pools["summarize"].submit(_Job((pages, search_terms, user_query)))
+        job.wait()
+        if job.error is not None:
+            logger.error(f"Summarization failed in the worker pool: {job.error}")
+            return [{"summary": None, "error": str(job.error)} for _ in pages]
+        return job.result
+
+    def generator(self):
+        return RemoteGenerator(self.pools["generate"])
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# --- Worker process ---
+class _TokenRelay:
+    """Streamer sending generated token ids to the server; the first put() is the prompt and is dropped."""
+
+    def __init__(self, send, job_id):
+        self.send = send
+        self.job_id = job_id
+        self._prompt = True
+
+    def put(self, value):
+        if self._prompt:
+            self._prompt = False
+            return
+        self.send(("tokens", self.job_id, value.reshape(-1).tolist()))
+
+    def end(self):
+        pass
+
+
+def _serve_summarize(conn, send):
+    from llm_service import LLMService
+    service = LLMService.__new__(LLMService) # Summarization only needs the registry, not the chat model
+    while True:
+        kind, job_id, payload = conn.recv()
+        if kind != "run": # Summaries cannot be cancelled halfway
+            continue
+        try:
+            send(("done", job_id, service.summarize_many(*payload)))
+        except Exception as e:
+            logger.error(f"Summarization job failed: {e}", exc_info=True)
+            send(("error", job_id, str(e)))
+
+
+def _serve_generate(conn, send, service):
+    from transformers import GenerationConfig
+    requests = {}
+
+    def report(job_id, request):
+        request.wait()
+        requests.pop(job_id, None)
+        send(("error", job_id, str(request.error)) if request.error else ("done", job_id, None))
+
+    while True:
+        kind, job_id, payload = conn.recv()
+        if kind == "cancel":
+            request = requests.get(job_id)
+            if request is not None:
+                request.cancel()
+            continue
+        input_ids, generation_config = payload
+        request = service.scheduler.submit(
+            torch.tensor(input_ids), GenerationConfig.from_dict(generation_config), _TokenRelay(send, job_id)
+        )
+        requests[job_id] = request
+        threading.Thread(target=report, args=(job_id, request), daemon=True).start()
+
+
+def _worker_main(pool, fd, cores):
+    conn = Connection(fd)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    cores = cores or _available_cores()
+    torch.set_num_threads(len(cores))
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    from model_registry import registry
+    start = time.time()
+    try:
+        model = registry.get("llm" if pool == "generate" else "summarizer")
+    except Exception as e:
+        send(("failed", None, str(e)))
+        return 1
+    send(("ready", None, {"pid": os.getpid(), "threads": torch.get_num_threads(), "load_seconds": time.time() - start}))
+    try:
+        if pool == "generate":
+            _serve_generate(conn, send, model)
+        else:
+            _serve_summarize(conn, send)
+    except (EOFError, OSError): # The server went away
+        pass
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker process (started by the server).")
+    parser.add_argument("pool", choices=POOLS)
+    parser.add_argument("--fd", type=int, required=True, help="Inherited socket to the server")
+    parser.add_argument("--cores", default="", help="CPU list to pin the process to, e.g. '0-3'")
+    args = parser.parse_args()
+    sys.exit(_worker_main(args.pool, args.fd, parse_cores(args.cores)))
+
+
+if __name__ == "__main__":
+    main()
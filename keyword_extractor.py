@@ -1,52 +1,274 @@
 # keyword_extractor.py
-import spacy
+"""
+Search keywords for a user query: "SupCom" followed by the query's nouns, lemmatized.
+
+Two modes (config.KEYWORD_MODE):
+  spacy  part-of-speech tags and lemmas of config.SPACY_MODEL, loaded on first use
+  fast   rule-based: a French stopword list, a lemma table and plural stripping; no spaCy needed
+
+Results are memoized per normalized query (least recently used evicted beyond
+KEYWORD_CACHE_SIZE). extract_keywords_many() runs a list of queries, e.g. a replayed query log,
+through nlp.pipe in batches and fills the memo.
+"""
+import re
 import logging
+import threading
+from collections import OrderedDict
 import config
+from embeddings import normalize_text
+from metrics import CACHE_REQUESTS
 
 logger = logging.getLogger(__name__)
 
-try:
-    # Try loading the specified model
-    nlp = spacy.load(config.SPACY_MODEL, disable=["parser", "ner"]) # Disable unused pipes for speed
-    logger.info(f"spaCy model '{config.SPACY_MODEL}' loaded successfully.")
-except OSError:
-    # If loading fails, try downloading it (useful in Docker setup)
-    logger.warning(f"spaCy model '{config.SPACY_MODEL}' not found. Attempting download...")
+BASE_KEYWORD = "SupCom"
+MAX_KEYWORDS = 4 # Base keyword included
+
+
+def load_spacy_model():
+    """Loads config.SPACY_MODEL, downloading it if missing. Returns None when it cannot be loaded."""
+    try:
+        import spacy
+    except ImportError:
+        logger.warning("spaCy is not installed; keywords use the fast rule-based mode.")
+        return None
+    try:
+        nlp = spacy.load(config.SPACY_MODEL, disable=["parser", "ner"]) # Disable unused pipes for speed
+        logger.info(f"spaCy model '{config.SPACY_MODEL}' loaded successfully.")
+        return nlp
+    except OSError:
+        # If loading fails, try downloading it (useful in Docker setup)
+        logger.warning(f"spaCy model '{config.SPACY_MODEL}' not found. Attempting download...")
+    except Exception as e:
+        logger.error(f"An unexpected error occurred loading spaCy model: {e}; "
+                     f"keywords use the fast rule-based mode.", exc_info=True)
+        return None
     try:
         spacy.cli.download(config.SPACY_MODEL)
         nlp = spacy.load(config.SPACY_MODEL, disable=["parser", "ner"])
         logger.info(f"spaCy model '{config.SPACY_MODEL}' downloaded and loaded successfully.")
-    except Exception as e:
-        logger.error(f"Failed to download or load spaCy model '{config.SPACY_MODEL}': {e}", exc_info=True)
-        nlp = None # Indicate failure
-except Exception as e:
-     logger.error(f"An unexpected error occurred loading spaCy model: {e}", exc_info=True)
-     nlp = None
+        return nlp
+    except BaseException as e: # spacy.cli.download exits through SystemExit on failure
+        logger.error(f"Failed to download or load spaCy model '{config.SPACY_MODEL}': {e}; "
+                     f"keywords use the fast rule-based mode.", exc_info=True)
+        return None
+
+
+_register_lock = threading.Lock()
+
+
+def _get_nlp():
+    """The spaCy pipeline (None when unavailable), from the model registry."""
+    from model_registry import registry
+    with _register_lock:
+        if "spacy" not in registry.status(): # KEYWORD_MODE=fast: only loaded for an explicit spacy call
+            registry.register("spacy", load_spacy_model)
+    return registry.get("spacy")
+
+
+def _join_keywords(extracted):
+    keywords = list(dict.fromkeys([BASE_KEYWORD] + extracted)) # Remove duplicates while preserving order
+    return " ".join(keywords[:MAX_KEYWORDS])
+
+
+def _spacy_keywords(doc):
+    """Nouns and proper nouns of a spaCy doc, as lowercase lemmas."""
+    return _join_keywords([
+        token.lemma_.lower() for token in doc # Use lemma for base form
+        if token.pos_ in ["NOUN", "PROPN"] and token.text.lower() != BASE_KEYWORD.lower() and not token.is_stop
+    ])
+
+
+# --- Fast mode ---
+_ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+_SCHOOL_RE = re.compile(r"\bsup\s*['’ -]?\s*com\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[^\W\d_][\w-]*", re.UNICODE)
+_INVERSION_RE = re.compile(r"-(?:t-)?(?:je|tu|il|elle|on|nous|vous|ils|elles|ce)$") # "a-t-il", "peut-on"
+
+# Function words and auxiliaries (all that query_terms drops)...
+FUNCTION_WORDS = frozenset("""
+    a à afin ai aie aient aies ait alors as au aucun aucune auprès aura aurai auraient aurais aurait
+    auras aurez auriez aurons auront après aussi autre autres aux avaient avais avait avant avec avez aviez
+    avoir avons ayant ayez ayons bien bon bonne c ça car ce ceci cela celle celles celui cependant ces
+    cet cette ceux chaque chez ci combien comme comment d dans de depuis des dès deux dois doit doivent
+    donc dont du durant e elle elles en encore entre es est et étaient étais était été êtes être eu eue
+    eues eûmes eurent eus eut eux existe existent exister faire fais fait faites faut fois furent fus
+    fut hors i ici il ils j je jusqu l la là laquelle le lequel les lesquelles lesquels leur leurs lors
+    lorsqu lui m ma mais me même mêmes mes moi moins mon n ne ni non nos notre nous on ont ou où par
+    parce pas peu peut peuvent peux plus plusieurs pour pourquoi près pourrais pourrait pouvez pouvoir
+    puis puisqu qu quand que quel quelle quelles quels qui quoi s sa sans sais sait savoir se sera
+    serai seraient serais serait seras serez seriez serons seront ses si sien soi soient sois soit
+    sommes son sont sous suis sur t ta te tes toi ton tous tout toute toutes très trop trouve trouvent
+    trouver trouvé tu un une unes uns va vais vas veux veut voici voilà vont vos votre vous vu y
+""".split())
+# ...plus the verbs, adjectives and adverbs common in questions to the bot.
+# Without part-of-speech tags, anything not listed here is treated as a noun.
+FRENCH_STOPWORDS = FUNCTION_WORDS | frozenset("""
+    obtenir postuler contacter candidater inscrire intégrer accéder déposer consulter connaître
+    aimerais voudrais souhaite souhaiterais besoin savoir dire donner merci svp bonjour salut
+    quelles quels possible disponible disponibles nécessaire nécessaires principal principale
+    principaux principales différent différents différentes international internationale
+    internationaux internationales national nationale nationaux nationales nouveau nouvelle
+    nouveaux nouvelles premier première premiers premières dernier dernière derniers dernières
+    grand grande grands grandes petit petite meilleur meilleure meilleurs actuel actuelle prochain
+    prochaine exactement actuellement vraiment également ensuite toujours souvent déjà
+    cherche chercher commence commencer proposé proposée proposés proposées soutenu soutenue
+    soutenus soutenues organisé organisée organisés organisées universitaire universitaires
+    préparatoire préparatoires intérieur intérieure artificiel artificielle
+""".split())
+
+# Plural and variant forms the suffix rule gets wrong, mapped to spaCy's lemmas
+LEMMA_TABLE = {
+    "travaux": "travail", "journaux": "journal", "locaux": "local", "canaux": "canal",
+    "signaux": "signal", "réseaux": "réseau", "bureaux": "bureau", "niveaux": "niveau",
+    "tableaux": "tableau", "jeux": "jeu", "lieux": "lieu", "yeux": "œil", "cieux": "ciel",
+    "ingénieure": "ingénieur", "ingénieures": "ingénieur", "étudiante": "étudiant",
+    "étudiantes": "étudiant", "doctorante": "doctorant", "doctorantes": "doctorant",
+    "enseignante": "enseignant", "enseignantes": "enseignant", "mastères": "mastère",
+}
+# Words ending in s or x that are already singular
+INVARIABLE = frozenset("""
+    cours concours frais campus temps pays prix choix corps fois mois bus virus processus
+    recours parcours discours secours relais univers avis
+    cas bois dos gaz jus mars repas
+""".split())
+
+
+def _lemma(word):
+    if word in LEMMA_TABLE:
+        return LEMMA_TABLE[word]
+    if word in INVARIABLE or len(word) <= 3 or word.endswith("ès"):
+        return word
+    if word.endswith("aux"):
+        return word[:-3] + "al"
+    if word.endswith(("s", "x")):
+        return word[:-1]
+    return word
+
+
+def fast_keywords(text):
+    """Rule-based keywords: the query's words minus stopwords, with plurals reduced to the singular."""
+    text = _ELISION_RE.sub(" ", _SCHOOL_RE.sub(" ", text))
+    extracted = []
+    for word in _WORD_RE.findall(text.lower()):
+        word = _INVERSION_RE.sub("", word).strip("-")
+        if len(word) < 2 or word in FRENCH_STOPWORDS or word.endswith("ième"): # Ordinals
+            continue
+        lemma = _lemma(word)
+        if lemma not in FRENCH_STOPWORDS and lemma != BASE_KEYWORD.lower():
+            extracted.append(lemma)
+    return _join_keywords(extracted)
+
+
+# Question words that change what is asked about the same terms ("Où a lieu..." / "Quand a lieu...")
+QUESTION_WORDS = frozenset("quand où pourquoi comment".split())
+_TERM_RE = re.compile(r"\w[\w-]*", re.UNICODE)
+
+
+def query_terms(text):
+    """
+    The lemmatized terms of a question: every word but function words, so adjectives, ordinals,
+    numbers and the QUESTION_WORDS are kept. Unlike the keywords it is not cut to MAX_KEYWORDS:
+    two questions with different terms ask different things.
+    """
+    text = _ELISION_RE.sub(" ", _SCHOOL_RE.sub(" ", text))
+    terms = set()
+    for word in _TERM_RE.findall(text.lower()):
+        word = _INVERSION_RE.sub("", word).strip("-_")
+        if word and (word in QUESTION_WORDS or word not in FUNCTION_WORDS):
+            terms.add(_lemma(word))
+    return frozenset(terms)
+
+
+# --- Memo and public API ---
+class KeywordMemo:
+    """Thread-safe LRU of keyword strings keyed on (mode, normalized query)."""
+
+    def __init__(self, max_entries=config.KEYWORD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_memo = KeywordMemo()
+
+
+def _resolve_mode(mode):
+    """The mode to run: `mode` or config.KEYWORD_MODE, and fast when the spaCy model is unavailable."""
+    mode = mode or config.KEYWORD_MODE
+    if mode == "spacy" and _get_nlp() is None:
+        return "fast"
+    return mode
+
+
+def extract_keywords(text, mode=None):
+    """Search keywords for `text` ("SupCom" plus up to three nouns), memoized per normalized query."""
+    mode = _resolve_mode(mode)
+    key = (mode, normalize_text(text))
+    keywords = _memo.get(key)
+    CACHE_REQUESTS.inc(cache="keywords", result="hit" if keywords is not None else "miss")
+    if keywords is not None:
+        return keywords
+    keywords = _spacy_keywords(_get_nlp()(text)) if mode == "spacy" else fast_keywords(text)
+    _memo.put(key, keywords)
+    logger.info(f"Extracted {mode} keywords for '{text}': '{keywords}'")
+    return keywords
+
 
 def extract_keywords_spacy(text):
     """Extracts potential keywords (nouns, proper nouns) using spaCy."""
-    if not nlp:
-        logger.error("spaCy model not available. Cannot extract keywords.")
-        # Fallback: return raw text or simple split
-        return text
+    return extract_keywords(text, mode="spacy")
 
-    # Add "SupCom" as a base keyword if not present
-    base_keyword = "SupCom"
-    keywords = [base_keyword]
 
-    # Process the text
-    doc = nlp(text)
+def extract_keywords_many(texts, mode=None, batch_size=config.KEYWORD_BATCH_SIZE):
+    """
+    Keywords for each of `texts`, in order. Memoized queries are answered from the memo; the rest
+    (each distinct normalized query once) go through nlp.pipe in batches of `batch_size`.
+    """
+    mode = _resolve_mode(mode)
+    keys = [(mode, normalize_text(text)) for text in texts]
+    results = [_memo.get(key) for key in keys]
+    missing = {}  # normalized key -> first text with that key
+    for text, key, keywords in zip(texts, keys, results):
+        if keywords is None:
+            missing.setdefault(key, text)
+    hits = sum(keywords is not None for keywords in results)
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache="keywords", result="hit")
+    if not missing:
+        return results
 
-    # Extract Nouns and Proper Nouns, excluding the base keyword if already added
-    extracted = [
-        token.lemma_.lower() for token in doc # Use lemma for base form
-        if token.pos_ in ["NOUN", "PROPN"] and token.text.lower() != base_keyword.lower() and not token.is_stop
-    ]
+    if mode == "spacy":
+        docs = _get_nlp().pipe(missing.values(), batch_size=batch_size)
+        computed = dict(zip(missing, (_spacy_keywords(doc) for doc in docs)))
+    else:
+        computed = {key: fast_keywords(text) for key, text in missing.items()}
+    for key, keywords in computed.items():
+        _memo.put(key, keywords)
+    CACHE_REQUESTS.inc(len(texts) - hits, cache="keywords", result="miss")
+    logger.info(f"Extracted {mode} keywords for {len(computed)} new queries ({len(texts)} requested).")
+    return [keywords if keywords is not None else computed[key] for key, keywords in zip(keys, results)]
 
-    # Combine and limit keywords (e.g., base + top 3 extracted)
-    keywords.extend(extracted)
-    final_keywords = list(dict.fromkeys(keywords)) # Remove duplicates while preserving order
-    keyword_str = " ".join(final_keywords[:4]) # Limit to ~4 keywords
 
-    logger.info(f"Extracted spaCy keywords for '{text}': '{keyword_str}'")
-    return keyword_str
\ No newline at end of file
+def clear_cache():
+    _memo.clear()
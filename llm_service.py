@@ -1,17 +1,49 @@
 # llm_service.py
+import asyncio
 import torch
 # **** ADDED IMPORTS ****
-from threading import Thread
-from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig, TextIteratorStreamer
+from transformers import AutoConfig, AutoTokenizer, GenerationConfig, TextIteratorStreamer, TextStreamer
 # **********************
 from huggingface_hub import login
 import logging
 import time # Added for potential delays if needed
-from threading import Lock
 import config # Use our config file
+from model_registry import get_model
+from generation_scheduler import GenerationScheduler, SequentialGenerator
+from inference_backends import get_backend
+from prefix_cache import PromptPrefixCache
+from passage_filter import select_passages
+from context_packer import format_entry, pack_context
+from metrics import GENERATED_TOKENS, GENERATION_QUEUE, TOKENS_PER_SECOND
 
 logger = logging.getLogger(__name__)
 
+
+class AsyncTokenStreamer(TextStreamer):
+    """
+    Streamer for asyncio consumers: decoded text is handed from the generation thread to the
+    event loop with call_soon_threadsafe and read with `async for`.
+    """
+
+    def __init__(self, tokenizer, loop, skip_prompt=True, **decode_kwargs):
+        super().__init__(tokenizer, skip_prompt=skip_prompt, **decode_kwargs)
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def on_finalized_text(self, text, stream_end=False):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        text = await self.queue.get()
+        if text is None:
+            raise StopAsyncIteration
+        return text
+
 class LLMService:
     def __init__(self, model_name=config.MODEL_NAME, device=config.DEVICE, dtype=config.DTYPE):
         self.model_name = model_name
@@ -19,10 +51,32 @@ class LLMService:
         self.dtype = dtype
         self.tokenizer = None
         self.model = None
+        self.model_config = None
         self.generation_config = None
+        self.backend = get_backend()
         self._load_model()
-        self.generate_lock = Lock()
+        # All final-response generations share one continuous-batching decode loop,
+        # starting from the cached KV of the constant system-prompt prefix
+        self.prefix_cache = None
+        if config.INFERENCE_WORKERS:
+            # The decode loop runs in the generate worker processes; tokens are relayed back here
+            self.scheduler = get_model("inference_workers").generator()
+        elif not self.backend.supports_kv_decoding:
+            self.scheduler = SequentialGenerator(self.model)
+        else:
+            if config.PROMPT_PREFIX_CACHE:
+                self.prefix_cache = PromptPrefixCache(self.model, self.tokenizer, self.model_name)
+            self.scheduler = GenerationScheduler(
+                self.model, prefill_fn=self.prefix_cache.prefill if self.prefix_cache else None
+            )
+        GENERATION_QUEUE.set_function(
+            lambda: {(state,): count for state, count in self.scheduler.stats().items()}
+        )
     def _login_huggingface(self):
+        if not config.HF_TOKEN:
+            # login() without a token falls back to an interactive prompt; public and local models need none
+            logger.warning("HF_TOKEN not set, skipping Hugging Face login.")
+            return
         try:
                     login(token=config.HF_TOKEN)
                     logger.info("Successfully logged into Hugging Face Hub.")
@@ -42,13 +96,15 @@ class LLMService:
                 logger.warning("Tokenizer does not have a pad_token_id. Setting to eos_token_id.")
                 self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
 
-            logger.info(f"Loading model: {self.model_name} to device: {self.device} with dtype: {self.dtype}")
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=self.dtype,
-                device_map="auto" # Let accelerate handle device placement
-            )
-            logger.info("Model loaded successfully.")
+            if config.INFERENCE_WORKERS:
+                # The weights are loaded by the generate workers; the config gives the context window
+                self.model_config = AutoConfig.from_pretrained(self.model_name)
+            else:
+                logger.info(f"Loading model: {self.model_name} to device: {self.device} with dtype: {self.dtype} "
+                            f"(backend: {self.backend.name})")
+                self.model = self.backend.load_causal_lm(self.model_name, self.dtype)
+                self.model_config = getattr(self.model, "config", None)
+                logger.info("Model loaded successfully.")
 
             self.generation_config = GenerationConfig.from_pretrained(self.model_name)
             self.generation_config.pad_token_id = self.tokenizer.pad_token_id
@@ -59,10 +115,23 @@ class LLMService:
             raise RuntimeError(f"Failed to initialize LLM Service: {e}") from e
 
 
+    def _encode_messages(self, messages):
+        """Applies the chat template and returns input ids [1, seq_len] on the model's device."""
+        encoded = self.tokenizer.apply_chat_template(
+            messages,
+            add_generation_prompt=True,
+            return_tensors="pt"
+        )
+        if not torch.is_tensor(encoded): # Newer transformers return a BatchEncoding
+            encoded = encoded["input_ids"]
+        if self.model is None: # Decoded in a worker process
+            return encoded
+        return encoded.to(self.model.device)
+
     # **** MODIFIED INTERNAL GENERATION FUNCTION ****
     def _generate_stream(self, messages, generation_config):
         """Internal generator function for streaming tokens."""
-        if not self.model or not self.tokenizer:
+        if not self.scheduler or not self.tokenizer:
             raise RuntimeError("Model or tokenizer not loaded.")
 
         try:
@@ -70,125 +139,217 @@ class LLMService:
                 self.tokenizer, skip_prompt=True, skip_special_tokens=True
             )
 
-            input_tensor = self.tokenizer.apply_chat_template(
-                messages,
-                add_generation_prompt=True,
-                return_tensors="pt"
-            ).to(self.model.device)
-
-            generation_kwargs = dict(
-                input_ids=input_tensor,
-                generation_config=generation_config,
-                streamer=streamer,
-                # You might need attention_mask depending on model/padding, but often okay with device_map="auto"
-                # attention_mask=input_tensor.ne(self.tokenizer.pad_token_id)
-            )
-            with self.generate_lock:
-                # Run generation in a separate thread for streaming
-                thread = Thread(target=self.model.generate, kwargs=generation_kwargs)
-                thread.start()
+            input_tensor = self._encode_messages(messages)
+
+            request = self.scheduler.submit(input_tensor, generation_config, streamer)
 
             # Yield tokens as they become available
             logger.info("Starting token stream generation...")
-            for new_text in streamer:
-                yield new_text
+            first_token_at = None
+            try:
+                for new_text in streamer:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield new_text
+            finally:
+                request.cancel() # Frees the batch slot if the client stopped reading
+            if request.error:
+                raise request.error
+            self._record_generation(len(request.output_ids), first_token_at)
             logger.info("Token stream generation finished.")
 
-            thread.join() # Ensure thread finishes, though streamer should handle it
-
         except Exception as e:
             logger.error(f"Error during LLM stream generation: {e}", exc_info=True)
             yield f"Error generating response stream: {e}" # Yield error message as part of the stream
 
+    async def _generate_stream_async(self, messages, generation_config):
+        """Like _generate_stream, but awaits tokens instead of blocking a thread on the streamer."""
+        if not self.scheduler or not self.tokenizer:
+            raise RuntimeError("Model or tokenizer not loaded.")
+
+        try:
+            streamer = AsyncTokenStreamer(self.tokenizer, asyncio.get_running_loop(), skip_special_tokens=True)
+            input_tensor = self._encode_messages(messages)
+            request = self.scheduler.submit(input_tensor, generation_config, streamer)
+
+            logger.info("Starting async token stream generation...")
+            first_token_at = None
+            try:
+                async for new_text in streamer:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield new_text
+            finally:
+                request.cancel() # Also runs when the client disconnects and the task is cancelled
+            if request.error:
+                raise request.error
+            self._record_generation(len(request.output_ids), first_token_at)
+            logger.info("Token stream generation finished.")
+
+        except Exception as e:
+            logger.error(f"Error during LLM stream generation: {e}", exc_info=True)
+            yield f"Error generating response stream: {e}"
+
     # --- Keep non-streaming version if needed for other tasks (like summarization) ---
     def _generate_non_stream(self, messages, generation_config):
          # ... (original _generate logic without streamer) ...
-        if not self.model or not self.tokenizer:
+        if not self.scheduler or not self.tokenizer:
             raise RuntimeError("Model or tokenizer not loaded.")
         try:
-            input_tensor = self.tokenizer.apply_chat_template(
-                messages,
-                add_generation_prompt=True,
-                return_tensors="pt"
-            ).to(self.model.device)
-
-            with torch.inference_mode():
-                outputs = self.model.generate(
-                    input_ids=input_tensor,
-                    generation_config=generation_config,
-                )
-            response_ids = outputs[0][input_tensor.shape[1]:]
-            result = self.tokenizer.decode(response_ids, skip_special_tokens=True).strip()
+            input_tensor = self._encode_messages(messages)
+
+            request = self.scheduler.submit(input_tensor, generation_config)
+            request.wait()
+            if request.error:
+                raise request.error
+            self._record_generation(len(request.output_ids))
+            result = self.tokenizer.decode(request.output_ids, skip_special_tokens=True).strip()
             return result
         except Exception as e:
             logger.error(f"Error during LLM non-stream generation: {e}", exc_info=True)
             return f"Error generating response: {e}"
 
 
+    def _record_generation(self, token_count, first_token_at=None):
+        GENERATED_TOKENS.inc(token_count)
+        if first_token_at is not None and token_count > 1:
+            elapsed = time.perf_counter() - first_token_at
+            if elapsed > 0:
+                TOKENS_PER_SECOND.observe((token_count - 1) / elapsed)
+
     # --- Summarization still uses non-streaming ---
     def summarize_content(self, content, search_term, user_query):
-        """Summarizes web content using the summarizer from config.py."""
-        logger.info(f"Summarizing content for query: '{user_query}' related to '{search_term}'")
+        """Summarizes web content using the summarizer from the model registry."""
+        result = self.summarize_many([content], search_term, user_query)[0]
+        return result["summary"]
+
+    def summarize_many(self, pages, search_terms, user_query):
+        """
+        Summarizes several pages with batched seq2seq generation.
+        Each page is tokenized once, pages are bucketed by length so padding stays small,
+        and each bucket of up to config.SUMMARY_BATCH_SIZE pages runs in a single generate call.
+        Returns a list aligned with `pages`: {"summary": str or None, "error": str or None}.
+        With INFERENCE_WORKERS, the batches run in a summarize worker process.
+        """
+        if config.INFERENCE_WORKERS and pages:
+            return get_model("inference_workers").summarize_many(pages, search_terms, user_query)
+        results = [{"summary": None, "error": None} for _ in pages]
+        if not pages:
+            return results
+        logger.info(f"Summarizing {len(pages)} page(s) for query: '{user_query}' related to '{search_terms}'")
 
         try:
+            summarizer = get_model("summarizer")
+            summarizer_tokenizer = summarizer.tokenizer
+            summarizer_model = summarizer.model
             # Prepare the prompt
             prompt = config.SUMMARIZATION_PROMPT_TEMPLATE.format(
-                search_term=search_term,
+                search_term=search_terms,
                 user_query=user_query,
                 character_limit=config.SUMMARY_CHARACTER_LIMIT
             )
-            
-            # Combine prompt with content
-            input_text = f"{prompt}\n\n{content[:config.SCRAPE_MAX_TOKENS * 5]}"
-            
-            # Use the summarizer's tokenizer to count tokens
-            summarizer_tokenizer = config.summarizer.tokenizer
-            max_input_tokens = 1024  # distilbart-cnn-12-6 max length
-            tokens = summarizer_tokenizer(input_text, truncation=True, max_length=max_input_tokens, return_tensors="pt")
-            truncated_text = summarizer_tokenizer.decode(tokens["input_ids"][0], skip_special_tokens=True)
-            
-            logger.info(f"Input truncated to {len(tokens['input_ids'][0])} tokens")
-
-            # Use distilbart-cnn-12-6 from config.summarizer
-            summary = config.summarizer(
-                truncated_text,
-                max_length=config.SUMMARY_MAX_NEW_TOKENS,
-                min_length=30,
-                do_sample=True,
-                temperature=config.SUMMARY_TEMPERATURE,
-                top_p=config.SUMMARY_TOP_P,
-                num_beams=4,
-                no_repeat_ngram_size=3
-            )[0]['summary_text']
-
-            summary = summary.strip()
-            if not summary:
-                logger.warning(f"Summarization failed for query '{user_query}'.")
-                return None
-            logger.info(f"Generated summary (first 100 chars): {summary[:100]}...")
-            return summary[:int(config.SUMMARY_CHARACTER_LIMIT * 1.2)]
-
         except Exception as e:
-            logger.error(f"Error during summarization: {e}", exc_info=True)
-            return None
-
-
-    # **** MODIFIED TO SUPPORT STREAMING ****
-    def generate_final_response(self, user_query, context_results, stream=False):
+            logger.error(f"Error preparing summarization: {e}", exc_info=True)
+            for result in results:
+                result["error"] = str(e)
+            return results
+
+        # Room left for page text in the summarizer's input window once the prompt is in
+        page_budget = config.SUMMARY_MAX_INPUT_TOKENS - len(summarizer_tokenizer(prompt)["input_ids"]) - 8
+        filter_query = f"{user_query} {search_terms}"
+
+        def count_tokens(passages):
+            return [len(ids) for ids in summarizer_tokenizer(passages, add_special_tokens=False)["input_ids"]]
+
+        # Tokenize each page once; the ids go straight to the model (no decode/re-encode round trip)
+        encoded = []
+        for idx, content in enumerate(pages):
+            if not content:
+                results[idx]["error"] = "empty content"
+                continue
+            try:
+                content = content[:config.SCRAPE_MAX_TOKENS * 5]
+                if config.PASSAGE_FILTER_ENABLED and page_budget > 0:
+                    # Only the passages relevant to the query, instead of whatever the page starts with
+                    content = select_passages(content, filter_query, page_budget, count_tokens)
+                input_text = f"{prompt}\n\n{content}"
+                input_ids = summarizer_tokenizer(
+                    input_text, truncation=True, max_length=config.SUMMARY_MAX_INPUT_TOKENS
+                )["input_ids"]
+                encoded.append((idx, input_ids))
+            except Exception as e:
+                logger.error(f"Error tokenizing page {idx} for summarization: {e}", exc_info=True)
+                results[idx]["error"] = str(e)
+
+        # Length buckets: neighbours in sorted order have similar lengths, so padding stays small
+        encoded.sort(key=lambda entry: len(entry[1]))
+        batch_size = max(1, config.SUMMARY_BATCH_SIZE)
+        for start in range(0, len(encoded), batch_size):
+            batch = encoded[start:start + batch_size]
+            batch_start = time.time()
+            try:
+                model_inputs = summarizer_tokenizer.pad(
+                    {"input_ids": [input_ids for _, input_ids in batch]}, return_tensors="pt"
+                ).to(summarizer_model.device)
+                with torch.inference_mode():
+                    output_ids = summarizer_model.generate(
+                        **model_inputs,
+                        max_length=config.SUMMARY_MAX_NEW_TOKENS,
+                        min_length=30,
+                        do_sample=True,
+                        temperature=config.SUMMARY_TEMPERATURE,
+                        top_p=config.SUMMARY_TOP_P,
+                        num_beams=4,
+                        no_repeat_ngram_size=3
+                    )
+                texts = summarizer_tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+            except Exception as e:
+                logger.error(f"Error during batched summarization: {e}", exc_info=True)
+                for idx, _ in batch:
+                    results[idx]["error"] = str(e)
+                continue
+
+            logger.info(f"Summarized batch of {len(batch)} page(s) "
+                        f"(max {len(batch[-1][1])} input tokens) in {time.time() - batch_start:.2f} seconds.")
+            for (idx, _), summary in zip(batch, texts):
+                summary = summary.strip()
+                if not summary:
+                    logger.warning(f"Summarization produced no text for page {idx} of query '{user_query}'.")
+                    results[idx]["error"] = "empty summary"
+                    continue
+                logger.info(f"Generated summary (first 100 chars): {summary[:100]}...")
+                results[idx]["summary"] = summary[:int(config.SUMMARY_CHARACTER_LIMIT * 1.2)]
+
+        return results
+
+
+    def context_budget(self, user_query):
+        """Tokens available to the summaries: a share of the window, leaving room for the prompt and the answer."""
+        window = getattr(self.model_config, "max_position_embeddings", None) or config.LLM_CONTEXT_WINDOW
+        prompt_tokens = len(self.tokenizer(
+            config.FINAL_RESPONSE_PROMPT_TEMPLATE.format(user_query=user_query, context_data="")
+        )["input_ids"])
+        budget = min(int(window * config.CONTEXT_TOKEN_SHARE), window - config.DEFAULT_MAX_NEW_TOKENS - prompt_tokens)
+        return max(budget, config.CONTEXT_MIN_TOKENS)
+
+    def pack_context(self, user_query, context_results):
+        """The context results that fit the prompt's token budget, most relevant first (see context_packer)."""
+        return pack_context(context_results, user_query, self.tokenizer, self.context_budget(user_query))
+
+    def _prepare_final_response(self, user_query, context_results, pack=True):
         """
-        Generates the final chatbot response based on summarized search results.
-        Can either return the full response string or yield tokens via a generator.
+        Builds (messages, generation config, sources footer) for the final response.
+        With `pack`, the results are first fitted to the context budget; pass False for results
+        that already went through pack_context.
         """
-        logger.info(f"Generating final response for query: '{user_query}' (Stream={stream})")
-
+        if pack and context_results:
+            context_results = self.pack_context(user_query, context_results)
         # Format context data and prepare source links
         context_str = ""
         source_links_list = []
         if context_results:
             for idx, result in enumerate(context_results):
-                context_str += f"[{idx + 1}] Source: {result.get('link', 'N/A')}\n"
-                context_str += f"   Title: {result.get('title', 'N/A')}\n"
-                context_str += f"   Summary: {result.get('Summary', 'N/A')}\n\n"
+                context_str += format_entry(idx + 1, result)
                 source_links_list.append(f"[{idx + 1}] {result.get('link', 'N/A')}")
             # Format the sources string to be appended *after* generation if needed
             sources_footer = "\n\nSources:\n" + "\n".join(source_links_list) if source_links_list else ""
@@ -216,19 +377,32 @@ class LLMService:
                                               "Citez vos sources DANS LE TEXTE en utilisant [numéro].")
 
         messages = [{"role": "system", "content": system_prompt}]
+        return messages, final_gen_config, sources_footer
+
+    # **** MODIFIED TO SUPPORT STREAMING ****
+    def generate_final_response(self, user_query, context_results, stream=False, pack=True):
+        """
+        Generates the final chatbot response based on summarized search results.
+        Can either return the full response string or yield tokens via a generator.
+        """
+        logger.info(f"Generating final response for query: '{user_query}' (Stream={stream})")
+        messages, final_gen_config, sources_footer = self._prepare_final_response(user_query, context_results, pack)
 
         if stream:
             # Return a generator function that yields tokens AND the sources footer
             def response_generator():
-                full_response_text = ""
+                # Only the end of the text is needed for the "Sources:" check, so keep a bounded tail
+                # instead of re-copying the whole response on every token
+                tail_length = len(sources_footer) + 20
+                tail = ""
                 # Yield tokens from the LLM stream
                 token_stream = self._generate_stream(messages, final_gen_config)
                 for token in token_stream:
-                    full_response_text += token
+                    tail = (tail + token)[-tail_length:]
                     yield token
                 # After the LLM stream is done, yield the sources footer
                 # Defensive check: If LLM included "Sources:", don't add duplicates.
-                if "Sources:" not in full_response_text[-len(sources_footer)-20:]: # Check near end
+                if "Sources:" not in tail: # Check near end
                     yield sources_footer
                 logger.info("Final response stream complete.")
 
@@ -241,10 +415,21 @@ class LLMService:
             logger.info("Final response generated (non-stream).")
             return response
 
-
-# --- Instantiate the service (singleton pattern) ---
-llm_service_instance = LLMService()
-
+    async def generate_final_response_async(self, user_query, context_results, pack=True):
+        """Async-generator version of generate_final_response(stream=True) for asyncio servers."""
+        logger.info(f"Generating final response for query: '{user_query}' (async stream)")
+        messages, final_gen_config, sources_footer = self._prepare_final_response(user_query, context_results, pack)
+        tail_length = len(sources_footer) + 20
+        tail = ""
+        async for token in self._generate_stream_async(messages, final_gen_config):
+            tail = (tail + token)[-tail_length:]
+            yield token
+        if "Sources:" not in tail: # Check near end
+            yield sources_footer
+        logger.info("Final response stream complete.")
+
+
+# --- Singleton, loaded lazily through the model registry ---
 def get_llm_service():
-    """Returns the singleton LLM service instance."""
-    return llm_service_instance
\ No newline at end of file
+    """Returns the singleton LLM service instance, loading the model on first use."""
+    return get_model("llm")
\ No newline at end of file
@@ -0,0 +1,182 @@
+# local_index.py
+import re
+import logging
+import threading
+import numpy as np
+import config
+from embeddings import embed, embed_many, normalize_text
+from keyword_extractor import BASE_KEYWORD, FRENCH_STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+_FTS_TOKEN_RE = re.compile(r"\w{3,}", re.UNICODE)
+# Words that match almost every summary: OR-ing them into the query only adds noise to BM25.
+# Normalized like the query (no accents), and the school's name, which every page mentions.
+_FTS_STOPWORDS = frozenset(normalize_text(word) for word in FRENCH_STOPWORDS) | {BASE_KEYWORD.lower()}
+
+
+class LocalIndex:
+    """
+    Hybrid retrieval over the curated summaries in summaries.db.
+    Lexical relevance comes from an FTS5 table kept in sync by triggers (BM25);
+    semantic relevance from a NumPy matrix of summary embeddings (cosine).
+    Both are blended into a single score in [0, 1] that callers compare against a confidence threshold.
+    BM25 is scaled by the share of the question's content words found in the summary, so a single rare
+    word in common (an e-mail question matching the one page that mentions "scolarité") stays weak.
+    """
+
+    def __init__(self, store, bm25_weight=config.LOCAL_INDEX_BM25_WEIGHT,
+                 bm25_saturation=config.LOCAL_INDEX_BM25_SATURATION):
+        self.store = store
+        self.bm25_weight = bm25_weight
+        self.bm25_saturation = bm25_saturation
+        self._lock = threading.Lock()
+        self._ids = []
+        self._urls = []
+        self._summaries = []
+        self._row_of = {}  # url -> row in the matrix
+        self._matrix = np.zeros((0, config.EMBEDDING_DIM), dtype=np.float32)
+        self._data_version = None
+        self._setup_fts()
+        self._load_embeddings()
+        store.add_listener(self._on_summary_changed)
+
+    def _setup_fts(self):
+        """Creates the FTS5 mirror of `summaries` and the triggers that keep it updated incrementally."""
+        conn = self.store.connection
+        with self.store.lock:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'summaries_fts'"
+            ).fetchone()
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+                    url, summary, content='summaries', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS summaries_fts_ai AFTER INSERT ON summaries BEGIN
+                    INSERT INTO summaries_fts(rowid, url, summary) VALUES (new.id, new.url, new.summary);
+                END;
+                CREATE TRIGGER IF NOT EXISTS summaries_fts_ad AFTER DELETE ON summaries BEGIN
+                    INSERT INTO summaries_fts(summaries_fts, rowid, url, summary) VALUES ('delete', old.id, old.url, old.summary);
+                END;
+                CREATE TRIGGER IF NOT EXISTS summaries_fts_au AFTER UPDATE OF url, summary ON summaries BEGIN
+                    INSERT INTO summaries_fts(summaries_fts, rowid, url, summary) VALUES ('delete', old.id, old.url, old.summary);
+                    INSERT INTO summaries_fts(rowid, url, summary) VALUES (new.id, new.url, new.summary);
+                END;
+            """)
+            if not exists:
+                logger.info("Building FTS5 index over existing summaries...")
+                conn.execute("INSERT INTO summaries_fts(summaries_fts) VALUES ('rebuild')")
+            conn.commit()
+
+    def _load_embeddings(self):
+        """(Re)computes the embedding matrix for every summary."""
+        with self.store.lock:
+            rows = self.store.connection.execute("SELECT id, url, summary FROM summaries ORDER BY id").fetchall()
+            self._data_version = self.store.connection.execute("PRAGMA data_version").fetchone()[0]
+        matrix = embed_many([f"{url} {summary or ''}" for _, url, summary in rows])
+        with self._lock:
+            self._ids = [row[0] for row in rows]
+            self._urls = [row[1] for row in rows]
+            self._summaries = [row[2] for row in rows]
+            self._row_of = {url: i for i, url in enumerate(self._urls)}
+            self._matrix = matrix
+        logger.info(f"Local index loaded {len(rows)} summary embeddings.")
+
+    def _on_summary_changed(self, url):
+        """Updates the single affected row of the embedding matrix."""
+        with self.store.lock:
+            row = self.store.connection.execute(
+                "SELECT id, url, summary FROM summaries WHERE url = ?", (url,)
+            ).fetchone()
+        with self._lock:
+            position = self._row_of.get(url)
+            if row is None:
+                if position is not None:
+                    for name in ("_ids", "_urls", "_summaries"):
+                        del getattr(self, name)[position]
+                    self._matrix = np.delete(self._matrix, position, axis=0)
+                    self._row_of = {u: i for i, u in enumerate(self._urls)}
+                return
+            vector = embed(f"{row[1]} {row[2] or ''}")
+            if position is None:
+                self._ids.append(row[0])
+                self._urls.append(row[1])
+                self._summaries.append(row[2])
+                self._row_of[row[1]] = len(self._urls) - 1
+                self._matrix = np.vstack([self._matrix, vector])
+            else:
+                self._summaries[position] = row[2]
+                self._matrix[position] = vector
+
+    def _reload_if_changed_elsewhere(self):
+        """Writes from other processes (admin scripts, crawler) bump PRAGMA data_version."""
+        with self.store.lock:
+            version = self.store.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            logger.info("summaries.db changed outside this process, reloading local index.")
+            self._load_embeddings()
+
+    @staticmethod
+    def _content_tokens(text):
+        return list(dict.fromkeys(
+            token for token in _FTS_TOKEN_RE.findall(normalize_text(text)) if token not in _FTS_STOPWORDS
+        ))
+
+    @staticmethod
+    def _fts_query(text):
+        return " OR ".join(f'"{token}"' for token in LocalIndex._content_tokens(text))
+
+    def _coverage(self, terms, position):
+        """Share of `terms` whose stem (plural and verb endings cut) occurs in the summary at `position`."""
+        words = set(_FTS_TOKEN_RE.findall(normalize_text(f"{self._urls[position]} {self._summaries[position] or ''}")))
+        stems = [term[:max(4, len(term) - 2)] for term in terms]
+        return sum(any(word.startswith(stem) for word in words) for stem in stems) / len(stems)
+
+    def search(self, user_query, search_terms="", k=config.SEARCH_DEPTH):
+        """Returns the top-k summaries as dicts {'url', 'summary', 'score', 'bm25', 'coverage', 'cosine'}, best first."""
+        self._reload_if_changed_elsewhere()
+        query_text = f"{user_query} {search_terms}"
+
+        bm25_by_id = {}
+        match = self._fts_query(query_text)
+        if match:
+            with self.store.lock:
+                rows = self.store.connection.execute(
+                    "SELECT rowid, -bm25(summaries_fts) FROM summaries_fts WHERE summaries_fts MATCH ? "
+                    "ORDER BY bm25(summaries_fts) LIMIT ?", (match, k * 4)
+                ).fetchall()
+            bm25_by_id = dict(rows)
+
+        with self._lock:
+            if not self._ids:
+                return []
+            cosine = self._matrix @ embed(query_text)
+            bm25 = np.array([bm25_by_id.get(doc_id, 0.0) for doc_id in self._ids], dtype=np.float32)
+            terms = self._content_tokens(user_query)
+            coverage = np.array([
+                self._coverage(terms, i) if terms and doc_id in bm25_by_id else 1.0
+                for i, doc_id in enumerate(self._ids)
+            ], dtype=np.float32)
+            # Saturate BM25 into [0, 1) so it can be blended with cosine similarity
+            bm25_norm = bm25 / (bm25 + self.bm25_saturation) * coverage
+            scores = self.bm25_weight * bm25_norm + (1 - self.bm25_weight) * np.clip(cosine, 0, 1)
+            top = np.argsort(-scores)[:k]
+            return [{
+                "url": self._urls[i], "summary": self._summaries[i], "score": float(scores[i]),
+                "bm25": float(bm25[i]), "coverage": float(coverage[i]), "cosine": float(cosine[i]),
+            } for i in top]
+
+
+# --- Singleton over the application's summary store ---
+_index_instance = None
+_index_lock = threading.Lock()
+
+def get_local_index():
+    """Returns the shared local index, building it on first use."""
+    global _index_instance
+    with _index_lock:
+        if _index_instance is None:
+            from summary_store import get_summary_store
+            _index_instance = LocalIndex(get_summary_store())
+        return _index_instance
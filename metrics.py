@@ -0,0 +1,275 @@
+# metrics.py
+"""
+Minimal in-process metrics registry rendered in the Prometheus text exposition format.
+Counters, gauges and histograms keep their values per label set behind a per-metric lock,
+so they can be updated from any of the server's threads; observing a value is a dict lookup,
+a bisect and two additions. Values are per process.
+"""
+import sys
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200, 500)
+TOKEN_BUCKETS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Computes the value at scrape time: `function()` returns a number, or {label tuple: number} for labelled gauges."""
+        self._function = function
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.error(f"Failed to collect gauge {self.name}: {e}", exc_info=True)
+                return []
+            items = list(value.items()) if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # bucket counts, sum, count
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """The whole registry in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes():
+    """Current resident set size of this process (Linux /proc), or peak RSS elsewhere."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+                 "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def process_memory_breakdown(pid="self"):
+    """
+    {'rss', 'pss', 'shared', 'private'} bytes of a process from /proc/<pid>/smaps_rollup (Linux).
+    'shared' is the part of RSS also mapped by other processes (e.g. memory-mapped model weights);
+    PSS divides each shared page among the processes using it. Empty dict where unavailable.
+    """
+    breakdown = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                field, _, value = line.partition(":")
+                kind = _SMAPS_FIELDS.get(field)
+                if kind:
+                    breakdown[kind] = breakdown.get(kind, 0) + int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    return breakdown
+
+
+# --- Shared registry and the pipeline's metrics ---
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "supbot_stage_duration_seconds", "Duration of each query pipeline stage.", ["stage"]
+)
+TIME_TO_FIRST_TOKEN = registry.histogram(
+    "supbot_time_to_first_token_seconds", "Time from receiving a /chat request to its first streamed chunk."
+)
+STREAM_SECONDS = registry.histogram(
+    "supbot_stream_duration_seconds", "Total duration of /chat response streams."
+)
+TOKENS_PER_SECOND = registry.histogram(
+    "supbot_generation_tokens_per_second", "Decoding speed of each final response, after its first token.",
+    buckets=RATE_BUCKETS
+)
+GENERATED_TOKENS = registry.counter("supbot_generated_tokens_total", "Tokens generated for final responses.")
+CACHE_REQUESTS = registry.counter(
+    "supbot_cache_requests_total", "Cache lookups by cache and result (hit, stale, duplicate or miss).", ["cache", "result"]
+)
+CONTEXT_TOKENS = registry.histogram(
+    "supbot_context_tokens", "Tokens of summaries packed into each final-response prompt.", buckets=TOKEN_BUCKETS
+)
+CONTEXT_SUMMARIES = registry.counter(
+    "supbot_context_summaries_total",
+    "Context packer decisions per summary (kept, truncated, duplicate, over_budget).", ["decision"]
+)
+CHAT_REQUESTS = registry.counter("supbot_chat_requests_total", "Requests to /chat by outcome.", ["status"])
+REQUESTS_IN_FLIGHT = registry.gauge("supbot_requests_in_flight", "/chat requests currently being processed.")
+GENERATION_QUEUE = registry.gauge(
+    "supbot_generation_requests", "Final-response generations decoding (active) or queued (waiting).", ["state"]
+)
+INFERENCE_JOBS = registry.gauge(
+    "supbot_inference_jobs", "Jobs queued for or running in each inference worker pool (INFERENCE_WORKERS).", ["pool", "state"]
+)
+ADMISSION_REQUESTS = registry.gauge(
+    "supbot_admission_requests", "/chat requests admitted (active) or waiting in the admission queue.", ["state"]
+)
+PROCESS_RSS = registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes.")
+PROCESS_RSS.set_function(process_rss_bytes)
+PROCESS_MEMORY = registry.gauge(
+    "supbot_process_memory_bytes", "Process memory by kind (rss, pss, shared, private), from smaps_rollup.", ["kind"]
+)
+PROCESS_MEMORY.set_function(lambda: {(kind,): value for kind, value in process_memory_breakdown().items()})
@@ -0,0 +1,115 @@
+# model_registry.py
+import time
+import logging
+import threading
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Loads models on first use (or on an explicit warm-up) instead of at import time.
+    Each model is loaded at most once, under its own lock, and the registry records
+    readiness and load time so the app can expose them through health endpoints.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._status = {}
+
+    def register(self, name, loader):
+        """Registers `loader()`, called once to build the model named `name`."""
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "not_loaded", "load_seconds": None, "error": None}
+
+    def get(self, name):
+        """Returns the model, loading it on first access. Concurrent callers wait for the same load."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            self._status[name].update(state="loading", error=None)
+            logger.info(f"Loading model '{name}'...")
+            start_time = time.time()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._status[name].update(state="failed", error=str(e))
+                logger.error(f"Failed to load model '{name}': {e}", exc_info=True)
+                raise
+            load_seconds = time.time() - start_time
+            self._models[name] = model
+            self._status[name].update(state="ready", load_seconds=load_seconds)
+            logger.info(f"Model '{name}' loaded in {load_seconds:.2f} seconds.")
+            return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Loads the given models (default: all registered). Returns True if all loaded."""
+        ok = True
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception:
+                ok = False
+        if config.SHARED_WEIGHTS:
+            from shared_weights import log_memory_report
+            log_memory_report() # How much of this worker's RSS is shared with the others
+        return ok
+
+    def warm_up_async(self, names=None):
+        """Starts warm-up on a background thread so the server can answer health checks meanwhile."""
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, names=None):
+        return all(name in self._models for name in names or list(self._loaders))
+
+    def status(self):
+        """Returns {name: {'state', 'load_seconds', 'error'}}."""
+        return {name: dict(status) for name, status in self._status.items()}
+
+
+def _load_summarizer():
+    from inference_backends import get_backend
+    return get_backend().load_summarizer(config.SUMMARIZER_MODEL)
+
+
+def _load_spacy():
+    from keyword_extractor import load_spacy_model
+    return load_spacy_model()
+
+
+def _load_inference_workers():
+    from inference_workers import InferenceExecutor
+    return InferenceExecutor().start()
+
+
+def _load_llm():
+    from llm_service import LLMService
+    return LLMService()
+
+
+# --- Shared registry ---
+registry = ModelRegistry()
+if config.INFERENCE_WORKERS:
+    # The models load in the worker processes; this process keeps only the chat tokenizer
+    registry.register("inference_workers", _load_inference_workers)
+else:
+    registry.register("summarizer", _load_summarizer)
+registry.register("llm", _load_llm)
+if config.KEYWORD_MODE == "spacy":
+    registry.register("spacy", _load_spacy)
+
+def get_model(name):
+    """Returns the named model from the shared registry, loading it if needed."""
+    return registry.get(name)
@@ -0,0 +1,82 @@
+# page_dedup.py
+"""
+Duplicate detection for result pages, in two layers:
+
+1. URL canonicalization: scheme, host case, default ports, trailing slashes, fragments, tracking
+   parameters and the variant parameters of config.URL_IGNORED_PARAMS (?lang=, print views) are
+   normalized, so the variants of one page share a single summaries.db row.
+2. Content fingerprints: a SHA-256 of the normalized text for exact copies, and a 64-bit SimHash of
+   word shingles for near-copies (same page with a different date, counter or menu), compared by
+   Hamming distance against SIMHASH_MAX_DISTANCE.
+"""
+import hashlib
+import fnmatch
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import numpy as np
+import config
+from embeddings import normalize_text
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def canonicalize_url(url):
+    """The canonical form of `url`; unparsable or non-HTTP URLs are returned unchanged."""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url
+    if scheme == "http" and config.URL_PREFER_HTTPS:
+        scheme = "https"
+    host = parts.hostname.lower()
+    if port and port != _DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not any(fnmatch.fnmatchcase(name.lower(), pattern) for pattern in config.URL_IGNORED_PARAMS)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def content_fingerprint(text):
+    """SHA-256 of the whitespace-normalized page text."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _hash64(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text, shingle=3):
+    """
+    64-bit SimHash of the text's word shingles, as a signed integer (SQLite INTEGER range).
+    Texts that differ in a few words get hashes that differ in a few bits.
+    """
+    words = normalize_text(text).split()
+    if not words:
+        return 0
+    shingles = {" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    hashes = np.fromiter((_hash64(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    value = int(np.packbits((votes > 0).astype(np.uint8)[::-1]).view(">u8")[0])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distances(value, others):
+    """Bit distances between the SimHash `value` and each SimHash in `others` (a sequence of ints)."""
+    if not len(others):
+        return np.zeros(0, dtype=np.int64)
+    xor = np.asarray(others, dtype=np.int64) ^ np.int64(value)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def is_near_duplicate(a, b, max_distance=config.SIMHASH_MAX_DISTANCE):
+    return int(hamming_distances(a, [b])[0]) <= max_distance
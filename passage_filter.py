@@ -0,0 +1,104 @@
+# passage_filter.py
+"""
+Query-aware extractive pre-filter for summarization.
+
+The summarizer only sees its first SUMMARY_MAX_INPUT_TOKENS tokens, and on most pages that
+window is taken up by menus and boilerplate before the relevant part. This module splits the
+cleaned page into passages of roughly PASSAGE_TARGET_CHARS characters, scores them against the
+query and its keywords with BM25 (computed on a NumPy term-frequency matrix), and keeps the best
+passages that fit the summarizer's token budget, in their original page order.
+"""
+import re
+import logging
+import numpy as np
+import config
+from embeddings import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+_TERM_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def split_passages(text, target_chars=config.PASSAGE_TARGET_CHARS):
+    """
+    Splits text into passages of about `target_chars` characters on sentence boundaries.
+    Sentences longer than that (menus and lists have no punctuation) are cut on whitespace.
+    """
+    passages, current, size = [], [], 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        while len(sentence) > target_chars:
+            cut = sentence.rfind(" ", 0, target_chars)
+            cut = cut if cut > 0 else target_chars
+            if current:
+                passages.append(" ".join(current))
+                current, size = [], 0
+            passages.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if not sentence:
+            continue
+        if size and size + len(sentence) > target_chars:
+            passages.append(" ".join(current))
+            current, size = [], 0
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def bm25_scores(passages, query, k1=config.PASSAGE_BM25_K1, b=config.PASSAGE_BM25_B):
+    """BM25 score of each passage for the terms of `query`, as a NumPy array aligned with `passages`."""
+    query_terms = list(dict.fromkeys(_TERM_RE.findall(normalize_text(query))))
+    if not passages or not query_terms:
+        return np.zeros(len(passages), dtype=np.float32)
+    column = {term: i for i, term in enumerate(query_terms)}
+    # Term frequencies of the query terms only: (passages x query terms)
+    tf = np.zeros((len(passages), len(query_terms)), dtype=np.float32)
+    lengths = np.empty(len(passages), dtype=np.float32)
+    for row, passage in enumerate(passages):
+        terms = _TERM_RE.findall(normalize_text(passage))
+        lengths[row] = len(terms)
+        for term in terms:
+            i = column.get(term)
+            if i is not None:
+                tf[row, i] += 1
+    document_frequency = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(passages) - document_frequency + 0.5) / (document_frequency + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    return ((tf * (k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def select_passages(text, query, token_budget, count_tokens):
+    """
+    Returns the part of `text` most relevant to `query` that fits `token_budget` tokens: the
+    top-scoring passages joined in page order. Text that already fits is returned unchanged.
+    `count_tokens(list of str)` returns the token count of each string.
+    """
+    passages = split_passages(text)
+    if len(passages) <= 1:
+        return text
+    token_counts = count_tokens(passages)
+    if sum(token_counts) <= token_budget:
+        return text
+
+    scores = bm25_scores(passages, query)
+    if not scores.any():
+        return text # Nothing matches the query: keep the page start, as without the filter
+    # Best first; ties keep page order so the intro wins among equally relevant passages.
+    # Passages without any query term are left out: less encoder work, no loss of relevant text
+    ranking = np.lexsort((np.arange(len(passages)), -scores))
+    selected, used = [], 0
+    for index in ranking:
+        if scores[index] <= 0:
+            break
+        if used + token_counts[index] > token_budget:
+            continue
+        selected.append(index)
+        used += token_counts[index]
+    if not selected:
+        return text
+    selected.sort()
+    logger.info(f"Passage filter kept {len(selected)}/{len(passages)} passages "
+                f"({used}/{sum(token_counts)} tokens) for query '{query}'.")
+    return " ".join(passages[index] for index in selected)
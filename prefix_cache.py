@@ -0,0 +1,95 @@
+# prefix_cache.py
+import hashlib
+import logging
+import threading
+from string import Formatter
+import torch
+import config
+from generation_scheduler import build_cache, cache_layers
+
+logger = logging.getLogger(__name__)
+
+_MARKER = "⁣PREFIX_END⁣"
+
+
+class PromptPrefixCache:
+    """
+    Keeps the KV cache of the constant start of the chat-templated final-response prompt.
+    The prefix is everything the chat template renders before the first `{field}` of the prompt
+    template; its key/values are computed once per model and template version, and each request
+    only prefills its own suffix. A request whose token ids do not start with the cached prefix
+    falls back to a full prefill, so outputs are unchanged under greedy decoding.
+    """
+
+    def __init__(self, model, tokenizer, model_name, template=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.model_name = model_name
+        self.template = template
+        self._lock = threading.Lock()
+        self._version = None
+        self._prefix_ids = None  # 1D tensor
+        self._layers = None
+        self.hits = 0
+        self.misses = 0
+
+    def _current_template(self):
+        return self.template or config.FINAL_RESPONSE_PROMPT_TEMPLATE
+
+    def _version_of(self, template):
+        chat_template = getattr(self.tokenizer, "chat_template", None) or ""
+        return hashlib.sha256(f"{self.model_name}\0{template}\0{chat_template}".encode("utf-8")).hexdigest()
+
+    def _static_text(self, template):
+        """Literal text of the prompt template before its first replacement field."""
+        literal, _, _, _ = next(iter(Formatter().parse(template)), ("", None, None, None))
+        return literal
+
+    def _build(self, template):
+        rendered = self.tokenizer.apply_chat_template(
+            [{"role": "system", "content": self._static_text(template) + _MARKER}],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        prefix_text = rendered.split(_MARKER)[0]
+        prefix_ids = self.tokenizer(prefix_text, add_special_tokens=False, return_tensors="pt")["input_ids"][0]
+        # The last token may merge with the text that follows it, so it is left to the suffix
+        prefix_ids = prefix_ids[:-1]
+        if len(prefix_ids) == 0:
+            return prefix_ids, None
+        with torch.inference_mode():
+            outputs = self.model(input_ids=prefix_ids.unsqueeze(0).to(self.model.device), use_cache=True)
+        logger.info(f"Cached KV for a {len(prefix_ids)}-token prompt prefix.")
+        return prefix_ids, cache_layers(outputs.past_key_values)
+
+    def _entry(self):
+        template = self._current_template()
+        version = self._version_of(template)
+        with self._lock:
+            if version != self._version:
+                self._prefix_ids, self._layers = self._build(template)
+                self._version = version
+            return self._prefix_ids, self._layers
+
+    @torch.inference_mode()
+    def prefill(self, input_ids):
+        """
+        Prefill for the generation scheduler: (logits[1, V], layers) for `input_ids` [1, T],
+        starting from the cached prefix whenever the prompt begins with it.
+        """
+        prefix_ids, layers = self._entry()
+        prefix_len = 0 if prefix_ids is None else len(prefix_ids)
+        seq_len = input_ids.shape[1]
+        if layers is not None and seq_len > prefix_len and torch.equal(input_ids[0, :prefix_len].cpu(), prefix_ids):
+            self.hits += 1
+            outputs = self.model(
+                input_ids=input_ids[:, prefix_len:],
+                attention_mask=torch.ones(1, seq_len, dtype=torch.long, device=input_ids.device),
+                position_ids=torch.arange(prefix_len, seq_len, device=input_ids.device).unsqueeze(0),
+                past_key_values=build_cache(layers), # Extending the cache copies, the cached tensors stay intact
+                use_cache=True,
+            )
+        else:
+            self.misses += 1
+            outputs = self.model(input_ids=input_ids, use_cache=True)
+        return outputs.logits[:, -1, :], cache_layers(outputs.past_key_values)
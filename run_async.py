@@ -0,0 +1,7 @@
+# run_async.py
+# asyncio alternative to run_production.py: one process, open /chat streams cost no threads
+import uvicorn
+import config
+from asgi_app import app
+
+uvicorn.run(app, host='0.0.0.0', port=config.FLASK_PORT, loop="asyncio", timeout_keep_alive=config.FETCH_KEEPALIVE_TIMEOUT)
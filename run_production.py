@@ -1,5 +1,6 @@
 # run_production.py
 from waitress import serve
 from app import app  # Make sure app.py has the `app = Flask(...)` part
+import config
 
-serve(app, host='0.0.0.0', port=10000, threads=8)
+serve(app, host='0.0.0.0', port=10000, threads=config.SERVER_THREADS)
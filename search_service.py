@@ -1,13 +1,138 @@
 # search_service.py
-import requests
+import os
+import json
+import time
+import asyncio
+import sqlite3
 import logging
+import threading
+from urllib.parse import urlencode
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
 import config
+from metrics import CACHE_REQUESTS
+from http_fetcher import get_fetcher
 
 logger = logging.getLogger(__name__)
 
-def search_google(search_term, api_key=config.GOOGLE_API_KEY, cse_id=config.GOOGLE_CSE_ID, num_results=config.SEARCH_DEPTH, site_filter=config.SITE_FILTER):
-    """Performs a Google Custom Search."""
-    service_url = "https://www.googleapis.com/customsearch/v1"
+
+class SearchCache:
+    """
+    Search results persisted in SQLite so they survive restarts. Entries older than `ttl` are stale;
+    empty results only stay fresh for `empty_ttl`, so a transient "no results" is retried soon.
+    """
+
+    def __init__(self, db_path=config.SEARCH_CACHE_PATH, ttl=config.SEARCH_CACHE_TTL,
+                 empty_ttl=config.SEARCH_CACHE_EMPTY_TTL):
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    items TEXT,
+                    created REAL
+                )
+            """)
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(search_term, site_filter, num_results):
+        """Keywords are lowercased and de-duplicated, order does not matter."""
+        terms = sorted(set(search_term.lower().split()))
+        return f"{' '.join(terms)}|{site_filter or ''}|{num_results}"
+
+    def get(self, key):
+        """Returns (items, is_fresh) or None if the key was never cached."""
+        with self._lock:
+            row = self._conn.execute("SELECT items, created FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        items = json.loads(row[0])
+        return items, time.time() - row[1] <= (self.ttl if items else self.empty_ttl)
+
+    def put(self, key, items):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, items, created) VALUES (?, ?, ?)",
+                (key, json.dumps(items), time.time())
+            )
+            self._conn.commit()
+
+
+class CircuitBreaker:
+    """
+    Stops calling the Search API after `failure_threshold` consecutive failures.
+    While open, calls are refused until `reset_timeout` seconds pass; then a single trial call is let through.
+    """
+
+    def __init__(self, failure_threshold=config.SEARCH_BREAKER_FAILURES, reset_timeout=config.SEARCH_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True # Half-open: probe the API once
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Google Search API recovered, closing circuit breaker.")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Opening circuit breaker after {self._failures} consecutive Search API failures.")
+                self._opened_at = time.time()
+
+
+def _create_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.SEARCH_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = _create_session()
+_breaker = CircuitBreaker()
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Returns the shared search cache, opening config.SEARCH_CACHE_PATH on first use."""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            _cache_instance = SearchCache(config.SEARCH_CACHE_PATH)
+        return _cache_instance
+
+
+def _search_params(search_term, api_key, cse_id, num_results, site_filter):
     params = {
         "q": search_term,
         "key": api_key,
@@ -23,32 +148,104 @@ def search_google(search_term, api_key=config.GOOGLE_API_KEY, cse_id=config.GOOG
         logger.info(f"Performing search for '{search_term}' with site filter: {site_filter}")
     else:
          logger.info(f"Performing search for '{search_term}'")
+    return params
 
-    try:
-        response = requests.get(service_url, params=params, timeout=10)
-        response.raise_for_status()  # Raises HTTPError for bad responses (4XX or 5XX)
-        results = response.json()
 
-        if "items" not in results or not results["items"]:
-            logger.warning(f"No search results found for term: '{search_term}' (Site filter: {site_filter})")
-            # If site filter was active and failed, maybe try without it? (Optional)
-            # if site_filter:
-            #     logger.info(f"Retrying search for '{search_term}' without site filter.")
-            #     return search_google(search_term, api_key, cse_id, num_results, site_filter=None)
-            return []
+def _cached_results(search_term, site_filter, num_results):
+    """
+    Returns (cache_key, items, stale_items). `items` is set when the search can be answered without
+    calling the API (fresh cache entry, or circuit open); otherwise the API should be called.
+    """
+    cache_key = SearchCache.make_key(search_term, site_filter, num_results)
+    cached = get_search_cache().get(cache_key)
+    CACHE_REQUESTS.inc(cache="search", result="miss" if not cached else "hit" if cached[1] else "stale")
+    if cached and cached[1]:
+        logger.info(f"Using cached search results for '{search_term}' ({len(cached[0])} items)")
+        return cache_key, cached[0], None
+    stale_items = cached[0] if cached else []
+
+    if not _breaker.allow_request():
+        logger.warning(f"Search API circuit open; serving {len(stale_items)} stale cached result(s) for '{search_term}'")
+        return cache_key, stale_items, stale_items
+    return cache_key, None, stale_items
 
-        logger.info(f"Found {len(results['items'])} search results.")
-        return results["items"] # Return the list of items
+
+def _accept_results(cache_key, search_term, site_filter, results):
+    _breaker.record_success()
+
+    if "items" not in results or not results["items"]:
+        logger.warning(f"No search results found for term: '{search_term}' (Site filter: {site_filter})")
+        # If site filter was active and failed, maybe try without it? (Optional)
+        # if site_filter:
+        #     logger.info(f"Retrying search for '{search_term}' without site filter.")
+        #     return search_google(search_term, api_key, cse_id, num_results, site_filter=None)
+        get_search_cache().put(cache_key, [])
+        return []
+
+    logger.info(f"Found {len(results['items'])} search results.")
+    get_search_cache().put(cache_key, results["items"])
+    return results["items"] # Return the list of items
+
+
+def _failed_search(search_term, stale_items):
+    _breaker.record_failure()
+    if stale_items:
+        logger.warning(f"Serving {len(stale_items)} stale cached result(s) for '{search_term}'")
+    return stale_items
+
+
+def search_google(search_term, api_key=config.GOOGLE_API_KEY, cse_id=config.GOOGLE_CSE_ID, num_results=config.SEARCH_DEPTH, site_filter=config.SITE_FILTER):
+    """
+    Performs a Google Custom Search.
+    Results are cached on disk; when the API is failing, stale cached results are served instead of waiting on it.
+    """
+    cache_key, items, stale_items = _cached_results(search_term, site_filter, num_results)
+    if items is not None:
+        return items
+
+    service_url = config.GOOGLE_SEARCH_URL
+    params = _search_params(search_term, api_key, cse_id, num_results, site_filter)
+
+    response = None
+    try:
+        response = _session.get(service_url, params=params, timeout=config.SEARCH_TIMEOUT)
+        response.raise_for_status()  # Raises HTTPError for bad responses (4XX or 5XX)
+        return _accept_results(cache_key, search_term, site_filter, response.json())
 
     except requests.exceptions.Timeout:
         logger.error(f"Google Search API request timed out for term: '{search_term}'")
-        return []
     except requests.exceptions.HTTPError as http_err:
         logger.error(f"Google Search API HTTP error occurred: {http_err} - Response: {response.text}")
-        return []
     except requests.exceptions.RequestException as e:
         logger.error(f"Google Search API error occurred: {e}", exc_info=True)
-        return []
     except Exception as e:
         logger.error(f"An unexpected error occurred during search: {e}", exc_info=True)
-        return []
\ No newline at end of file
+
+    return _failed_search(search_term, stale_items)
+
+
+async def search_google_async(search_term, api_key=config.GOOGLE_API_KEY, cse_id=config.GOOGLE_CSE_ID, num_results=config.SEARCH_DEPTH, site_filter=config.SITE_FILTER):
+    """
+    Awaitable search_google for asyncio servers, with the same caching and circuit breaker.
+    The request runs on the shared fetcher's event loop, so no thread waits on the API.
+    """
+    cache_key, items, stale_items = _cached_results(search_term, site_filter, num_results)
+    if items is not None:
+        return items
+
+    params = _search_params(search_term, api_key, cse_id, num_results, site_filter)
+    url = f"{config.GOOGLE_SEARCH_URL}?{urlencode(params)}"
+    try:
+        future = get_fetcher().submit(url, body_types=("json",), max_bytes=None)
+        result = await asyncio.wait_for(asyncio.wrap_future(future), config.SEARCH_TIMEOUT)
+        return _accept_results(cache_key, search_term, site_filter, json.loads(result["content"] or b"{}"))
+    except asyncio.TimeoutError:
+        logger.error(f"Google Search API request timed out for term: '{search_term}'")
+    except aiohttp.ClientResponseError as http_err:
+        logger.error(f"Google Search API HTTP error occurred: {http_err.status} {http_err.message}")
+    except aiohttp.ClientError as e:
+        logger.error(f"Google Search API error occurred: {e}", exc_info=True)
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during search: {e}", exc_info=True)
+
+    return _failed_search(search_term, stale_items)
@@ -0,0 +1,225 @@
+# shared_weights.py
+"""
+One read-only copy of the model weights per host, shared by every worker process.
+
+With SHARED_WEIGHTS on, the eager backend writes each loaded model's parameters and buffers once,
+in their loaded dtype, to a safetensors file under SHARED_WEIGHTS_DIR; every process then points
+the model's tensors at a private (copy-on-write) memory map of that file. The pages live in the
+OS page cache, so N workers hold one copy of the weights instead of N, and smaps reports them
+as shared. A worker still loads the model normally first, so its startup peak is unchanged.
+
+`python shared_weights.py --workers N` starts N model-loading processes and reports how much
+of their RSS is shared, to size the worker count for a host.
+"""
+import gc
+import os
+import json
+import time
+import fcntl
+import ctypes
+import ctypes.util
+import struct
+import logging
+import argparse
+import multiprocessing
+import torch
+import config
+from metrics import process_memory_breakdown
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+_mapped_bytes = 0 # Bytes of weights this process reads from memory maps
+
+
+def weights_path(model, model_name):
+    """Path of the shared weights file for `model`; the name changes with the model revision and dtype."""
+    revision = getattr(model.config, "_commit_hash", None)
+    if not revision and os.path.isdir(model_name):
+        revision = str(int(os.path.getmtime(model_name))) # Local checkpoint: its modification time
+    dtype = str(next(model.parameters()).dtype).replace("torch.", "")
+    name = f"{model_name.strip('/').replace('/', '--')}-{type(model).__name__}-{revision or 'latest'}-{dtype}"
+    return os.path.join(config.SHARED_WEIGHTS_DIR, f"{name}.safetensors")
+
+
+def _named_tensors(model):
+    """{name: tensor} of every parameter and buffer, tied weights included under each of their names."""
+    tensors = dict(model.named_parameters(remove_duplicate=False))
+    tensors.update(model.named_buffers(remove_duplicate=False))
+    return tensors
+
+
+def _export(tensors, path):
+    """Writes the tensors to `path` (atomically); a tensor stored under several names is written once."""
+    from safetensors.torch import save_file
+    unique, aliases, seen = {}, {}, {}
+    for name, tensor in tensors.items():
+        key = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tuple(tensor.stride()))
+        if key in seen:
+            aliases[name] = seen[key]
+        else:
+            seen[key] = name
+            unique[name] = tensor.detach().contiguous()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save_file(unique, tmp_path, metadata={"aliases": json.dumps(aliases)})
+    os.replace(tmp_path, path)
+    logger.info(f"Exported {len(unique)} tensors to {path} ({os.path.getsize(path) / 2**20:.0f} MB).")
+
+
+def _map(path):
+    """{name: tensor} backed by a copy-on-write memory map of the safetensors file at `path`."""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+    buffer = torch.from_file(path, shared=False, size=os.path.getsize(path), dtype=torch.uint8)
+    metadata = header.pop("__metadata__", {}) or {}
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        raw = buffer[data_start + begin:data_start + end]
+        if (data_start + begin) % dtype.itemsize:
+            raw = raw.clone() # Misaligned for a zero-copy view: this tensor is private
+        tensors[name] = raw.view(dtype).view(info["shape"])
+    for alias, name in json.loads(metadata.get("aliases", "{}")).items():
+        tensors[alias] = tensors[name]
+    return tensors
+
+
+def _release_freed_memory():
+    """Returns freed heap memory to the OS (glibc keeps it by default), so the private copies really go."""
+    gc.collect()
+    libc_name = ctypes.util.find_library("c")
+    try:
+        ctypes.CDLL(libc_name).malloc_trim(0)
+    except (OSError, AttributeError, TypeError): # Not glibc
+        pass
+
+
+def share_weights(model, model_name):
+    """
+    Points `model`'s parameters and buffers at the shared weights file, exporting it first if no
+    worker has yet. Models not on the CPU are returned unchanged.
+    """
+    global _mapped_bytes
+    tensors = _named_tensors(model)
+    if any(tensor.device.type != "cpu" for tensor in tensors.values()):
+        logger.warning(f"{model_name} is not on the CPU; SHARED_WEIGHTS only applies to CPU models.")
+        return model
+    path = weights_path(model, model_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX) # One worker exports, the others wait and map
+        if not os.path.exists(path):
+            _export(tensors, path)
+    mapped = _map(path)
+    if set(mapped) != set(tensors) or any(
+        mapped[name].shape != tensor.shape or mapped[name].dtype != tensor.dtype for name, tensor in tensors.items()
+    ):
+        logger.warning(f"{path} does not match {model_name}; delete it to re-export. Keeping private weights.")
+        return model
+
+    with torch.no_grad():
+        for name, tensor in tensors.items():
+            module_name, _, attr = name.rpartition(".")
+            module = model.get_submodule(module_name)
+            if attr in module._parameters:
+                module._parameters[attr].data = mapped[name]
+            else:
+                module._buffers[attr] = mapped[name]
+    count = len(tensors)
+    del tensors # The last references to the private copies
+    _release_freed_memory()
+    size = sum(tensor.numel() * tensor.element_size() for tensor in {id(t): t for t in mapped.values()}.values())
+    _mapped_bytes += size
+    logger.info(f"{model_name}: {count} tensors ({size / 2**20:.0f} MB) mapped from {path}.")
+    return model
+
+
+def memory_report():
+    """This process's memory breakdown (see metrics.process_memory_breakdown) plus the mapped weight bytes."""
+    return dict(process_memory_breakdown(), mapped_weights=_mapped_bytes)
+
+
+def log_memory_report():
+    report = memory_report()
+    if "rss" not in report:
+        logger.info("Memory breakdown unavailable (needs /proc/self/smaps_rollup).")
+        return report
+    mb = {kind: value / 2**20 for kind, value in report.items()}
+    logger.info(f"Memory: RSS {mb['rss']:.0f} MB, shared {mb['shared']:.0f} MB "
+                f"({report['shared'] / max(report['rss'], 1):.0%}), private {mb['private']:.0f} MB, "
+                f"PSS {mb['pss']:.0f} MB; memory-mapped weights {mb['mapped_weights']:.0f} MB.")
+    return report
+
+
+# --- Sizing check: N workers loading the models ---
+def _worker(models, model_names, share, barrier, results):
+    config.SHARED_WEIGHTS = share
+    if model_names.get("llm"):
+        config.MODEL_NAME = model_names["llm"]
+    if model_names.get("summarizer"):
+        config.SUMMARIZER_MODEL = model_names["summarizer"]
+    import shared_weights # The module the backend updates; under spawn this file runs as __mp_main__
+    from model_registry import registry
+    try:
+        start = time.time()
+        if not registry.warm_up(models):
+            raise RuntimeError(f"failed to load {models}")
+        load_seconds = time.time() - start
+        with torch.no_grad():
+            for name in models: # Read every weight once, as serving does: mapped pages become resident
+                for tensor in registry.get(name).model.state_dict().values():
+                    tensor.sum()
+        barrier.wait() # Measure once every worker holds its models
+        time.sleep(1.0)
+        results.put(dict(shared_weights.memory_report(), pid=os.getpid(), load_seconds=load_seconds))
+        barrier.wait()
+    except Exception as e: # Includes BrokenBarrierError when another worker failed
+        barrier.abort()
+        results.put({"pid": os.getpid(), "error": str(e) or type(e).__name__})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the models in N worker processes and report shared memory.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--models", nargs="+", default=["summarizer", "llm"], choices=["summarizer", "llm"])
+    parser.add_argument("--private", action="store_true", help="Load without SHARED_WEIGHTS, for comparison")
+    parser.add_argument("--llm-model", default=None, help="Override config.MODEL_NAME")
+    parser.add_argument("--summarizer-model", default=None, help="Override config.SUMMARIZER_MODEL")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn") # Each worker loads on its own, like gunicorn workers
+    barrier, results = context.Barrier(args.workers), context.Queue()
+    model_names = {"llm": args.llm_model, "summarizer": args.summarizer_model}
+    processes = [context.Process(target=_worker, args=(args.models, model_names, not args.private, barrier, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [report for report in reports if "error" in report]
+    if errors:
+        for report in errors:
+            print(f"Worker {report['pid']} failed: {report['error']}")
+        raise SystemExit(1)
+
+    print(f"{'pid':>8} {'load s':>7} {'RSS MB':>8} {'shared MB':>10} {'private MB':>11} {'PSS MB':>8} {'mapped MB':>10}")
+    for report in reports:
+        print(f"{report['pid']:>8} {report['load_seconds']:>7.1f} {report.get('rss', 0) / 2**20:>8.0f} "
+              f"{report.get('shared', 0) / 2**20:>10.0f} {report.get('private', 0) / 2**20:>11.0f} "
+              f"{report.get('pss', 0) / 2**20:>8.0f} {report['mapped_weights'] / 2**20:>10.0f}")
+    total_pss = sum(report.get("pss", 0) for report in reports)
+    private = sum(report.get("private", 0) for report in reports) / len(reports)
+    print(f"Host memory for {len(reports)} workers (sum of PSS): {total_pss / 2**20:.0f} MB; "
+          f"each additional worker adds about {private / 2**20:.0f} MB (its private memory).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# sse.py
+"""
+Server-sent events for /chat (Accept: text/event-stream).
+
+Event types, each with a JSON `data` payload:
+  queue    {"position": n}                     while the request waits for admission
+  stage    {"stage": name, ...}                pipeline progress (keywords, search, summarize, generate, ...)
+  sources  {"sources": [{n, link, title}], "final": bool}   candidates after search, then the cited list
+  token    {"text": "..."}                     answer text, coalesced into size- and time-bounded chunks
+  done     {"elapsed": seconds, "error": str or absent}
+"""
+import json
+import time
+import queue
+import asyncio
+import config
+
+_END = object()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def coalesce_tokens(tokens, max_chars=config.STREAM_COALESCE_CHARS, max_delay=config.STREAM_COALESCE_INTERVAL):
+    """
+    Groups a token iterator into chunks of up to `max_chars` characters, flushing a chunk early once
+    its first token is `max_delay` seconds old (checked as tokens arrive). Empty tokens are dropped.
+    """
+    buffer, started_at = [], None
+    size = 0
+    for token in tokens:
+        if not token:
+            continue
+        if not buffer:
+            started_at = time.monotonic()
+        buffer.append(token)
+        size += len(token)
+        if size >= max_chars or time.monotonic() - started_at >= max_delay:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def coalesce_tokens_async(tokens, max_chars=config.STREAM_COALESCE_CHARS, max_delay=config.STREAM_COALESCE_INTERVAL):
+    """coalesce_tokens for an async token iterator."""
+    buffer, started_at = [], None
+    size = 0
+    async for token in tokens:
+        if not token:
+            continue
+        if not buffer:
+            started_at = time.monotonic()
+        buffer.append(token)
+        size += len(token)
+        if size >= max_chars or time.monotonic() - started_at >= max_delay:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+class _TokenBuffer:
+    """Merges consecutive token events; other events flush the pending tokens first to keep the order."""
+
+    def __init__(self, max_chars, max_delay):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._tokens, self._size, self._flush_at = [], 0, None
+
+    def timeout(self):
+        return None if self._flush_at is None else max(0.0, self._flush_at - time.monotonic())
+
+    def push(self, item):
+        """Takes a queue item ((event, data), _END, or None on timeout); returns the SSE strings to send."""
+        if item is not None and item is not _END and item[0] == "token":
+            if not self._tokens:
+                self._flush_at = time.monotonic() + self.max_delay
+            self._tokens.append(item[1])
+            self._size += len(item[1])
+            if self._size < self.max_chars:
+                return []
+        out = []
+        if self._tokens:
+            out.append(format_event("token", {"text": "".join(self._tokens)}))
+            self._tokens, self._size, self._flush_at = [], 0, None
+        if item is not None and item is not _END and item[0] != "token":
+            out.append(format_event(*item))
+        return out
+
+
+class EventChannel:
+    """
+    Carries pipeline events from the producer (the pipeline, on another thread) to the response
+    generator. `emit` is thread-safe; `events()` yields SSE-formatted strings, merging consecutive
+    tokens into chunks flushed after `max_delay` seconds or `max_chars` characters.
+    """
+
+    def __init__(self, max_chars=config.STREAM_COALESCE_CHARS, max_delay=config.STREAM_COALESCE_INTERVAL):
+        self._buffer = _TokenBuffer(max_chars, max_delay)
+        self._queue = queue.Queue()
+        self.cancelled = False # Set when the consumer is gone; the producer should stop
+
+    def emit(self, event, data):
+        self._queue.put((event, data))
+
+    def close(self):
+        self._queue.put(_END)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def events(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._buffer.timeout())
+            except queue.Empty:
+                item = None
+            yield from self._buffer.push(item)
+            if item is _END:
+                return
+
+
+class AsyncEventChannel:
+    """EventChannel for asyncio servers: `emit` is called on the event loop, `events()` is an async generator."""
+
+    def __init__(self, max_chars=config.STREAM_COALESCE_CHARS, max_delay=config.STREAM_COALESCE_INTERVAL):
+        self._buffer = _TokenBuffer(max_chars, max_delay)
+        self._queue = asyncio.Queue()
+
+    def emit(self, event, data):
+        self._queue.put_nowait((event, data))
+
+    def close(self):
+        self._queue.put_nowait(_END)
+
+    async def events(self):
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), self._buffer.timeout())
+            except asyncio.TimeoutError:
+                item = None
+            for chunk in self._buffer.push(item):
+                yield chunk
+            if item is _END:
+                return
@@ -1,6 +1,7 @@
 # streamlit_app.py
 import streamlit as st
 import requests
+import json
 import logging
 import time
 import config # Import config to potentially get API URL
@@ -19,6 +20,65 @@ FLASK_API_URL = f"http://localhost:{config.FLASK_PORT}/chat"
 logger.info(f"Streamlit connecting to Flask API at: {FLASK_API_URL}")
 
 
+STAGE_LABELS = {
+    "keywords": "🔎 Mots-clés : {terms}",
+    "answer_cache": "⚡ Question déjà posée, réponse en cache",
+    "local_index": "📚 Réponse à partir de la base locale ({results} pages)",
+    "search": "🌐 Recherche sur le site de SupCom...",
+    "summarize": "📝 Lecture des pages : {done}/{total} résumées",
+    "generate": "✍️ Rédaction de la réponse...",
+}
+
+
+def read_events(response):
+    """Parses a text/event-stream response into (event, data) pairs as they arrive."""
+    event, data = None, []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line:
+            field, _, value = line.partition(":")
+            if field == "event":
+                event = value.strip()
+            elif field == "data":
+                data.append(value.strip())
+            continue
+        if event and data:
+            yield event, json.loads("\n".join(data))
+        event, data = None, []
+
+
+def render_events(events, status, sources_box, outcome):
+    """
+    Shows queue position, pipeline stages and the candidate sources in `status` / `sources_box` as
+    they arrive, and yields the answer text for st.write_stream. A final error is stored in `outcome`.
+    """
+    for event, data in events:
+        if event == "queue":
+            status.update(label=f"⏳ Serveur occupé : vous êtes en position {data['position']} dans la file d'attente...")
+        elif event == "stage":
+            label = STAGE_LABELS.get(data.get("stage"), data.get("stage", ""))
+            if isinstance(data.get("terms"), list):
+                data["terms"] = ", ".join(data["terms"])
+            try:
+                status.update(label=label.format(**data))
+            except (KeyError, IndexError):
+                status.update(label=label)
+        elif event == "sources":
+            if data.get("final"):
+                sources_box.empty() # The answer ends with the numbered sources it cites
+            elif data.get("sources"):
+                sources_box.markdown("**Pages consultées :**\n" + "\n".join(
+                    f"{source['n']}. [{source['title']}]({source['link']})" for source in data["sources"]
+                ))
+        elif event == "token":
+            yield data["text"]
+        elif event == "done":
+            outcome.update(data)
+            if data.get("error"):
+                status.update(label="Erreur lors du traitement de la question", state="error")
+            else:
+                status.update(label=f"Réponse générée en {data['elapsed']:.1f} s", state="complete")
+
+
 st.set_page_config(page_title="SupCom Chatbot", layout="wide")
 
 st.title("🎓 SupBot")
@@ -50,15 +110,28 @@ if user_query:
         try:
             logger.info(f"Sending query to Flask API for streaming: {FLASK_API_URL}")
             # Use stream=True with requests
-            with requests.post(FLASK_API_URL, json={"query": user_query}, stream=True, timeout=1000) as api_response:
-                api_response.raise_for_status() # Check for HTTP errors early
-
-                # Use st.write_stream to display the content as it arrives
-                # iter_content(decode_unicode=True) provides text chunks
-                response_stream = api_response.iter_content(chunk_size=None, decode_unicode=True)
-
-                # Display the stream and accumulate the full response
-                full_response = st.write_stream(response_stream)
+            with requests.post(FLASK_API_URL, json={"query": user_query}, stream=True, timeout=1000,
+                               headers={"Accept": "text/event-stream"}) as api_response:
+                if api_response.status_code == 429:
+                    # Backend at capacity: nothing was started, tell the user when to retry
+                    retry_after = api_response.headers.get("Retry-After", "quelques")
+                    full_response = f"Le serveur est très sollicité. Veuillez réessayer dans {retry_after} secondes."
+                    st.warning(full_response)
+                else:
+                    api_response.raise_for_status() # Check for HTTP errors early
+
+                    # Progress (queue, stages, sources) is shown while the answer is prepared,
+                    # then st.write_stream displays the answer text as it arrives
+                    status = st.status("Analyse de la question...")
+                    sources_box = st.empty()
+                    outcome = {}
+                    response_stream = render_events(read_events(api_response), status, sources_box, outcome)
+
+                    # Display the stream and accumulate the full response
+                    full_response = st.write_stream(response_stream)
+                    if outcome.get("error"):
+                        st.error(outcome["error"])
+                        full_response = full_response or outcome["error"]
 
             end_time = time.time()
             processing_time = end_time - start_time
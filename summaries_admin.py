@@ -0,0 +1,201 @@
+# summaries_admin.py
+"""
+Bulk administration of summaries.db, in constant memory whatever the table size.
+
+  export  streams rows as JSON lines (url, summary, date, content_hash, simhash)
+  import  upserts JSON lines in batched transactions (executemany); URLs are canonicalized
+  delete  deletes the given URLs
+  prune   deletes rows older than a date and/or whose URL matches a GLOB pattern
+  check   SQLite integrity check plus row checks (empty fields, bad dates, URL variants, orphans)
+
+Rows are read and written in batches of --batch rows, and progress is reported on stderr.
+WAL mode lets it run while the server is up; the server's in-memory answer cache is not
+invalidated by these changes.
+
+Usage:
+    python summaries_admin.py export [--output FILE] [--before DATE] [--pattern GLOB]
+    python summaries_admin.py import FILE [--today]
+    python summaries_admin.py delete URL [URL ...]
+    python summaries_admin.py prune (--before DATE | --older-than DAYS) [--pattern GLOB] [--dry-run]
+    python summaries_admin.py check
+"""
+import sys
+import json
+import time
+import argparse
+import contextlib
+from datetime import date, timedelta
+import config
+from page_dedup import canonicalize_url
+from summary_store import SummaryStore
+
+
+class Progress:
+    """Prints '<verb> N rows (R rows/s)' on stderr at most every `interval` seconds, and once at the end."""
+
+    def __init__(self, verb, quiet=False, interval=1.0):
+        self.verb = verb
+        self.quiet = quiet
+        self.interval = interval
+        self.count = 0
+        self._start = self._last = time.monotonic()
+
+    def update(self, count):
+        self.count = count
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._print(now, end="\r")
+
+    def done(self):
+        self._print(time.monotonic(), end="\n")
+
+    def _print(self, now, end):
+        if self.quiet:
+            return
+        rate = self.count / max(now - self._start, 1e-9)
+        print(f"{self.verb} {self.count} rows ({rate:.0f} rows/s)", end=end, file=sys.stderr, flush=True)
+
+
+def _open(path, mode):
+    """The file at `path`, or stdin/stdout (left open) for '-'."""
+    if path == "-":
+        return contextlib.nullcontext(sys.stdout if "w" in mode else sys.stdin)
+    return open(path, mode, encoding="utf-8")
+
+
+def export_rows(store, output, before=None, pattern=None, batch_size=1000, quiet=False):
+    progress = Progress("Exported", quiet)
+    for count, row in enumerate(store.iter_rows(before, pattern, batch_size), 1):
+        output.write(json.dumps(row, ensure_ascii=False) + "\n")
+        progress.update(count)
+    progress.done()
+    return progress.count
+
+
+def _parse_line(line, today):
+    """(url, summary, date, content_hash, simhash) from one JSON line; raises ValueError when unusable."""
+    record = json.loads(line)
+    if not isinstance(record, dict) or not record.get("url") or not record.get("summary"):
+        raise ValueError("needs 'url' and 'summary'")
+    for field, expected in (("url", str), ("summary", str), ("date", str), ("content_hash", str), ("simhash", int)):
+        value = record.get(field)
+        if value is not None and (not isinstance(value, expected) or isinstance(value, bool)):
+            raise ValueError(f"'{field}' is a {type(value).__name__}, expected {expected.__name__}")
+    on_date = today or record.get("date") or date.today().isoformat()
+    date.fromisoformat(on_date[:10])
+    return (canonicalize_url(record["url"]), record["summary"], on_date,
+            record.get("content_hash"), record.get("simhash"))
+
+
+def import_rows(store, lines, batch_size=1000, today=False, quiet=False):
+    """Upserts JSON lines in transactions of `batch_size` rows. Returns (imported, skipped)."""
+    progress = Progress("Imported", quiet)
+    today = date.today().isoformat() if today else None
+    batch, imported, skipped = [], 0, 0
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(_parse_line(line, today))
+        except ValueError as e: # json.JSONDecodeError is a ValueError
+            print(f"Skipping line {line_number}: {e}", file=sys.stderr)
+            skipped += 1
+            continue
+        if len(batch) >= batch_size:
+            imported += store.upsert_rows(batch)
+            batch = []
+            progress.update(imported)
+    if batch:
+        imported += store.upsert_rows(batch)
+        progress.update(imported)
+    progress.done()
+    return imported, skipped
+
+
+def check_rows(store, batch_size=1000, quiet=False):
+    """Streams every row and counts the problems; returns a report dict."""
+    report = store.integrity_report()
+    problems = {"missing_url": 0, "empty_summary": 0, "bad_date": 0, "stale": 0, "non_canonical_url": 0}
+    progress = Progress("Checked", quiet)
+    count = 0
+    for count, row in enumerate(store.iter_rows(batch_size=batch_size), 1):
+        if not row["url"]:
+            problems["missing_url"] += 1
+        elif canonicalize_url(row["url"]) != row["url"]:
+            problems["non_canonical_url"] += 1
+        if not (row["summary"] or "").strip():
+            problems["empty_summary"] += 1
+        try:
+            date.fromisoformat((row["date"] or "")[:10])
+        except ValueError:
+            problems["bad_date"] += 1
+        if row["content_hash"] and store.is_stale(row["date"]):
+            problems["stale"] += 1
+        progress.update(count)
+    progress.done()
+    report.update(problems, rows=count)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk administration of summaries.db.")
+    parser.add_argument("--db", default=config.SUMMARIES_DB_PATH)
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per read or transaction")
+    parser.add_argument("--quiet", action="store_true", help="No progress output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write rows as JSON lines")
+    export.add_argument("--output", default="-", help="File to write (default: stdout)")
+
+    load = commands.add_parser("import", help="Upsert rows from JSON lines")
+    load.add_argument("file", help="JSONL file ('-' for stdin)")
+    load.add_argument("--today", action="store_true", help="Stamp rows with today's date instead of their own")
+
+    delete = commands.add_parser("delete", help="Delete the given URLs")
+    delete.add_argument("urls", nargs="+")
+
+    prune = commands.add_parser("prune", help="Delete rows by date and/or URL pattern")
+    for command in (export, prune):
+        command.add_argument("--before", help="Only rows dated before this ISO date (undated rows included)")
+        command.add_argument("--older-than", type=int, metavar="DAYS", help="Same as --before today minus DAYS")
+        command.add_argument("--pattern", help="Only rows whose URL matches this GLOB, e.g. 'https://www.supcom.tn/fr/*'")
+    prune.add_argument("--dry-run", action="store_true", help="Only count the rows that would be deleted")
+
+    commands.add_parser("check", help="Integrity check and row checks")
+    args = parser.parse_args()
+
+    store = SummaryStore(args.db)
+    before = getattr(args, "before", None)
+    if getattr(args, "older_than", None) is not None:
+        before = (date.today() - timedelta(days=args.older_than)).isoformat()
+
+    if args.command == "export":
+        with _open(args.output, "w") as output:
+            export_rows(store, output, before, args.pattern, args.batch, args.quiet)
+    elif args.command == "import":
+        with _open(args.file, "r") as lines:
+            imported, skipped = import_rows(store, lines, args.batch, args.today, args.quiet)
+        print(f"Imported {imported} rows, skipped {skipped}.", file=sys.stderr)
+    elif args.command == "delete":
+        deleted = sum(store.delete(canonicalize_url(url)) for url in args.urls)
+        print(f"Deleted {deleted} of {len(args.urls)} URLs.", file=sys.stderr)
+    elif args.command == "prune":
+        if not before and not args.pattern:
+            parser.error("prune needs --before, --older-than and/or --pattern")
+        if args.dry_run:
+            print(f"Would delete {store.count(before, args.pattern)} rows.", file=sys.stderr)
+        else:
+            progress = Progress("Deleted", args.quiet)
+            store.prune(before, args.pattern, args.batch, on_batch=progress.update)
+            progress.done()
+    elif args.command == "check":
+        report = check_rows(store, args.batch, args.quiet)
+        print(json.dumps(report, indent=2))
+        if report["sqlite"] != ["ok"]:
+            sys.exit(1)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# summary_store.py
+import sqlite3
+import logging
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import config
+from page_dedup import hamming_distances
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryStore:
+    """
+    Write-through cache of page summaries backed by summaries.db.
+    A single connection in WAL mode is shared by all request threads and serialized with a lock;
+    WAL lets the admin scripts read and write the same file while the server is running.
+    The `date` column doubles as the freshness stamp: rows older than `ttl_days` are stale. Rows
+    without a content fingerprint were written by hand (update_url.py, imports) rather than from a
+    fetched page, and are never stale: a background refresh would replace them with model output.
+    """
+
+    def __init__(self, db_path=config.SUMMARIES_DB_PATH, ttl_days=config.SUMMARY_TTL_DAYS):
+        self.db_path = db_path
+        self.ttl_days = ttl_days
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._listeners = []
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=config.SUMMARY_REFRESH_WORKERS, thread_name_prefix="summary-refresh"
+        )
+        self._setup()
+
+    def _setup(self):
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE,
+                    summary TEXT,
+                    date TEXT
+                )
+            """)
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(summaries)")}
+            if "content_hash" not in columns:
+                # Fingerprint of the page text the summary was built from
+                self.connection.execute("ALTER TABLE summaries ADD COLUMN content_hash TEXT")
+            if "simhash" not in columns:
+                # 64-bit SimHash of the same text, to find near-duplicate pages
+                self.connection.execute("ALTER TABLE summaries ADD COLUMN simhash INTEGER")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS summaries_content_hash ON summaries (content_hash)"
+            )
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS page_validators (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT
+                )
+            """)
+            self.connection.commit()
+        logger.info(f"Summary store ready at {self.db_path} (TTL: {self.ttl_days} days)")
+
+    # --- Freshness ---
+    def is_stale(self, date_str):
+        """A row is stale when its date is missing, unparsable or older than the TTL."""
+        if self.ttl_days is None:
+            return False
+        try:
+            stamped = date.fromisoformat((date_str or "")[:10])
+        except ValueError:
+            return True
+        return date.today() - stamped > timedelta(days=self.ttl_days)
+
+    def _record(self, row):
+        url, summary, date_str, fingerprinted = row
+        return {"url": url, "summary": summary, "date": date_str,
+                "stale": bool(fingerprinted) and self.is_stale(date_str)}
+
+    # --- Reads ---
+    def get(self, url):
+        """Returns {'url', 'summary', 'date', 'stale'} for `url`, or None if it is not cached."""
+        return self.get_many([url]).get(url)
+
+    def get_many(self, urls):
+        """Returns {url: record} for the URLs present in the store."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        if not urls:
+            return {}
+        placeholders = ",".join("?" * len(urls))
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT url, summary, date, content_hash IS NOT NULL FROM summaries WHERE url IN ({placeholders})", urls
+            ).fetchall()
+        return {row[0]: self._record(row) for row in rows}
+
+    def all(self):
+        """Returns every record, oldest id first."""
+        with self.lock:
+            rows = self.connection.execute("SELECT url, summary, date, content_hash IS NOT NULL FROM summaries ORDER BY id").fetchall()
+        return [self._record(row) for row in rows]
+
+    @staticmethod
+    def _filter_sql(before=None, pattern=None):
+        """WHERE clause (and params) for rows dated before `before` (ISO date) and/or whose URL matches the GLOB `pattern`."""
+        clauses, params = [], []
+        if before:
+            clauses.append("(date IS NULL OR date < ?)")
+            params.append(before)
+        if pattern:
+            clauses.append("url GLOB ?")
+            params.append(pattern)
+        return " AND ".join(clauses) or "1", params
+
+    def iter_rows(self, before=None, pattern=None, batch_size=1000):
+        """
+        Yields every row as {'url', 'summary', 'date', 'content_hash', 'simhash'}, oldest id first,
+        optionally filtered like prune(). Rows are read `batch_size` at a time (keyset pagination),
+        so memory stays constant and the lock is released between batches.
+        """
+        where, params = self._filter_sql(before, pattern)
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f"SELECT id, url, summary, date, content_hash, simhash FROM summaries "
+                    f"WHERE id > ? AND {where} ORDER BY id LIMIT ?", [last_id, *params, batch_size]
+                ).fetchall()
+            for row_id, url, summary, date_str, content_hash, simhash in rows:
+                yield {"url": url, "summary": summary, "date": date_str, "content_hash": content_hash, "simhash": simhash}
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def count(self, before=None, pattern=None):
+        where, params = self._filter_sql(before, pattern)
+        with self.lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM summaries WHERE {where}", params).fetchone()[0]
+
+    def get_content_hashes(self, urls):
+        """Returns {url: content_hash} for the given URLs that have a recorded fingerprint."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        if not urls:
+            return {}
+        placeholders = ",".join("?" * len(urls))
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT url, content_hash FROM summaries WHERE url IN ({placeholders}) AND content_hash IS NOT NULL", urls
+            ).fetchall()
+        return dict(rows)
+
+    def find_by_content(self, content_hash, simhash=None, max_distance=config.SIMHASH_MAX_DISTANCE, exclude_url=None):
+        """
+        Returns the record (plus 'match': 'exact' or 'near') of a page with the same content: an equal
+        content hash, else the closest SimHash within `max_distance` bits. None when there is none.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT url, summary, date, 1 FROM summaries WHERE content_hash = ? AND url IS NOT ? LIMIT 1",
+                (content_hash, exclude_url)
+            ).fetchone()
+            if row is None and simhash is not None:
+                candidates = self.connection.execute(
+                    "SELECT url, summary, date, content_hash IS NOT NULL, simhash FROM summaries "
+                    "WHERE simhash IS NOT NULL AND url IS NOT ?",
+                    (exclude_url,)
+                ).fetchall()
+                if candidates:
+                    distances = hamming_distances(simhash, [candidate[4] for candidate in candidates])
+                    best = int(np.argmin(distances))
+                    if distances[best] <= max_distance:
+                        return dict(self._record(candidates[best][:4]), match="near")
+        return dict(self._record(row), match="exact") if row else None
+
+    # --- Writes ---
+    _UPSERT_SQL = """
+        INSERT INTO summaries (url, summary, date, content_hash, simhash) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            summary = excluded.summary,
+            date = excluded.date,
+            content_hash = excluded.content_hash,
+            simhash = excluded.simhash
+    """
+
+    _VALIDATORS_SQL = "INSERT OR REPLACE INTO page_validators (url, etag, last_modified) VALUES (?, ?, ?)"
+
+    def put(self, url, summary, on_date=None, content_hash=None, simhash=None, validators=None):
+        """
+        Inserts or updates the summary for `url`, stamping it with today's date. The page's
+        {'etag', 'last_modified'} `validators`, if given, are written in the same transaction.
+        A summary written without `content_hash` is curated: any earlier fingerprint is cleared, so
+        the row is never refreshed from the page.
+        """
+        on_date = on_date or date.today().isoformat()
+        with self.lock:
+            with self.connection:
+                self.connection.execute(self._UPSERT_SQL, (url, summary, on_date, content_hash, simhash))
+                if validators:
+                    self.connection.execute(self._VALIDATORS_SQL, (url, validators["etag"], validators["last_modified"]))
+        logger.info(f"Stored summary for URL: {url}")
+        self._notify(url)
+
+    def put_many(self, records, on_date=None):
+        """
+        Upserts (url, summary, content_hash[, simhash[, validators]]) records in a single transaction,
+        together with the validators of the records that have them.
+        """
+        on_date = on_date or date.today().isoformat()
+        rows, validator_rows = [], []
+        for url, summary, content_hash, *rest in records:
+            rows.append((url, summary, on_date, content_hash, rest[0] if rest else None))
+            validators = rest[1] if len(rest) > 1 else None
+            if validators:
+                validator_rows.append((url, validators["etag"], validators["last_modified"]))
+        if not rows:
+            return 0
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(self._UPSERT_SQL, rows)
+                self.connection.executemany(self._VALIDATORS_SQL, validator_rows)
+        logger.info(f"Stored {len(rows)} summaries in one transaction.")
+        for url, *_ in rows:
+            self._notify(url)
+        return len(rows)
+
+    def upsert_rows(self, rows):
+        """
+        Upserts (url, summary, date, content_hash, simhash) rows, keeping their own dates, in one
+        transaction. Listeners are not notified (bulk admin path). Returns the number of rows.
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(self._UPSERT_SQL, rows)
+        return len(rows)
+
+    def prune(self, before=None, pattern=None, batch_size=1000, on_batch=None):
+        """
+        Deletes the rows dated before `before` and/or whose URL matches the GLOB `pattern`, with their
+        validators, `batch_size` rows per transaction so the server's writes are not blocked for long.
+        `on_batch(deleted_so_far)` is called after each transaction. Returns the number of rows deleted.
+        """
+        if not before and not pattern:
+            raise ValueError("prune needs a date and/or a URL pattern")
+        where, params = self._filter_sql(before, pattern)
+        deleted = 0
+        while True:
+            with self.lock:
+                with self.connection:
+                    rows = self.connection.execute(
+                        f"SELECT id, url FROM summaries WHERE {where} LIMIT ?", [*params, batch_size]
+                    ).fetchall()
+                    if not rows:
+                        return deleted
+                    self.connection.executemany("DELETE FROM summaries WHERE id = ?", [(row[0],) for row in rows])
+                    self.connection.executemany("DELETE FROM page_validators WHERE url = ?", [(row[1],) for row in rows])
+            deleted += len(rows)
+            if on_batch:
+                on_batch(deleted)
+
+    def integrity_report(self):
+        """SQLite's integrity_check result plus counts of orphaned validators, as a dict."""
+        with self.lock:
+            sqlite_check = [row[0] for row in self.connection.execute("PRAGMA integrity_check")]
+            orphans = self.connection.execute(
+                "SELECT COUNT(*) FROM page_validators WHERE url NOT IN (SELECT url FROM summaries WHERE url IS NOT NULL)"
+            ).fetchone()[0]
+        return {"sqlite": sqlite_check, "orphan_validators": orphans}
+
+    def touch(self, url, on_date=None, content_hash=None, simhash=None, validators=None):
+        """
+        Marks the cached summary for `url` as fresh without changing it. The fingerprint and validators
+        of the page it was checked against, if given, are recorded in the same transaction.
+        """
+        on_date = on_date or date.today().isoformat()
+        with self.lock:
+            with self.connection:
+                cursor = self.connection.execute(
+                    "UPDATE summaries SET date = ?, content_hash = COALESCE(?, content_hash), "
+                    "simhash = COALESCE(?, simhash) WHERE url = ?",
+                    (on_date, content_hash, simhash, url)
+                )
+                if validators and cursor.rowcount:
+                    self.connection.execute(self._VALIDATORS_SQL, (url, validators["etag"], validators["last_modified"]))
+        return cursor.rowcount > 0
+
+    def delete(self, url):
+        """Deletes the summary for `url`. Returns True if a row was removed."""
+        with self.lock:
+            cursor = self.connection.execute("DELETE FROM summaries WHERE url = ?", (url,))
+            self.connection.execute("DELETE FROM page_validators WHERE url = ?", (url,))
+            self.connection.commit()
+        deleted = cursor.rowcount > 0
+        if deleted:
+            self._notify(url)
+        return deleted
+
+    # --- HTTP validators (conditional GET) ---
+    def get_validators(self, url):
+        """Returns {'etag', 'last_modified'} recorded for `url`, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified FROM page_validators WHERE url = ?", (url,)
+            ).fetchone()
+        return {"etag": row[0], "last_modified": row[1]} if row else None
+
+    # --- Change notifications ---
+    def add_listener(self, callback):
+        """Registers `callback(url)`, called after a summary is written or deleted."""
+        self._listeners.append(callback)
+
+    def _notify(self, url):
+        for callback in list(self._listeners):
+            try:
+                callback(url)
+            except Exception as e:
+                logger.error(f"Summary store listener failed for {url}: {e}", exc_info=True)
+
+    # --- Stale-while-revalidate ---
+    def schedule_refresh(self, url, refresh_fn):
+        """
+        Recomputes a stale summary in the background with `refresh_fn()` and stores the result.
+        `refresh_fn` returns None when the existing summary should be kept, else the new summary or
+        (summary, content_hash, simhash, validators).
+        Concurrent requests for the same URL share a single refresh.
+        """
+        with self.lock:
+            if url in self._refreshing:
+                return False
+            self._refreshing.add(url)
+
+        def run():
+            try:
+                result = refresh_fn()
+                summary, content_hash, simhash, validators = (
+                    result if isinstance(result, tuple) else (result, None, None, None)
+                )
+                if summary:
+                    self.put(url, summary, content_hash=content_hash, simhash=simhash, validators=validators)
+                else:
+                    logger.info(f"Background refresh kept the existing summary for URL: {url}")
+            except Exception as e:
+                logger.error(f"Background refresh failed for {url}: {e}", exc_info=True)
+            finally:
+                with self.lock:
+                    self._refreshing.discard(url)
+
+        logger.info(f"Scheduling background refresh of stale summary: {url}")
+        self._refresh_executor.submit(run)
+        return True
+
+    def close(self):
+        self._refresh_executor.shutdown(wait=False)
+        with self.lock:
+            self.connection.close()
+
+
+# --- One shared store per database file ---
+_stores = {}
+_store_lock = threading.Lock()
+
+def get_summary_store(db_path=config.SUMMARIES_DB_PATH):
+    """Returns the shared store for `db_path` (the application's summaries.db by default)."""
+    with _store_lock:
+        if db_path not in _stores:
+            _stores[db_path] = SummaryStore(db_path)
+        return _stores[db_path]
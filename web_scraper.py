@@ -1,57 +1,107 @@
 # web_scraper.py
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiohttp
 import logging
 import config
+from http_fetcher import get_fetcher
+from html_extract import get_extractor
+from summary_store import get_summary_store
 
 logger = logging.getLogger(__name__)
 
-def retrieve_content(url):
-    """Retrieves and cleans text content from a given URL."""
-    logger.info(f"Attempting to retrieve content from: {url}")
-    try:
-        response = requests.get(
-            url,
-            headers=config.SCRAPE_HEADERS,
-            timeout=config.SCRAPE_TIMEOUT
-        )
-        response.raise_for_status() # Check for HTTP errors
-
-        # Check content type - basic check for HTML
-        content_type = response.headers.get('content-type', '').lower()
-        if 'html' not in content_type:
-            logger.warning(f"Skipping non-HTML content ({content_type}) at URL: {url}")
-            return None
-
-        # Use 'html.parser' for robustness, consider 'lxml' if installed for speed
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Remove script and style elements
-        for element in soup(["script", "style", "nav", "footer", "header", "aside"]):
-            element.decompose() # Remove tags and their content
-
-        # Get text, separated by spaces, and strip extra whitespace
-        text = soup.get_text(separator=" ", strip=True)
-
-        # Limit the amount of text processed further
-        max_chars = config.SCRAPE_MAX_TOKENS * 4 # Rough estimate
-        if len(text) > max_chars:
-             logger.info(f"Truncating content from {url} to {max_chars} characters.")
-             text = text[:max_chars]
-
-        logger.info(f"Successfully retrieved and cleaned content from: {url} (Length: {len(text)} chars)")
-        return text
-
-    except requests.exceptions.Timeout:
+def clean_html(content, url="", extractor=None):
+    """
+    Extracts readable text from raw HTML, dropping scripts, styles and page chrome.
+    Uses the configured extraction engine (html_extract.py); extraction stops once enough text
+    for further processing has been collected.
+    """
+    # Limit the amount of text processed further
+    max_chars = config.SCRAPE_MAX_TOKENS * 4 # Rough estimate
+    text = (extractor or get_extractor()).extract(content, max_chars)
+    if len(text) >= max_chars:
+         logger.info(f"Truncated content from {url} at {max_chars} characters.")
+    return text
+
+def _page_from_response(url, result):
+    """
+    Turns a fetch result into {'url', 'text', 'not_modified', 'validators'} (or None). The page's
+    {'etag', 'last_modified'} validators are not stored here: they belong with the summary of this
+    text and are written together with it (SummaryStore.put).
+    """
+    if isinstance(result, asyncio.TimeoutError):
         logger.error(f"Timeout while retrieving content from {url}")
         return None
-    except requests.exceptions.HTTPError as http_err:
+    if isinstance(result, aiohttp.ClientResponseError):
         # Log common errors differently if needed (e.g., 404 Not Found, 403 Forbidden)
-        logger.error(f"HTTP error retrieving {url}: {http_err}")
+        logger.error(f"HTTP error retrieving {url}: {result.status} {result.message}")
+        return None
+    if isinstance(result, aiohttp.ClientError):
+        logger.error(f"Failed to retrieve content from {url}: {result}")
         return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to retrieve content from {url}: {e}", exc_info=True)
+    if isinstance(result, Exception):
+        logger.error(f"An unexpected error occurred during scraping {url}: {result}", exc_info=result)
         return None
+
+    if result["not_modified"]:
+        logger.info(f"Content unchanged since last fetch (304): {url}")
+        return {"url": url, "text": None, "not_modified": True, "validators": None}
+
+    # Check content type - basic check for HTML
+    if "html" not in result["content_type"]:
+        logger.warning(f"Skipping non-HTML content ({result['content_type']}) at URL: {url}")
+        return None
+
+    try:
+        text = clean_html(result["content"], url)
     except Exception as e:
-         logger.error(f"An unexpected error occurred during scraping {url}: {e}", exc_info=True)
-         return None
\ No newline at end of file
+        logger.error(f"An unexpected error occurred during scraping {url}: {e}", exc_info=True)
+        return None
+    logger.info(f"Successfully retrieved and cleaned content from: {url} (Length: {len(text)} chars)")
+    validators = {"etag": result["etag"], "last_modified": result["last_modified"]}
+    return {"url": url, "text": text, "not_modified": False,
+            "validators": validators if result["etag"] or result["last_modified"] else None}
+
+def _fetch_args(url, revalidate):
+    if not revalidate:
+        return url, None, None
+    validators = get_summary_store().get_validators(url) or {}
+    return url, validators.get("etag"), validators.get("last_modified")
+
+def retrieve_page(url, revalidate=False):
+    """
+    Retrieves and cleans a page through the pooled async fetcher.
+    With `revalidate`, stored ETag/Last-Modified validators are sent and an unchanged page
+    comes back as {'not_modified': True} without being downloaded or parsed.
+    """
+    logger.info(f"Attempting to retrieve content from: {url}")
+    future = get_fetcher().submit(*_fetch_args(url, revalidate))
+    try:
+        result = future.result(timeout=config.SCRAPE_TIMEOUT + 5)
+    except Exception as e:
+        result = e
+    return _page_from_response(url, result)
+
+async def retrieve_page_async(url, revalidate=False, executor=None):
+    """
+    Awaitable retrieve_page for asyncio servers: the download is awaited on the fetcher's event loop
+    and only the HTML cleaning runs in `executor`, so no thread sits waiting on the network.
+    """
+    logger.info(f"Attempting to retrieve content from: {url}")
+    future = get_fetcher().submit(*_fetch_args(url, revalidate))
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), config.SCRAPE_TIMEOUT + 5)
+    except Exception as e:
+        result = e
+    return await asyncio.get_running_loop().run_in_executor(executor, _page_from_response, url, result)
+
+def retrieve_pages(urls, revalidate=False):
+    """Batch version of retrieve_page: fetches all URLs concurrently. Returns {url: page or None}."""
+    results = get_fetcher().fetch_many(
+        [_fetch_args(url, revalidate) for url in urls], timeout=config.SCRAPE_TIMEOUT + 5
+    )
+    return {url: _page_from_response(url, result) for url, result in results.items()}
+
+def retrieve_content(url):
+    """Retrieves and cleans text content from a given URL."""
+    page = retrieve_page(url)
+    return page["text"] if page else None